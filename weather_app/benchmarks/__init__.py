@@ -0,0 +1,3 @@
+"""
+離線效能基準測試套件
+"""
@@ -0,0 +1,88 @@
+"""
+回放錄製的 OpenWeather 回應：掛載在 requests.Session 上的 transport adapter，
+讓 WeatherAPI 在離線環境下走完整的請求路徑（參數組裝、JSON 解析、驗證、快取）
+"""
+import json
+import os
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from src.config.config import ENDPOINTS
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixtures(fixtures_dir: str = FIXTURES_DIR) -> Dict[str, dict]:
+    """讀取所有錄製檔，返回 {端點名稱: {"status", "headers", "body"}}"""
+    fixtures = {}
+    for filename in os.listdir(fixtures_dir):
+        if filename.endswith(".json"):
+            with open(os.path.join(fixtures_dir, filename), "r", encoding="utf-8") as f:
+                fixtures[filename[:-5]] = json.load(f)
+    return fixtures
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    依請求 URL 的路徑找出對應端點並回放錄製的回應
+
+    Args:
+        fixtures: load_fixtures() 的結果
+        latency: 每個請求模擬的網路延遲（秒）
+    """
+
+    def __init__(self, fixtures: Optional[Dict[str, dict]] = None, latency: float = 0.0):
+        super().__init__()
+        self.fixtures = fixtures or load_fixtures()
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+        # 以 host + path 對應端點名稱（history 與 geocoding 使用不同主機）
+        self._routes = {}
+        for name, url in ENDPOINTS.items():
+            parts = urlsplit(url)
+            self._routes[(parts.netloc, parts.path)] = name
+        # 預先編碼回應內容，回放時不計入序列化成本
+        self._bodies = {
+            name: json.dumps(fixture["body"], ensure_ascii=False).encode("utf-8")
+            for name, fixture in self.fixtures.items()
+        }
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        name = self._routes.get((parts.netloc, parts.path))
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        if name is None or name not in self.fixtures:
+            response.status_code = 404
+            response._content = b'{"cod": "404", "message": "no recording"}'
+            response.headers = CaseInsensitiveDict({"Content-Type": "application/json"})
+        else:
+            fixture = self.fixtures[name]
+            response.status_code = fixture["status"]
+            response._content = self._bodies[name]
+            response.headers = CaseInsensitiveDict(fixture.get("headers", {}))
+        response.encoding = "utf-8"
+        response.reason = "OK" if response.status_code < 400 else "Error"
+        return response
+
+    def close(self):
+        pass
+
+
+def replay_session(fixtures: Optional[Dict[str, dict]] = None, latency: float = 0.0) -> requests.Session:
+    """建立一個所有 http/https 請求都由 ReplayAdapter 回應的 Session"""
+    session = requests.Session()
+    adapter = ReplayAdapter(fixtures, latency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
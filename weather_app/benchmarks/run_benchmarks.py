@@ -0,0 +1,298 @@
+"""
+離線效能基準測試
+
+在 weather_app 目錄下執行：
+
+    python -m benchmarks.run_benchmarks --output results.json
+    python -m benchmarks.run_benchmarks --quick --baseline results.json
+
+所有 API 請求都由 benchmarks/fixtures 中錄製的回應回放，不需要網路或 API 金鑰。
+結果以 JSON 輸出；指定 --baseline 時會與前一次結果比較，
+超過 thresholds.json 中允許的退化比例即以非零狀態碼結束。
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.replay import load_fixtures, replay_session
+from src.api.weather_api import WeatherAPI
+from src.config.config import HOURLY_FORECAST_HOURS, HOURLY_INTERPOLATION_STEP
+from src.utils.cache_manager import CacheManager
+from src.utils.circuit_breaker import CircuitBreaker
+from src.utils.compact_forecast import HourlyForecast
+from src.utils.observation_history import ObservationHistory
+from src.utils.rate_limiter import RateLimiter
+from src.utils.data_processor import DataProcessor
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thresholds.json")
+
+
+def measure(func: Callable[[], object], repeat: int = 5, number: int = 1, setup: Optional[Callable] = None) -> Dict:
+    """執行 func 並返回每次呼叫的耗時統計（秒）"""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "repeat": repeat,
+        "number": number
+    }
+
+
+def scale_hourly(items: List[Dict], rows: int) -> List[Dict]:
+    """把錄製的 40 筆 3 小時預報複製擴充到指定筆數（時間戳遞增）"""
+    scaled = []
+    step = 10800
+    for i in range(rows):
+        item = dict(items[i % len(items)])
+        item["dt"] = items[0]["dt"] + i * step
+        scaled.append(item)
+    return scaled
+
+
+def scale_daily(items: List[Dict], rows: int) -> List[Dict]:
+    scaled = []
+    for i in range(rows):
+        item = dict(items[i % len(items)])
+        item["dt"] = items[0]["dt"] + i * 86400
+        scaled.append(item)
+    return scaled
+
+
+def historical_records(rows: int) -> List[Dict]:
+    return [{
+        "temperature": 20 + (i % 17) * 0.7,
+        "pressure": 1000 + i % 25,
+        "humidity": 50 + i % 45,
+        "wind_speed": (i % 13) * 0.8,
+        "precipitation": (i % 7) * 1.5,
+        "clouds": i % 100,
+        "sunshine_hours": (i % 12) * 0.5
+    } for i in range(rows)]
+
+
+class BenchmarkSuite:
+    """建立隔離的快取目錄與回放 API，依序執行各項基準測試"""
+
+    def __init__(self, quick: bool = False, only: Optional[List[str]] = None):
+        self.quick = quick
+        self.only = only
+        self.fixtures = load_fixtures()
+        self.tmp_dir = tempfile.mkdtemp(prefix="weather_bench_")
+        self.results: Dict[str, Dict] = {}
+
+    def _new_api(self, name: str) -> WeatherAPI:
+        cache_manager = CacheManager(os.path.join(self.tmp_dir, name))
+        return WeatherAPI(cache_manager=cache_manager, session=replay_session(self.fixtures),
+                          limiter=RateLimiter(per_minute=0),
+                          breaker=CircuitBreaker(state_dir=os.path.join(self.tmp_dir, name, "circuit")),
+                          history=ObservationHistory(os.path.join(self.tmp_dir, name, "history")))
+
+    def record(self, name: str, stats: Dict, **extra) -> None:
+        if self.only and not any(name.startswith(prefix) for prefix in self.only):
+            return
+        stats.update(extra)
+        self.results[name] = stats
+        print(f"{name:<36} median {stats['median'] * 1000:10.3f} ms   min {stats['min'] * 1000:10.3f} ms")
+
+    def wanted(self, prefix: str) -> bool:
+        return not self.only or any(p.startswith(prefix) or prefix.startswith(p) for p in self.only)
+
+    def bench_api(self) -> None:
+        if not self.wanted("api_"):
+            return
+        api = self._new_api("api")
+        endpoint = api.endpoints["forecast"]
+        params = {"lat": 25.04, "lon": 121.51}
+        n = 200 if self.quick else 1000
+        stats = measure(lambda: api._make_request(endpoint, params), repeat=3, number=n)
+        self.record("api_request_forecast", stats, ops_per_sec=1 / stats["median"])
+
+        api.get_current_weather(25.04, 121.51)
+        stats = measure(lambda: api.get_current_weather(25.04, 121.51), repeat=3, number=n)
+        self.record("api_cached_current_weather", stats, ops_per_sec=1 / stats["median"])
+
+    def bench_cache(self) -> None:
+        if not self.wanted("cache_"):
+            return
+        payload = self.fixtures["forecast"]["body"]["list"]
+        sizes = (1000, 10000) if self.quick else (1000, 100000)
+        for size in sizes:
+            cache_manager = CacheManager(os.path.join(self.tmp_dir, f"cache_{size}"))
+            keys = [f"hourly_forecast_{i // 1000}.{i % 1000}_121.5" for i in range(size)]
+
+            start = time.perf_counter()
+            for key in keys:
+                cache_manager.set(key, payload)
+            elapsed = time.perf_counter() - start
+            self.record(f"cache_set_{size}", {"min": elapsed / size, "median": elapsed / size,
+                                             "mean": elapsed / size, "repeat": 1, "number": size},
+                        total_seconds=elapsed)
+
+            sample = keys[::max(1, size // 1000)]
+            stats = measure(lambda: [cache_manager.get(key) for key in sample], repeat=3)
+            per_get = {k: (v / len(sample) if k in ("min", "median", "mean") else v) for k, v in stats.items()}
+            self.record(f"cache_get_{size}", per_get, sampled_keys=len(sample))
+
+            shutil.rmtree(cache_manager.cache_dir, ignore_errors=True)
+
+    def bench_processor(self) -> None:
+        if not self.wanted("processor_"):
+            return
+        processor = DataProcessor()
+        hourly = self.fixtures["forecast"]["body"]["list"]
+        daily = self.fixtures["forecast_daily"]["body"]["list"]
+        air = self.fixtures["air_pollution"]["body"]
+        row_counts = (40, 4000) if self.quick else (40, 4000, 40000)
+
+        for rows in row_counts:
+            data = scale_hourly(hourly, rows)
+            self.record(f"processor_hourly_{rows}", measure(lambda: processor.process_hourly_forecast(data)))
+            data_daily = scale_daily(daily, rows)
+            self.record(f"processor_daily_{rows}", measure(lambda: processor.process_daily_forecast(data_daily)))
+            records = historical_records(rows)
+            self.record(f"processor_historical_{rows}", measure(lambda: processor.process_historical_weather(records)))
+            self.record(f"processor_aqi_{rows}",
+                        measure(lambda: [processor.process_air_pollution(air) for _ in range(rows)]))
+            # 批次：rows 個地點（每個地點 365 天紀錄）與 rows 個測站
+            stations = {f"station-{i}": records[:365] for i in range(rows)}
+            self.record(f"processor_historical_batch_{rows}",
+                        measure(lambda: processor.process_historical_batch(stations), repeat=3))
+            air_items = [air] * rows
+            self.record(f"processor_aqi_batch_{rows}",
+                        measure(lambda: processor.process_air_pollution_batch(air_items)))
+            # 多地點：共 rows 筆的每小時預報（每個地點 40 筆）合併成單一精簡 DataFrame
+            locations = {f"city-{i}": hourly for i in range(max(1, rows // len(hourly)))}
+            self.record(f"processor_hourly_frame_{rows}",
+                        measure(lambda: processor.process_hourly_frame(locations)))
+            # 同上的地點一次內插為每小時一筆（輸出約 3 倍筆數）
+            compact_locations = {key: HourlyForecast.from_items(data) for key, data in locations.items()}
+            self.record(f"processor_hourly_interpolate_{rows}",
+                        measure(lambda: processor.interpolate_hourly(compact_locations)))
+
+    def assemble_dashboard(self, api: WeatherAPI, processor: DataProcessor) -> None:
+        """不經 Streamlit，依 app.py 的順序取得並處理每個區塊所需的數據"""
+        geo = api.get_location_by_name("Taipei")
+        lat, lon = geo[0]["lat"], geo[0]["lon"]
+        processor.process_current_weather(api.get_current_weather(lat, lon))
+        processor.process_hourly_interpolated(api.get_hourly_forecast(lat, lon), step=HOURLY_INTERPOLATION_STEP,
+                                              hours=HOURLY_FORECAST_HOURS)
+        processor.process_daily_forecast(api.get_daily_forecast(lat, lon))
+        processor.process_daily_forecast(api.get_monthly_forecast(lat, lon))
+        processor.process_air_pollution(api.get_air_pollution(lat, lon))
+
+    def bench_dashboard(self) -> None:
+        if not self.wanted("dashboard_"):
+            return
+        processor = DataProcessor()
+        counter = iter(range(10 ** 6))
+        holder = {}
+
+        def fresh_api():
+            holder["api"] = self._new_api(f"dashboard_cold_{next(counter)}")
+
+        stats = measure(lambda: self.assemble_dashboard(holder["api"], processor), repeat=5, setup=fresh_api)
+        self.record("dashboard_cold", stats)
+
+        api = self._new_api("dashboard_warm")
+        self.assemble_dashboard(api, processor)
+        self.record("dashboard_warm", measure(lambda: self.assemble_dashboard(api, processor), repeat=10))
+
+    def run(self) -> Dict:
+        try:
+            self.bench_api()
+            self.bench_cache()
+            self.bench_processor()
+            self.bench_dashboard()
+        finally:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        return {
+            "meta": {
+                "timestamp": datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "commit": _git_commit(),
+                "quick": self.quick
+            },
+            "results": self.results
+        }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict, baseline: Dict, thresholds: Dict) -> List[str]:
+    """比較兩次結果的中位數，返回超過允許退化比例的項目說明"""
+    default_ratio = thresholds.get("default_max_regression", 0.25)
+    per_benchmark = thresholds.get("benchmarks", {})
+    regressions = []
+    for name, result in current["results"].items():
+        if name not in baseline.get("results", {}):
+            continue
+        old = baseline["results"][name]["median"]
+        new = result["median"]
+        allowed = per_benchmark.get(name, {}).get("max_regression", default_ratio)
+        change = (new - old) / old if old else 0.0
+        status = "退化" if change > allowed else "正常"
+        print(f"{name:<36} {old * 1000:10.3f} ms -> {new * 1000:10.3f} ms  {change:+7.1%}  {status}")
+        if change > allowed:
+            regressions.append(f"{name}: {change:+.1%}（允許 {allowed:.0%}）")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="天氣應用程式離線效能基準測試")
+    parser.add_argument("--quick", action="store_true", help="使用較小的資料規模（約數十秒）")
+    parser.add_argument("--only", nargs="*", help="只執行指定前綴的測試，例如 cache_ processor_hourly")
+    parser.add_argument("--output", help="結果 JSON 輸出路徑")
+    parser.add_argument("--baseline", help="用於比較的先前結果 JSON")
+    parser.add_argument("--thresholds", default=THRESHOLDS_PATH, help="退化門檻設定檔")
+    parser.add_argument("--verbose", action="store_true", help="保留 API 請求與錯誤日誌（錄製的 30 天預報回應為 401）")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logging.getLogger("src.api.weather_api").setLevel(logging.CRITICAL)
+
+    results = BenchmarkSuite(quick=args.quick, only=args.only).run()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"結果已寫入 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.thresholds, "r", encoding="utf-8") as f:
+            thresholds = json.load(f)
+        regressions = compare(results, baseline, thresholds)
+        if regressions:
+            print("效能退化：\n  " + "\n  ".join(regressions), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
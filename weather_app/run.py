@@ -1,11 +1,25 @@
 """
 啟動天氣應用程序的入口點
+
+    python run.py                 # 單一 Streamlit 行程
+    python run.py --workers 4     # 4 個工作行程 + 本機負載平衡器（sticky session、健康檢查、SIGHUP 滾動重啟）
 """
+import argparse
 import os
 import sys
 import subprocess
 
+def parse_args():
+    from src.config.config import WORKERS, SERVER_PORT
+    parser = argparse.ArgumentParser(description="啟動天氣資訊儀表板")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Streamlit 工作行程數，大於 1 時啟用負載平衡器（預設取自 WORKERS）")
+    parser.add_argument("--host", default="0.0.0.0", help="對外監聽位址（僅多行程模式）")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="對外服務埠")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
     try:
         # 獲取當前腳本的目錄路徑
         current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -24,10 +38,17 @@ if __name__ == "__main__":
         env = os.environ.copy()
         env["PYTHONPATH"] = current_dir
         
+        # 多行程模式：由負載平衡器轉送到各工作行程
+        if args.workers > 1:
+            from src.server.supervisor import run_supervisor
+            print(f"正在啟動 {args.workers} 個工作行程：{app_path}")
+            run_supervisor(app_path, args.workers, args.host, args.port, current_dir)
+            sys.exit(0)
+        
         # 使用 subprocess 執行 Streamlit
         print(f"正在啟動應用程式：{app_path}")
         process = subprocess.Popen(
-            ["streamlit", "run", app_path],
+            ["streamlit", "run", app_path, "--server.port", str(args.port)],
             env=env,
             text=True,
             encoding='utf-8'
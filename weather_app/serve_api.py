@@ -0,0 +1,35 @@
+"""
+啟動無介面的 HTTP 天氣數據服務（ASGI，需要 uvicorn）
+
+    python serve_api.py                     # 0.0.0.0:8080
+    python serve_api.py --port 9000 --workers 4
+
+端點與參數說明見 src/service/app.py。
+"""
+import argparse
+import os
+import sys
+
+
+def parse_args():
+    from src.config.config import SERVICE_PORT
+    parser = argparse.ArgumentParser(description="啟動天氣數據 HTTP 服務")
+    parser.add_argument("--host", default="0.0.0.0", help="監聽位址")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT, help="監聽埠（預設取自 SERVICE_PORT）")
+    parser.add_argument("--workers", type=int, default=1, help="工作行程數（共用快取與速率限制）")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    args = parse_args()
+    try:
+        import uvicorn
+    except ImportError:
+        print("錯誤：需要安裝 uvicorn（pip install uvicorn）", file=sys.stderr)
+        sys.exit(1)
+
+    # 多個工作行程時 uvicorn 會在子行程中以字串匯入應用程式
+    os.environ["PYTHONPATH"] = current_dir
+    uvicorn.run("src.service.app:app", host=args.host, port=args.port, workers=args.workers,
+                log_level="warning", app_dir=current_dir)
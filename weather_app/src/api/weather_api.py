@@ -1,33 +1,163 @@
 """
 天氣 API 請求模組
 """
+import hashlib
+import logging
+import threading
+import time
+import pandas as pd
 import requests
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional, Union
-from ..config.config import API_KEY, ENDPOINTS, DEFAULT_UNITS, DEFAULT_LANG
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
+from ..config.config import (
+    API_KEY, ENDPOINTS, DEFAULT_UNITS, DEFAULT_LANG, CACHE_CONDITIONAL_REQUESTS, CACHE_NEGATIVE_TTL,
+    CAPABILITY_DENY_STATUSES, API_REQUEST_TIMEOUT, API_RATE_LIMIT_TIMEOUT, CACHE_LOCK_TIMEOUT,
+    CIRCUIT_BREAKER_ENABLED, HISTORY_ENABLED
+)
 from ..utils.cache_manager import CacheManager
-from ..utils.logger import setup_logger
+from ..utils.cache_policy import compute_expiry
+from ..utils.capabilities import CapabilityRegistry, EndpointUnavailable
+from ..utils.circuit_breaker import CircuitBreaker, CircuitOpen
+from ..utils.compact_forecast import HourlyForecast
+from ..utils.deadline import DeadlineExceeded, bounded, current_budget, mark_stale, request_timeout
+from ..utils.observation_history import ObservationHistory, default_observation_history
+from ..utils.rate_limiter import RateLimiter, RateLimitExceeded
+from ..utils.logger import setup_logger, truncate_payload
+from ..utils import metrics
 
 logger = setup_logger(__name__)
-cache = CacheManager()
+
+# 模組共用的快取管理器與速率限制器在第一次使用時才建立（建立時會建立目錄），匯入本模組不觸及檔案系統
+_default_cache: Optional[CacheManager] = None
+_default_limiter: Optional[RateLimiter] = None
+_default_breaker: Optional[CircuitBreaker] = None
+_defaults_lock = threading.Lock()
+
+
+def default_cache() -> CacheManager:
+    """模組共用的快取管理器"""
+    global _default_cache
+    with _defaults_lock:
+        if _default_cache is None:
+            _default_cache = CacheManager()
+        return _default_cache
+
+
+def default_rate_limiter() -> RateLimiter:
+    """模組共用（跨行程共用配額）的速率限制器"""
+    global _default_limiter
+    with _defaults_lock:
+        if _default_limiter is None:
+            _default_limiter = RateLimiter()
+        return _default_limiter
+
+
+def default_circuit_breaker() -> CircuitBreaker:
+    """模組共用（跨行程共用狀態）的斷路器"""
+    global _default_breaker
+    with _defaults_lock:
+        if _default_breaker is None:
+            _default_breaker = CircuitBreaker()
+        return _default_breaker
+
+
+def __getattr__(name: str) -> Any:
+    # 相容舊用法：weather_api.cache / weather_api.rate_limiter
+    if name == "cache":
+        return default_cache()
+    if name == "rate_limiter":
+        return default_rate_limiter()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+API_REQUEST_SECONDS = metrics.histogram("weather_api_request_seconds", "OpenWeather 請求延遲", ["endpoint", "status"])
+API_REQUESTS = metrics.counter("weather_api_requests_total", "OpenWeather 請求數", ["endpoint", "status"])
+API_RESPONSE_BYTES = metrics.counter("weather_api_response_bytes_total", "OpenWeather 回應位元組數", ["endpoint"])
+API_ERRORS = metrics.counter("weather_api_errors_total", "OpenWeather 請求錯誤數", ["endpoint", "kind"])
+API_REVALIDATIONS = metrics.counter("weather_api_revalidations_total", "過期快取回源結果", ["namespace", "result"])
+API_STALE_SERVED = metrics.counter("weather_api_stale_served_total", "因延遲預算、逾時、斷路器開啟或請求錯誤而改用過期快取的次數",
+                                   ["namespace", "reason"])
+
+# 這些回應表示上游本身有問題（過載或故障），計入斷路器的失敗率；其他 4xx 是請求或方案的問題
+UPSTREAM_FAILURE_STATUSES = (429, 500, 502, 503, 504)
+
+# forecast/daily 的最大天數；較短的每日預報都從這份數據切出
+DAILY_MAX_DAYS = 16
+
+# 各類數據的快取鍵格式（類別名稱與 CACHE_POLICIES 相同）
+CACHE_KEYS = {
+    "current": "current_weather_{lat}_{lon}",
+    "hourly": "hourly_forecast_{lat}_{lon}",
+    "daily": "daily_forecast_{lat}_{lon}_{days}",
+    "air_pollution": "air_pollution_{lat}_{lon}",
+    "geocoding": "geocoding_{query}_en",  # 加入語言標記
+    "climate": "monthly_forecast_{lat}_{lon}"
+}
+
+# 數據版本：(快取鍵, 回應內容的雜湊)，見 WeatherAPI._cached_fetch
+DataVersion = Tuple[str, str]
+
+
+class NotModified(Exception):
+    """上游回應 304 Not Modified：快取中的數據仍是最新版本"""
+
 
 class WeatherAPI:
     """處理所有天氣相關的 API 請求"""
     
-    def __init__(self):
+    def __init__(self, cache_manager: Optional[CacheManager] = None,
+                 session: Optional[requests.Session] = None,
+                 limiter: Optional[RateLimiter] = None,
+                 breaker: Optional[CircuitBreaker] = None,
+                 history: Optional[ObservationHistory] = None):
+        """
+        Args:
+            cache_manager: 使用的快取管理器，預設為模組共用的實例
+            session: HTTP 連線階段（可掛載自訂 transport adapter，例如基準測試的回放器）
+            limiter: API 速率限制器，預設為模組共用（跨行程共用配額）的實例
+            breaker: 端點斷路器，預設為模組共用（跨行程共用狀態）的實例；CIRCUIT_BREAKER_ENABLED 關閉時為 None
+            history: 記錄每次取得的當前天氣與 AQI 的觀測歷史，預設為模組共用的實例；HISTORY_ENABLED 關閉時為 None
+        """
         self.api_key = API_KEY
         self.endpoints = ENDPOINTS
         self.units = DEFAULT_UNITS
         self.lang = DEFAULT_LANG
+        self.cache = cache_manager or default_cache()
+        self.rate_limiter = limiter or default_rate_limiter()
+        self.breaker = breaker or (default_circuit_breaker() if CIRCUIT_BREAKER_ENABLED else None)
+        self.history = history or (default_observation_history() if HISTORY_ENABLED else None)
+        # 記住目前 API 方案不支援的端點（跨行程共用，見 CapabilityRegistry）
+        self.capabilities = CapabilityRegistry(self.cache, self.api_key)
+        # 重用連線（keep-alive），避免每個請求重新建立 TCP/TLS 連線
+        self.session = session or requests.Session()
+
+    def _endpoint_name(self, endpoint: str) -> str:
+        """將端點 URL 轉為設定中的端點名稱，作為指標標籤"""
+        for name, url in self.endpoints.items():
+            if url == endpoint:
+                return name
+        return endpoint
 
-    def _make_request(self, endpoint: str, params: Dict[str, Any], expect_list: bool = False) -> Union[Dict, List]:
+    def _make_request(self, endpoint: str, params: Dict[str, Any], expect_list: bool = False,
+                      meta: Optional[Dict[str, Any]] = None) -> Union[Dict, List]:
         """發送 API 請求並返回結果
         
         Args:
             endpoint: API 端點
             params: 請求參數
             expect_list: 是否預期返回列表類型的響應
+            meta: 若提供，會寫入響應的 status、headers 與內容雜湊 digest（供快取策略使用）；
+                  其中的 validators（etag / last_modified）會作為條件式請求標頭送出
+                  
+        Raises:
+            NotModified: 送出條件式請求且上游回應 304
+            RateLimitExceeded: 等待速率限制配額逾時
+            EndpointUnavailable: 端點近期回應過 401/403/404（不發出請求）
+            DeadlineExceeded: 目前的延遲預算（見 deadline.budget）已不足以發出請求
+            CircuitOpen: 端點的斷路器開啟中（不發出請求）
+            requests.exceptions.Timeout: 請求超過 API_REQUEST_TIMEOUT 或剩餘預算
         """
+        self.capabilities.check(self._endpoint_name(endpoint))
+        
         # 確保所有必要的參數都存在
         base_params = {
             "appid": self.api_key,
@@ -38,31 +168,79 @@ class WeatherAPI:
         # 合併基本參數和特定請求參數
         final_params = {**base_params, **params}
         
-        # 記錄請求詳情（隱藏 API 金鑰）
-        debug_params = {**final_params}
-        debug_params["appid"] = "***"
-        logger.debug(f"發送請求到端點: {endpoint}")
-        logger.debug(f"請求參數: {debug_params}")
+        # 記錄請求詳情（隱藏 API 金鑰）；參數只在 DEBUG 啟用時才會被格式化
+        logger.debug("發送請求到端點: %s，請求參數: %s", endpoint,
+                     truncate_payload({**final_params, "appid": "***"}))
+        
+        # 條件式請求標頭
+        headers = {}
+        validators = (meta or {}).get("validators") or {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        
+        request_timeout(API_REQUEST_TIMEOUT)
+        if not self.rate_limiter.acquire(bounded(API_RATE_LIMIT_TIMEOUT)):
+            budget = current_budget()
+            if budget is not None and budget.exhausted:
+                raise DeadlineExceeded("等待速率限制配額時用完延遲預算")
+            API_ERRORS.inc(endpoint=self._endpoint_name(endpoint), kind="rate_limit")
+            logger.warning("API 請求超過速率限制: %s", endpoint)
+            raise RateLimitExceeded("API 請求過於頻繁，請稍後再試")
         
+        # 等待配額後重新計算：timeout 不超過剩餘預算
+        timeout = request_timeout(API_REQUEST_TIMEOUT)
+        if self.breaker is not None:
+            self.breaker.before_request(self._endpoint_name(endpoint))
+        start = time.perf_counter()
+        upstream_ok = False
+        # 因延遲預算縮短 timeout 而逾時，不代表上游有問題，不計入斷路器的失敗率
+        inconclusive = False
         try:
-            response = requests.get(endpoint, params=final_params)
+            response = self.session.get(endpoint, params=final_params, headers=headers or None, timeout=timeout)
+            upstream_ok = response.status_code not in UPSTREAM_FAILURE_STATUSES
+            latency_ms = round((time.perf_counter() - start) * 1000, 1)
             
             # 記錄響應狀態和 URL（隱藏 API 金鑰）
-            debug_url = response.url.replace(self.api_key, "***")
-            logger.debug(f"完整請求 URL: {debug_url}")
-            logger.debug(f"響應狀態碼: {response.status_code}")
+            if logger.isEnabledFor(logging.DEBUG):
+                debug_url = response.url.replace(self.api_key, "***") if self.api_key else response.url
+                logger.debug("完整請求 URL: %s", debug_url)
+            
+            endpoint_name = self._endpoint_name(endpoint)
+            API_REQUEST_SECONDS.observe(latency_ms / 1000, endpoint=endpoint_name, status=response.status_code)
+            API_REQUESTS.inc(endpoint=endpoint_name, status=response.status_code)
+            API_RESPONSE_BYTES.inc(len(response.content), endpoint=endpoint_name)
+            
+            logger.info("API 請求完成", extra={
+                "endpoint": endpoint_name,
+                "latency_ms": latency_ms,
+                "status": response.status_code,
+                "cache_hit": False,
+                "bytes": len(response.content)
+            })
+            
+            if meta is not None:
+                meta["status"] = response.status_code
+                meta["headers"] = response.headers
+            
+            if response.status_code == 304:
+                raise NotModified(endpoint_name)
             
             # 嘗試解析響應內容
             try:
                 response_json = response.json()
-                logger.debug(f"API 響應內容: {response_json}")
+                logger.debug("API 響應內容: %s", truncate_payload(response_json))
             except ValueError as e:
-                logger.error(f"無法解析 JSON 響應: {response.text}")
+                logger.error("無法解析 JSON 響應: %s", truncate_payload(response.text))
                 raise
             
             # 檢查響應狀態
             response.raise_for_status()
             
+            if meta is not None:
+                meta["digest"] = hashlib.blake2b(response.content, digest_size=16).hexdigest()
+            
             # 驗證響應數據格式
             if expect_list:
                 if not isinstance(response_json, list):
@@ -76,127 +254,321 @@ class WeatherAPI:
             
             return response_json
             
+        except NotModified:
+            raise
         except requests.exceptions.HTTPError as e:
-            logger.error(f"HTTP 錯誤 {e.response.status_code}: {str(e)}")
-            logger.error(f"錯誤響應內容: {e.response.text}")
+            endpoint_name = self._endpoint_name(endpoint)
+            API_ERRORS.inc(endpoint=endpoint_name, kind="http")
+            if self.capabilities.record_failure(endpoint_name, e.response.status_code):
+                logger.warning("端點 %s 回應 HTTP %s，視為目前 API 方案不支援，%s 秒內不再嘗試",
+                               endpoint_name, e.response.status_code, self.capabilities.ttl)
+            else:
+                logger.error("HTTP 錯誤 %s: %s", e.response.status_code, e)
+                logger.error("錯誤響應內容: %s", truncate_payload(e.response.text))
+            raise
+        except requests.exceptions.Timeout as e:
+            inconclusive = timeout < API_REQUEST_TIMEOUT
+            API_ERRORS.inc(endpoint=self._endpoint_name(endpoint), kind="timeout")
+            logger.warning("請求逾時（%.2f 秒）: %s", timeout, e, extra={"endpoint": endpoint})
             raise
         except requests.exceptions.RequestException as e:
-            logger.error(f"請求錯誤: {str(e)}")
+            API_ERRORS.inc(endpoint=self._endpoint_name(endpoint), kind="network")
+            logger.error("請求錯誤: %s", e, extra={"endpoint": endpoint})
             raise
         except Exception as e:
-            logger.error(f"未預期的錯誤: {str(e)}", exc_info=True)
+            API_ERRORS.inc(endpoint=self._endpoint_name(endpoint), kind="other")
+            logger.error("未預期的錯誤: %s", e, exc_info=True)
             raise
+        finally:
+            # 不論結果如何都要回報，半開狀態的探測請求才會結束
+            if self.breaker is not None:
+                if upstream_ok:
+                    self.breaker.record_success(self._endpoint_name(endpoint))
+                elif inconclusive:
+                    self.breaker.release(self._endpoint_name(endpoint))
+                else:
+                    self.breaker.record_failure(self._endpoint_name(endpoint))
+
+    def _cache_key(self, namespace: str, **params) -> str:
+        return CACHE_KEYS[namespace].format(**params)
+
+    def _get_cached(self, cache_key: str) -> Optional[Tuple[Dict[str, Any], Any]]:
+        """從快取讀取未過期的 (檔頭, 數據)，命中時記錄結構化日誌；空數據只有標記為 negative 時才算命中"""
+        entry = self.cache.get_entry(cache_key)
+        if entry is not None and (entry[1] or entry[0].get("negative")):
+            logger.debug("快取命中: %s", cache_key, extra={"cache_hit": True})
+            return entry
+        return None
+
+    def _serve_stale(self, namespace: str, cache_key: str, stale: Tuple[Dict[str, Any], Any], reason: str) -> Any:
+        """改用過期的快取項目（最後一份有效數據），並記錄在目前的延遲預算中"""
+        API_STALE_SERVED.inc(namespace=namespace, reason=reason)
+        mark_stale(namespace)
+        logger.warning("%s 暫時無法更新（%s），改用已過期 %.0f 秒的快取數據", cache_key, reason,
+                       max(0.0, time.time() - stale[0].get("expires", time.time())))
+        return stale[1], self._entry_version(cache_key, stale[0])
+
+    def _get_stale(self, cache_key: str) -> Optional[Tuple[Dict[str, Any], Any]]:
+        """讀取快取項目（包含已過期的）；與 _get_cached 相同，空數據只有標記為 negative 時才有效"""
+        entry = self.cache.get_entry(cache_key, allow_stale=True)
+        if entry is not None and (entry[1] or entry[0].get("negative")):
+            return entry
+        return None
+
+    @staticmethod
+    def _entry_version(cache_key: str, meta: Dict[str, Any]) -> DataVersion:
+        # 舊版快取項目沒有 digest，以寫入時間作為版本（同一份檔案的版本不變）
+        return cache_key, meta.get("digest") or f"@{meta.get('timestamp')}"
+
+    def _cached_fetch(self, namespace: str, cache_key: str,
+                      fetch: Callable[[Dict[str, Any]], Any],
+                      serializer: Optional[str] = None) -> Tuple[Any, DataVersion]:
+        """
+        先查快取，未命中時在快取鍵鎖內回源並寫入快取，返回 (數據, 數據版本)
+
+        數據版本 (快取鍵, 回應內容的雜湊) 與數據來自同一個快取項目或同一次回源；版本相同表示數據未變，
+        可沿用先前的處理結果與圖表。兩者必須一起取得：其他執行緒可能隨時更新同一個鍵。
+
+        多個 session（包括其他伺服器行程）同時請求同一個鍵時，只有取得鎖的一方會呼叫 API，
+        其餘等待後直接讀取剛寫入的結果。
+
+        快取項目過期時以其 ETag / Last-Modified 發出條件式請求：上游回應 304，或回應內容的雜湊與
+        快取相同時，只延長到期時間並沿用快取數據，數據版本不變，下游的處理結果與圖表也不必重建。
+
+        空結果（例如找不到城市）標記為 negative，最多快取 CACHE_NEGATIVE_TTL 秒。
+
+        在延遲預算（見 deadline.budget）內執行時，等待鎖的時間不超過剩餘預算；預算已用完、請求逾時、
+        超過預算、端點的斷路器開啟，或上游錯誤、網路錯誤、速率限制逾時時，若有過期的快取項目就直接返回它
+        （last-known-good），沒有時才拋出例外；401/403/404 等方案或請求本身的錯誤照常拋出。
+
+        Args:
+            namespace: 數據類別，決定快取到期策略（見 config.CACHE_POLICIES）
+            cache_key: 快取鍵
+            fetch: 回源函式，參數為傳給 _make_request 的 meta 字典，以便取得響應標頭
+            serializer: 快取序列化格式（見 serializers），預設依設定
+        """
+        entry = self._get_cached(cache_key)
+        if entry is not None:
+            return entry[1], self._entry_version(cache_key, entry[0])
+
+        budget = current_budget()
+        if budget is not None and budget.exhausted:
+            stale = self._get_stale(cache_key)
+            if stale is not None:
+                return self._serve_stale(namespace, cache_key, stale, "deadline")
+
+        with self.cache.lock(cache_key, timeout=bounded(CACHE_LOCK_TIMEOUT)):
+            entry = self._get_cached(cache_key)
+            if entry is not None:
+                return entry[1], self._entry_version(cache_key, entry[0])
+
+            stale = self._get_stale(cache_key)
+            stale_meta = stale[0] if stale is not None else {}
+            meta: Dict[str, Any] = {}
+            if CACHE_CONDITIONAL_REQUESTS and stale is not None:
+                meta["validators"] = {k: stale_meta[k] for k in ("etag", "last_modified") if stale_meta.get(k)}
+
+            try:
+                data = fetch(meta)
+            except NotModified:
+                result = "not_modified"
+                data = stale[1]
+            except (DeadlineExceeded, CircuitOpen, requests.exceptions.Timeout) as e:
+                if stale is None:
+                    raise
+                reason = {DeadlineExceeded: "deadline", CircuitOpen: "circuit_open"}.get(type(e), "timeout")
+                return self._serve_stale(namespace, cache_key, stale, reason)
+            except (requests.exceptions.RequestException, RateLimitExceeded) as e:
+                # 上游故障、網路錯誤或本地配額用盡時同樣沿用最後一份有效數據；
+                # 401/403/404 表示方案不支援或請求本身有誤，照常拋出
+                response = getattr(e, "response", None)
+                if stale is None or (response is not None and response.status_code in CAPABILITY_DENY_STATUSES):
+                    raise
+                return self._serve_stale(namespace, cache_key, stale, "error")
+            else:
+                result = "changed"
+                if stale is not None and meta.get("digest") and meta["digest"] == stale_meta.get("digest"):
+                    result = "unchanged"
+                    data = stale[1]
+
+            expires = compute_expiry(namespace, meta.get("headers"))
+            if not data and expires is not None:
+                expires = min(expires, time.time() + CACHE_NEGATIVE_TTL)
+            if stale is not None:
+                API_REVALIDATIONS.inc(namespace=namespace, result=result)
+            if result == "changed":
+                headers = meta.get("headers") or {}
+                validators = {
+                    "etag": headers.get("ETag"),
+                    "last_modified": headers.get("Last-Modified"),
+                    "digest": meta.get("digest")
+                }
+                validators = {k: v for k, v in validators.items() if v}
+                if not data:
+                    validators["negative"] = True
+                if expires is not None:
+                    self.cache.set(cache_key, data, expires=expires, extra=validators, serializer=serializer)
+                return data, self._entry_version(cache_key, {**validators, "timestamp": time.time()})
+            if expires is not None:
+                self.cache.touch(cache_key, expires)
+            return data, self._entry_version(cache_key, stale_meta)
 
     def get_current_weather(self, lat: float, lon: float) -> Dict:
         """獲取當前天氣數據"""
-        cache_key = f"current_weather_{lat}_{lon}"
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return cached_data
+        return self.get_current_weather_versioned(lat, lon)[0]
 
+    def get_current_weather_versioned(self, lat: float, lon: float) -> Tuple[Dict, DataVersion]:
+        """獲取當前天氣數據與其數據版本；每次從上游取得的新觀測會附加到觀測歷史"""
+        cache_key = self._cache_key("current", lat=lat, lon=lon)
         params = {"lat": lat, "lon": lon}
-        data = self._make_request(self.endpoints["current_weather"], params)
-        cache.set(cache_key, data)
-        return data
 
-    def get_hourly_forecast(self, lat: float, lon: float) -> List[Dict]:
-        """獲取每小時天氣預報（5天/3小時間隔）"""
-        cache_key = f"hourly_forecast_{lat}_{lon}"
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return cached_data
+        def fetch(meta):
+            data = self._make_request(self.endpoints["current_weather"], params, meta=meta)
+            if self.history is not None and data:
+                self.history.record_current(lat, lon, data)
+            return data
+
+        return self._cached_fetch("current", cache_key, fetch)
 
+    def get_hourly_forecast(self, lat: float, lon: float) -> HourlyForecast:
+        """獲取每小時天氣預報（5天/3小時間隔），只保留處理時用到的欄位（見 HourlyForecast）"""
+        return self.get_hourly_forecast_versioned(lat, lon)[0]
+
+    def get_hourly_forecast_versioned(self, lat: float, lon: float) -> Tuple[HourlyForecast, DataVersion]:
+        """獲取每小時天氣預報與其數據版本"""
+        cache_key = self._cache_key("hourly", lat=lat, lon=lon)
         params = {
             'lat': lat,
             'lon': lon,
             'appid': self.api_key,
             'lang': 'en'  # 使用英文顯示國家名稱
         }
-        data = self._make_request(self.endpoints["forecast"], params)
-        hourly_data = data.get("list", [])
-        cache.set(cache_key, hourly_data)
-        return hourly_data
-
-    def get_daily_forecast(self, lat: float, lon: float, days: int = 7) -> List[Dict]:
-        """獲取每日天氣預報（最多16天）"""
-        if days > 16:
-            days = 16
+        data, version = self._cached_fetch(
+            "hourly", cache_key,
+            lambda meta: HourlyForecast.from_items(
+                self._make_request(self.endpoints["forecast"], params, meta=meta).get("list", [])
+            ),
+            serializer="pickle"
+        )
+        # 舊版快取項目是原始的 list
+        return HourlyForecast.coerce(data), version
 
-        cache_key = f"daily_forecast_{lat}_{lon}_{days}"
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return cached_data
+    def _daily_canonical(self, lat: float, lon: float) -> Tuple[List[Dict], DataVersion]:
+        """
+        完整 DAILY_MAX_DAYS 天的每日預報與其數據版本
 
+        所有較短的每日預報（get_daily_forecast 的 days、get_monthly_forecast 的回退）都從這一份快取切出，
+        上游只需要下載一次。目前方案不支援 forecast/daily 時，改由 3 小時預報聚合（最多約 5 天）。
+        """
+        cache_key = self._cache_key("daily", lat=lat, lon=lon, days=DAILY_MAX_DAYS)
         params = {
             "lat": lat,
             "lon": lon,
-            "cnt": days
+            "cnt": DAILY_MAX_DAYS
         }
-        data = self._make_request(self.endpoints["forecast_daily"], params)
-        daily_data = data.get("list", [])
-        cache.set(cache_key, daily_data)
-        return daily_data
+        try:
+            return self._cached_fetch(
+                "daily", cache_key,
+                lambda meta: self._make_request(self.endpoints["forecast_daily"], params, meta=meta).get("list", [])
+            )
+        except EndpointUnavailable:
+            pass
+        except requests.exceptions.HTTPError as e:
+            if e.response is None or e.response.status_code not in CAPABILITY_DENY_STATUSES:
+                raise
+
+        from ..utils.forecast_resample import daily_from_hourly
+        hourly, version = self.get_hourly_forecast_versioned(lat, lon)
+        return daily_from_hourly(hourly), self._derived_version(version, ">daily")
+
+    @staticmethod
+    def _derived_version(version: DataVersion, suffix: str) -> DataVersion:
+        # 從同一份原始數據衍生的不同視圖（切片、聚合）各自有不同的版本鍵，但跟著原始數據的雜湊一起變
+        return f"{version[0]}{suffix}", version[1]
+
+    def get_daily_forecast(self, lat: float, lon: float, days: int = 7) -> List[Dict]:
+        """獲取每日天氣預報（最多16天，從完整的每日預報快取切出）"""
+        return self.get_daily_forecast_versioned(lat, lon, days)[0]
+
+    def get_daily_forecast_versioned(self, lat: float, lon: float, days: int = 7) -> Tuple[List[Dict], DataVersion]:
+        """獲取每日天氣預報與其數據版本"""
+        days = min(days, DAILY_MAX_DAYS)
+        data, version = self._daily_canonical(lat, lon)
+        return data[:days], self._derived_version(version, f"[:{days}]")
 
     def get_air_pollution(self, lat: float, lon: float) -> Dict:
         """獲取空氣品質數據"""
-        cache_key = f"air_pollution_{lat}_{lon}"
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return cached_data
+        return self.get_air_pollution_versioned(lat, lon)[0]
 
+    def get_air_pollution_versioned(self, lat: float, lon: float) -> Tuple[Dict, DataVersion]:
+        """獲取空氣品質數據與其數據版本；AQI 同時記錄到觀測歷史"""
+        cache_key = self._cache_key("air_pollution", lat=lat, lon=lon)
         params = {"lat": lat, "lon": lon}
-        data = self._make_request(self.endpoints["air_pollution"], params)
-        cache.set(cache_key, data)
-        return data
+
+        def fetch(meta):
+            data = self._make_request(self.endpoints["air_pollution"], params, meta=meta)
+            if self.history is not None and data:
+                self.history.record_air_quality(lat, lon, data)
+            return data
+
+        return self._cached_fetch("air_pollution", cache_key, fetch)
+
+    def get_observation_history(self, lat: float, lon: float, hours: Optional[float] = None) -> Optional[pd.DataFrame]:
+        """
+        地點最近的觀測紀錄（DataFrame，以 UTC 時間為索引）；未啟用觀測歷史時為 None
+
+        Args:
+            hours: 只取最近幾小時，None 表示全部保留的紀錄
+        """
+        if self.history is None:
+            return None
+        return self.history.frame(lat, lon, since=time.time() - hours * 3600 if hours else None)
 
     def get_location_by_name(self, city_name: str, country_code: Optional[str] = None) -> List[Dict]:
         """通過城市名稱獲取地理位置信息"""
+        return self.get_location_by_name_versioned(city_name, country_code)[0]
+
+    def get_location_by_name_versioned(self, city_name: str,
+                                       country_code: Optional[str] = None) -> Tuple[List[Dict], DataVersion]:
+        """通過城市名稱獲取地理位置信息與其數據版本"""
         query = f"{city_name}"
         if country_code:
             query = f"{city_name},{country_code}"
 
-        cache_key = f"geocoding_{query}_en"  # 加入語言標記
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return cached_data
-
+        cache_key = self._cache_key("geocoding", query=query)
         params = {
             "q": query,
             "limit": 5
         }
         
         # 指定預期返回列表類型的響應
-        data = self._make_request(self.endpoints["geocoding"], params, expect_list=True)
-        cache.set(cache_key, data)
-        return data
+        return self._cached_fetch(
+            "geocoding", cache_key,
+            lambda meta: self._make_request(self.endpoints["geocoding"], params, expect_list=True, meta=meta)
+        )
 
     def get_monthly_forecast(self, lat: float, lon: float) -> List[Dict]:
-        """獲取30天天氣預報（需要 Pro API）"""
-        cache_key = f"monthly_forecast_{lat}_{lon}"
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return cached_data
+        """獲取30天天氣預報（需要 Pro API；不支援時使用完整的每日預報）"""
+        return self.get_monthly_forecast_versioned(lat, lon)[0]
 
+    def get_monthly_forecast_versioned(self, lat: float, lon: float) -> Tuple[List[Dict], DataVersion]:
+        """獲取30天天氣預報與其數據版本"""
+        cache_key = self._cache_key("climate", lat=lat, lon=lon)
+        params = {
+            "lat": lat,
+            "lon": lon,
+            "cnt": 30  # 獲取30天的預報
+        }
         try:
-            # 首先嘗試使用 Pro API
-            params = {
-                "lat": lat,
-                "lon": lon,
-                "cnt": 30  # 獲取30天的預報
-            }
-            data = self._make_request(self.endpoints["forecast_climate"], params)
-            forecast_data = data.get("list", [])
-            cache.set(cache_key, forecast_data)
-            return forecast_data
+            return self._cached_fetch(
+                "climate", cache_key,
+                lambda meta: self._make_request(self.endpoints["forecast_climate"], params, meta=meta).get("list", [])
+            )
+        except EndpointUnavailable:
+            # 已知目前方案不支援 Pro API，直接使用免費版，不再發出注定失敗的請求
+            pass
         except Exception as e:
             # 如果 Pro API 失敗，回退到免費版的每日預報
-            logger.warning(f"使用 Pro API 獲取30天預報失敗: {str(e)}，回退到免費版16天預報")
-            params = {
-                "lat": lat,
-                "lon": lon,
-                "cnt": 16  # 免費版最多支援16天
-            }
-            data = self._make_request(self.endpoints["forecast_daily"], params)
-            forecast_data = data.get("list", [])
-            cache.set(cache_key, forecast_data)
-            return forecast_data
+            logger.warning("使用 Pro API 獲取30天預報失敗: %s，回退到免費版16天預報", e)
+
+        return self._daily_canonical(lat, lon)
@@ -1,33 +1,72 @@
 """
 主應用程式：整合所有天氣功能組件
+
+plotly、folium 等較重的模組與各 UI 組件在第一次用到該區塊時才匯入（之後由 sys.modules 重用），
+頁面上方的區塊不必等待整頁所需的模組全部載入；API、數據處理器等共用物件每個行程只建立一次。
+
+預設使用漸進式渲染（見 src/ui/progressive.py）：標題在地理位置查詢後立即顯示，各區塊的數據同時在
+背景抓取，完成一個填入一個，不再由上而下逐一等待網路請求。所有區塊共用 PAGE_LATENCY_BUDGET 的延遲預算，
+預算用完時改顯示快取中較早的數據並標示「數據可能不是最新」。
+
+頁面開啟期間每 REFRESH_RATE 秒由共用的排程器更新目前地點的數據（見 src/utils/refresh.py），
+數據有變動時伺服器主動讓頁面重新執行，不需要每個 session 各自輪詢。
 """
 import os
 import sys
+import time
+
+_run_start = time.perf_counter()
+
 import streamlit as st
-from datetime import datetime, timedelta
-import pytz
-import plotly.express as px
+from datetime import datetime
 
 # 將 src 目錄加入 Python 路徑
 current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.insert(0, os.path.dirname(current_dir))
 
-from src.api.weather_api import WeatherAPI
-from src.utils.data_processor import DataProcessor
-from src.utils.cache_manager import CacheManager
-from src.config.config import DEFAULT_CITY
+from src.config.config import (
+    AUTO_REFRESH, DEFAULT_CITY, METRICS_DEBUG_PANEL, PROCESSOR_MEMO_SIZE, PROGRESSIVE_RENDERING
+)
+from src.utils.metrics import start_exporters, record_app_run
+from src.utils.profiler import SessionProfiler, resolve_profile_mode
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
 
-# 導入UI組件
-from src.ui.current_weather import show_current_weather
-from src.ui.forecast import show_hourly_forecast, show_daily_forecast, show_monthly_forecast
-from src.ui.air_quality import show_air_quality
-from src.ui.weather_map import show_weather_map
+@st.cache_resource(show_spinner=False)
+def get_services():
+    """行程內所有 session 共用的 WeatherAPI 與 DataProcessor（第一次執行時建立）"""
+    from src.api.weather_api import WeatherAPI
+    from src.utils.data_processor import DataProcessor
+    start_exporters()
+    return WeatherAPI(), DataProcessor()
+
+
+# 30天預報圖表以數據版本為快取鍵，數據未變時不重建
+@st.cache_resource(max_entries=PROCESSOR_MEMO_SIZE, show_spinner=False)
+def monthly_figures(version: str, _monthly_df):
+    import plotly.express as px
+    forecast_days = len(_monthly_df)
+    fig = px.line(_monthly_df, x='date', y=['temp_day', 'temp_min', 'temp_max'],
+                  title=f"未來{forecast_days}天溫度預報",
+                  labels={
+                      "temp_day": "日均溫度 (°C)",
+                      "temp_min": "最低溫度 (°C)",
+                      "temp_max": "最高溫度 (°C)",
+                      "date": "日期"
+                  })
+    fig2 = px.bar(_monthly_df, x='date', y=['humidity', 'pop'],
+                  title=f"未來{forecast_days}天降水機率和濕度",
+                  labels={
+                      "humidity": "濕度 (%)",
+                      "pop": "降水機率 (%)",
+                      "date": "日期"
+                  },
+                  barmode='group')
+    return fig, fig2
 
 # 初始化
-weather_api = WeatherAPI()
-data_processor = DataProcessor()
-cache_manager = CacheManager()
+weather_api, data_processor = get_services()
 
 # 設置頁面配置
 st.set_page_config(
@@ -37,79 +76,113 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# 側邊欄
-with st.sidebar:
-    st.title("⚙️ 設置")
-    city = st.text_input("城市", value=DEFAULT_CITY)
-    
-    # 獲取城市地理位置
-    try:
-        geo_data = weather_api.get_location_by_name(city)
-        if geo_data:
-            lat = geo_data[0]['lat']
-            lon = geo_data[0]['lon']
-            location = f"{geo_data[0].get('local_names', {}).get('zh', city)}"
-        else:
-            st.error("找不到該城市")
+# 效能剖析（網址加上 ?profile=1 或 ?profile=full，或依設定抽樣啟用）
+script_ctx = get_script_run_ctx()
+profiler = SessionProfiler(
+    mode=resolve_profile_mode(st.query_params.get("profile")),
+    session_id=script_ctx.session_id if script_ctx else ""
+)
+profiler.start()
+
+# st.stop()、例外或重新執行（RerunException）中斷頁面時，finally 仍會停止 cProfile 並儲存剖析結果
+try:
+    # 側邊欄
+    with st.sidebar:
+        st.title("⚙️ 設置")
+        city = st.text_input("城市", value=DEFAULT_CITY)
+
+        # 獲取城市地理位置
+        try:
+            with profiler.section("geocode"):
+                geo_data = weather_api.get_location_by_name(city)
+            if geo_data:
+                lat = geo_data[0]['lat']
+                lon = geo_data[0]['lon']
+                location = f"{geo_data[0].get('local_names', {}).get('zh', city)}"
+                profiler.location = location
+            else:
+                st.error("找不到該城市")
+                st.stop()
+        except Exception as e:
+            st.error(f"獲取地理位置失敗: {str(e)}")
             st.stop()
-    except Exception as e:
-        st.error(f"獲取地理位置失敗: {str(e)}")
-        st.stop()
-
-# 主頁面
-st.title(f"🌤️ {location}天氣資訊儀表板")
-
-# 當前天氣
-show_current_weather(lat, lon, weather_api, data_processor)
-
-# 天氣預報標籤頁
-tab1, tab2, tab3, tab4 = st.tabs([
-    "📈 每小時預報",
-    "📅 每日預報",
-    "🌡️ 30天預報",
-    "💨 空氣品質"
-])
-
-# 每小時預報
-with tab1:
-    show_hourly_forecast(lat, lon, weather_api, data_processor)
-
-# 每日預報
-with tab2:
-    show_daily_forecast(lat, lon, weather_api, data_processor)
-
-# 30天預報
-with tab3:
-    try:
-        monthly_data = weather_api.get_monthly_forecast(lat, lon)
-        monthly_df = data_processor.process_daily_forecast(monthly_data)
-        
+
+    # 自動更新：同一地點的所有 session 共用一個背景更新工作，數據變動時才通知重新執行
+    refreshed = set()
+    if AUTO_REFRESH:
+        from src.ui.auto_refresh import enable_auto_refresh
+        from src.utils.refresh import get_refresh_scheduler
+        refreshed = enable_auto_refresh(get_refresh_scheduler(weather_api),
+                                        script_ctx.session_id if script_ctx else None, lat, lon)
+
+    # 主頁面
+    st.title(f"🌤️ {location}天氣資訊儀表板")
+
+    # 各區塊先放置佔位元素：漸進式渲染時顯示骨架，數據到達後再填入
+    placeholders = {"current": st.empty()}
+    tab_sections = ["hourly", "daily", "monthly", "air_quality"]
+    tabs = st.tabs([
+        "📈 每小時預報",
+        "📅 每日預報",
+        "🌡️ 30天預報",
+        "💨 空氣品質"
+    ])
+    for name, tab in zip(tab_sections, tabs):
+        with tab:
+            placeholders[name] = st.empty()
+    placeholders["map"] = st.empty()
+
+
+    # 以下 load_* 在背景執行緒執行，只取得並處理數據；render_* 在腳本執行緒中顯示
+    def load_current():
+        from src.ui.current_weather import load_current_weather
+        return load_current_weather(lat, lon, weather_api, data_processor)
+
+
+    def render_current(loaded):
+        from src.ui.current_weather import render_current_weather
+        render_current_weather(loaded, data_processor)
+
+
+    def load_hourly():
+        from src.ui.forecast import load_hourly_forecast
+        return load_hourly_forecast(lat, lon, weather_api, data_processor)
+
+
+    def render_hourly(loaded):
+        from src.ui.forecast import render_hourly_forecast
+        render_hourly_forecast(loaded)
+
+
+    def load_daily():
+        from src.ui.forecast import load_daily_forecast
+        return load_daily_forecast(lat, lon, weather_api, data_processor)
+
+
+    def render_daily(loaded):
+        from src.ui.forecast import render_daily_forecast
+        render_daily_forecast(loaded)
+
+
+    def load_monthly():
+        monthly_data, monthly_version = weather_api.get_monthly_forecast_versioned(lat, lon)
+        return monthly_version, data_processor.process_versioned("process_daily_forecast", monthly_version, monthly_data)
+
+
+    def render_monthly(loaded):
+        monthly_version, monthly_df = loaded
+        fig, fig2 = monthly_figures(monthly_version, monthly_df)
+
         forecast_days = len(monthly_df)
         st.subheader(f"🌡️ {forecast_days}天溫度趨勢")
-        
+
         # 繪製溫度趨勢圖
-        fig = px.line(monthly_df, x='date', y=['temp_day', 'temp_min', 'temp_max'],
-                      title=f"未來{forecast_days}天溫度預報",
-                      labels={
-                          "temp_day": "日均溫度 (°C)",
-                          "temp_min": "最低溫度 (°C)",
-                          "temp_max": "最高溫度 (°C)",
-                          "date": "日期"
-                      })
         st.plotly_chart(fig, use_container_width=True)
-        
+
         # 顯示降水和濕度信息
         st.subheader("💧 降水和濕度")
-        fig2 = px.bar(monthly_df, x='date', y=['humidity', 'pop'],
-                     title=f"未來{forecast_days}天降水機率和濕度",
-                     labels={
-                         "humidity": "濕度 (%)",
-                         "pop": "降水機率 (%)",
-                         "date": "日期"
-                     },
-                     barmode='group')
         st.plotly_chart(fig2, use_container_width=True)
-        
+
         if st.checkbox("顯示詳細數據"):
             st.dataframe(
                 monthly_df.style.format({
@@ -120,25 +193,81 @@ with tab3:
                     'pop': '{:.0f}%'
                 })
             )
-            
+
         if forecast_days < 30:
             st.info("注意：目前使用免費版 API，僅支援最多 16 天預報。若需要完整 30 天預報，請升級至 Pro 版本。")
-            
-    except Exception as e:
-        st.error(f"獲取天氣預報失敗: {str(e)}")
 
-# 空氣品質
-with tab4:
-    show_air_quality(lat, lon, weather_api, data_processor)
 
-# 天氣地圖
-show_weather_map(lat, lon, location, weather_api)
+    def load_air_quality():
+        from src.ui.air_quality import load_air_quality as load
+        return load(lat, lon, weather_api, data_processor)
+
+
+    def render_air_quality(air_quality):
+        from src.ui.air_quality import render_air_quality as render
+        render(air_quality)
+
+
+    def load_map():
+        # 地圖不需要 API 數據，背景工作只負責先匯入 folium 等較重的模組
+        import src.ui.weather_map
+
+
+    def render_map(_):
+        from src.ui.weather_map import show_weather_map
+        show_weather_map(lat, lon, location, weather_api)
+
+
+    from src.ui.progressive import Section, progressive_enabled, render_sections
+    sections = [
+        Section("current", load_current, render_current, "獲取當前天氣失敗", skeleton_lines=2),
+        Section("hourly", load_hourly, render_hourly, "獲取每小時預報失敗", skeleton_lines=6),
+        Section("daily", load_daily, render_daily, "獲取每日預報失敗", skeleton_lines=6),
+        Section("monthly", load_monthly, render_monthly, "獲取天氣預報失敗", skeleton_lines=6),
+        Section("air_quality", load_air_quality, render_air_quality, "獲取空氣品質數據失敗", skeleton_lines=6),
+        Section("map", load_map, render_map, "載入天氣地圖失敗", skeleton_lines=8)
+    ]
+    render_sections(
+        sections, placeholders, profiler, _run_start,
+        progressive=progressive_enabled(st.query_params.get("progressive"), PROGRESSIVE_RENDERING),
+        refreshed=refreshed
+    )
+
+    # 更新時間
+    st.sidebar.markdown("---")
+    import pytz
+    st.sidebar.write(f"最後更新時間: {datetime.now(pytz.timezone('Asia/Taipei')).strftime('%Y-%m-%d %H:%M:%S')}")
+
+    from src.utils.data_processor import get_derived_cache
+    derived_cache = get_derived_cache()
+
+    # 快取清理提示
+    if st.sidebar.button("清理快取"):
+        weather_api.cache.clear()
+        if derived_cache is not None:
+            derived_cache.clear()
+        st.sidebar.success("快取已清理")
+
+    # 增量清理過期快取（每次執行只花費少量固定時間）
+    weather_api.cache.sweep()
+    if derived_cache is not None:
+        derived_cache.sweep()
+
+    # 效能指標面板（設置 METRICS_DEBUG_PANEL=1 或網址加上 ?debug=metrics）
+    if METRICS_DEBUG_PANEL or st.query_params.get("debug") == "metrics":
+        from src.ui.debug_panel import show_metrics_panel
+        show_metrics_panel()
 
-# 更新時間
-st.sidebar.markdown("---")
-st.sidebar.write(f"最後更新時間: {datetime.now(pytz.timezone('Asia/Taipei')).strftime('%Y-%m-%d %H:%M:%S')}")
+    # 儲存並顯示本次剖析結果
+    if profiler.enabled:
+        from src.ui.debug_panel import show_profile_summary
+        profiler.stop()
+        profiler.save()
+        show_profile_summary(profiler)
+finally:
+    if profiler.enabled and profiler.total is None:
+        profiler.stop()
+        profiler.save()
 
-# 快取清理提示
-if st.sidebar.button("清理快取"):
-    cache_manager.clear()
-    st.sidebar.success("快取已清理") 
\ No newline at end of file
+# 啟動耗時：行程啟動後第一次執行（cold）與之後的重新執行（warm）分開記錄
+record_app_run(time.perf_counter() - _run_start)
@@ -297,9 +297,6 @@ LANGUAGE = "zh_tw"
 # 單位設置
 UNITS = "metric"  # 公制單位
 
-# 緩存設置
-CACHE_EXPIRY = 300  # 5分鐘緩存過期
-
 # API端點
 ENDPOINTS = {
     "current_weather": f"{BASE_URL}/weather",
@@ -321,8 +318,139 @@ DEFAULT_LANG = os.getenv("DEFAULT_LANG", "zh_tw")    # 繁體中文
 # 快取設置
 CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "cache")
 CACHE_DURATION = int(os.getenv("CACHE_DURATION", "1800"))  # 30分鐘
+CACHE_SERIALIZER = os.getenv("CACHE_SERIALIZER", "auto")  # auto / orjson / msgpack / json
+CACHE_COMPRESSION = os.getenv("CACHE_COMPRESSION", "auto")  # auto / zstd / lz4 / zlib / none
+CACHE_COMPRESS_THRESHOLD = int(os.getenv("CACHE_COMPRESS_THRESHOLD", "4096"))  # 超過此位元組數才壓縮
+CACHE_LOCK_TIMEOUT = float(os.getenv("CACHE_LOCK_TIMEOUT", "30"))  # 等待同一鍵回源完成的最長秒數
+CACHE_SWEEP_BUDGET_MS = float(os.getenv("CACHE_SWEEP_BUDGET_MS", "20"))  # 每次頁面執行時增量清理過期快取的時間預算
+
+# 各類數據的快取策略（未列出的類別使用 CACHE_DURATION）
+# ttl: 最長保存秒數；align/offset: 到期時間對齊上游更新週期（align=3600, offset=600 表示每小時的 :10 到期）
+# min_ttl: 對齊後至少保留的秒數；到期時間取 ttl 與下一個對齊點中較早者，align 應等於上游的實際更新週期
+CACHE_POLICIES = {
+    "geocoding": {"ttl": 30 * 24 * 3600},                                         # 地理位置幾乎不變
+    "current": {"ttl": 600, "align": 600, "offset": 60, "min_ttl": 60},           # 觀測約每 10 分鐘更新
+    "hourly": {"ttl": 3 * 3600, "align": 3600, "offset": 600, "min_ttl": 300},    # 3 小時預報，每小時 :10 更新
+    "daily": {"ttl": 6 * 3600, "align": 6 * 3600, "offset": 600, "min_ttl": 300},      # 每 6 小時一輪模式（UTC 00/06/12/18）
+    "climate": {"ttl": 12 * 3600, "align": 12 * 3600, "offset": 600, "min_ttl": 300},  # 每日兩次更新
+    "air_pollution": {"ttl": 3600, "align": 3600, "offset": 600, "min_ttl": 300}
+}
+# 過期項目回源時帶上 If-None-Match / If-Modified-Since，上游回應 304 時只延長到期時間
+CACHE_CONDITIONAL_REQUESTS = os.getenv("CACHE_CONDITIONAL_REQUESTS", "1") == "1"
+# 空結果（例如找不到城市）的快取秒數，避免重複查詢不存在的數據；仍受各類別的 ttl 上限限制
+CACHE_NEGATIVE_TTL = int(os.getenv("CACHE_NEGATIVE_TTL", "300"))
+
+# 端點回應這些狀態碼時，視為目前 API 方案不支援，在 CAPABILITY_TTL 秒內不再嘗試
+CAPABILITY_DENY_STATUSES = (401, 403, 404)
+CAPABILITY_TTL = int(os.getenv("CAPABILITY_TTL", str(24 * 3600)))
+
+# API 速率限制（所有伺服器行程共用；OpenWeather 免費方案為每分鐘 60 次）
+API_RATE_LIMIT_PER_MINUTE = int(os.getenv("API_RATE_LIMIT_PER_MINUTE", "60"))  # 0 表示不限制
+API_RATE_LIMIT_BURST = int(os.getenv("API_RATE_LIMIT_BURST", "20"))  # 可連續發出的請求數
+API_RATE_LIMIT_TIMEOUT = float(os.getenv("API_RATE_LIMIT_TIMEOUT", "10"))  # 等待配額的最長秒數
+
+# 斷路器（見 src/utils/circuit_breaker.py；所有伺服器行程共用狀態）
+CIRCUIT_BREAKER_ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "1") == "1"
+CIRCUIT_WINDOW = float(os.getenv("CIRCUIT_WINDOW", "60"))  # 失敗率統計窗口（秒）
+CIRCUIT_MIN_REQUESTS = int(os.getenv("CIRCUIT_MIN_REQUESTS", "5"))  # 窗口內至少要有這麼多請求才判斷失敗率
+CIRCUIT_FAILURE_RATE = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))  # 失敗率達到此值時開啟斷路器
+CIRCUIT_COOLDOWN = float(os.getenv("CIRCUIT_COOLDOWN", "30"))  # 開啟後多久放行一個探測請求（秒）
+CIRCUIT_PROBE_TIMEOUT = float(os.getenv("CIRCUIT_PROBE_TIMEOUT", "15"))  # 探測請求沒有回報結果時，多久後可再探測（秒）
+
+# 請求期限（見 src/utils/deadline.py）
+API_REQUEST_TIMEOUT = float(os.getenv("API_REQUEST_TIMEOUT", "10"))  # 單一 HTTP 請求的最長秒數（另受延遲預算限制）
+PAGE_LATENCY_BUDGET = float(os.getenv("PAGE_LATENCY_BUDGET", "6"))  # 頁面數據的延遲預算（秒），用完時改顯示快取中較早的數據
+DEADLINE_MIN_REQUEST_SECONDS = float(os.getenv("DEADLINE_MIN_REQUEST_SECONDS", "0.25"))  # 剩餘預算少於此值時不再發出請求
+
+# 數據處理設置
+PROCESSOR_MEMO_SIZE = int(os.getenv("PROCESSOR_MEMO_SIZE", "64"))  # 依數據版本保留的處理結果與圖表數量
+DERIVED_CACHE_ENABLED = os.getenv("DERIVED_CACHE_ENABLED", "1") == "1"  # 將處理結果（DataFrame）存到磁碟，重啟後仍可沿用
+DERIVED_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "derived")
+DERIVED_CACHE_TTL = int(os.getenv("DERIVED_CACHE_TTL", str(24 * 3600)))  # 處理結果保留秒數（原始數據改變時會立即失效）
+# 觀測歷史：每個地點以固定大小的環形緩衝區檔案記錄每次取得的當前天氣，用於趨勢小圖（見 src/utils/observation_history.py）
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "1") == "1"
+HISTORY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "history")
+HISTORY_CAPACITY = int(os.getenv("HISTORY_CAPACITY", "288"))  # 每個地點保留的筆數（當前天氣約每 10 分鐘更新，約 48 小時）
+HISTORY_OPEN_FILES = int(os.getenv("HISTORY_OPEN_FILES", "64"))  # 行程內同時開啟的地點檔案數上限
+HISTORY_SPARKLINE_HOURS = int(os.getenv("HISTORY_SPARKLINE_HOURS", "24"))  # 當前天氣下方趨勢小圖涵蓋的時數
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", str(os.cpu_count() or 1)))  # 批次處理的工作行程數，1 表示一律在目前行程處理
+PROCESS_POOL_MIN_ROWS = int(os.getenv("PROCESS_POOL_MIN_ROWS", "200000"))  # 批次資料筆數達到此值才交給行程池（小量資料的行程間傳輸成本高於計算）
+PROCESSOR_TIMEZONE = os.getenv("PROCESSOR_TIMEZONE", "Asia/Taipei")  # 精簡輸出（compact=True）的時間欄位時區
+# 每小時預報：3 小時預報內插後的時間間隔（秒）與介面顯示的時數（見 forecast_resample.upsample）
+HOURLY_INTERPOLATION_STEP = int(os.getenv("HOURLY_INTERPOLATION_STEP", "3600"))
+HOURLY_FORECAST_HOURS = int(os.getenv("HOURLY_FORECAST_HOURS", "48"))
+
+# 漸進式渲染：頁面先顯示標題，各區塊的數據在背景執行緒抓取，完成後填入各自的佔位元素（網址加上 ?progressive=0 可停用）
+PROGRESSIVE_RENDERING = os.getenv("PROGRESSIVE_RENDERING", "1") == "1"
+BACKGROUND_FETCH_WORKERS = int(os.getenv("BACKGROUND_FETCH_WORKERS", "8"))  # 背景抓取數據的執行緒數（所有 session 共用）
+# 各區塊自頁面開始最多等待數據的秒數（應大於 PAGE_LATENCY_BUDGET，作為沒有快取可用時的上限）；
+# 逾時的區塊顯示提示，背景抓取仍會完成並寫入快取
+SECTION_TIMEOUTS = {
+    "current": 10,
+    "hourly": 15,
+    "daily": 15,
+    "monthly": 20,
+    "air_quality": 15,
+    "map": 20
+}
+SECTION_TIMEOUT_DEFAULT = float(os.getenv("SECTION_TIMEOUT_DEFAULT", "15"))  # 未列在 SECTION_TIMEOUTS 的區塊
+
+# 天氣警報設置
+# 警報等級，由低到高排列；多個警報同時成立時取最高者
+ALERT_LEVELS = ["正常", "警告", "危險"]
+# 警報規則：同一 group 內依序比對，只取第一個成立的規則（例如極端高溫優先於高溫）
+# field: 處理後數據的欄位；op: >=、>、<=、<；level: ALERT_LEVELS 之一
+ALERT_RULES = [
+    {"name": "極端高溫警報", "group": "temperature", "field": "temperature", "op": ">=", "value": 38, "level": "危險"},
+    {"name": "高溫警報", "group": "temperature", "field": "temperature", "op": ">=", "value": 35, "level": "警告"},
+    {"name": "低溫警報", "group": "temperature", "field": "temperature", "op": "<=", "value": 0, "level": "警告"},
+    {"name": "高濕度警報", "group": "humidity", "field": "humidity", "op": ">=", "value": 85, "level": "警告"},
+    {"name": "強風警報", "group": "wind", "field": "wind_speed", "op": ">=", "value": 20, "level": "危險"},
+    {"name": "大風警報", "group": "wind", "field": "wind_speed", "op": ">=", "value": 15, "level": "警告"}
+]
+
+# 日誌設置
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # text 或 json（結構化）
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))  # 回應內容最多記錄的字元數
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "1"))  # 同一則 DEBUG/INFO 訊息每 N 則保留 1 則
+
+# 效能指標設置
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 大於 0 時提供 Prometheus /metrics 端點
+METRICS_EXPORT_PATH = os.getenv(
+    "METRICS_EXPORT_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "logs", "metrics.prom")
+)  # 設為空字串可停用檔案匯出
+METRICS_EXPORT_INTERVAL = int(os.getenv("METRICS_EXPORT_INTERVAL", "30"))  # 檔案匯出間隔（秒）
+METRICS_DEBUG_PANEL = os.getenv("METRICS_DEBUG_PANEL", "0") == "1"  # 在側邊欄顯示效能指標面板
+
+# 效能剖析設置（亦可在網址加上 ?profile=1 或 ?profile=full 針對單次瀏覽啟用）
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "0") == "1"  # 剖析每一次 rerun
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # 抽樣剖析的比例，例如 0.01
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sections")  # sections（僅區塊耗時）或 cprofile
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "logs", "profiles")
+PROFILE_TOP_FUNCTIONS = 15  # 摘要中列出的函式數
+
+# 多行程服務設置（python run.py --workers N）
+WORKERS = int(os.getenv("WORKERS", "1"))  # Streamlit 工作行程數，大於 1 時啟用負載平衡器
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8501"))  # 對外服務埠
+WORKER_BASE_PORT = int(os.getenv("WORKER_BASE_PORT", "8600"))  # 工作行程使用 WORKER_BASE_PORT + i（只監聽 127.0.0.1）
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "5"))  # 健康檢查間隔（秒）
+WORKER_START_TIMEOUT = float(os.getenv("WORKER_START_TIMEOUT", "60"))  # 等待工作行程通過健康檢查的最長秒數
+WORKER_DRAIN_TIMEOUT = float(os.getenv("WORKER_DRAIN_TIMEOUT", "30"))  # 重啟前等待既有連線結束的最長秒數
+
+# HTTP 服務設置（python serve_api.py）
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8080"))
+SERVICE_BATCH_MAX = int(os.getenv("SERVICE_BATCH_MAX", "50"))  # 批次查詢一次最多的地點數
+SERVICE_COMPRESS_MIN_BYTES = int(os.getenv("SERVICE_COMPRESS_MIN_BYTES", "512"))  # 回應超過此大小才壓縮
+SERVICE_RESPONSE_CACHE_SIZE = int(os.getenv("SERVICE_RESPONSE_CACHE_SIZE", "256"))  # 保留已編碼回應本體的數量
 
 # UI設置
 UI_THEME = "light"
-REFRESH_RATE = 300  # 5分鐘自動刷新
+REFRESH_RATE = int(os.getenv("REFRESH_RATE", "300"))  # 5分鐘自動刷新：每個有人觀看的地點在背景更新數據的間隔（秒）
+# 自動更新：數據變動時由伺服器通知觀看該地點的 session 重新執行（見 src/utils/refresh.py）
+AUTO_REFRESH = os.getenv("AUTO_REFRESH", "1") == "1"
+# 自動更新專用的執行緒數（不佔用頁面載入用的 BACKGROUND_FETCH_WORKERS）
+REFRESH_WORKERS = int(os.getenv("REFRESH_WORKERS", "2"))
 MAX_FORECAST_DAYS = 30  # 支援最多30天預報
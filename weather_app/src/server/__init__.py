@@ -0,0 +1,8 @@
+"""
+多行程服務模組：負載平衡器與工作行程管理
+"""
+
+from .balancer import Backend, LoadBalancer
+from .supervisor import Supervisor, run_supervisor
+
+__all__ = ['Backend', 'LoadBalancer', 'Supervisor', 'run_supervisor']
@@ -0,0 +1,152 @@
+"""
+本機 TCP 負載平衡器：把瀏覽器連線轉送到多個 Streamlit 工作行程
+
+Streamlit 的 session 狀態保存在建立 WebSocket 的工作行程中，因此同一個用戶端必須固定送往同一個
+工作行程（sticky session）。這裡以用戶端 IP 做 rendezvous hashing：工作行程不可用時，只有原本分配
+給它的用戶端會改送其他行程，其餘用戶端不受影響。
+
+轉送在 TCP 層進行，不解析 HTTP，因此 WebSocket 與一般請求都能直接通過。
+"""
+import asyncio
+import hashlib
+from typing import List, Optional
+
+from src.config.config import HEALTH_CHECK_INTERVAL
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+HEALTH_PATH = "/_stcore/health"
+
+_UNAVAILABLE_BODY = "服務啟動中，請稍後重新整理".encode("utf-8")
+UNAVAILABLE_RESPONSE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Content-Type: text/plain; charset=utf-8\r\n"
+    b"Retry-After: 2\r\n"
+    b"Connection: close\r\n"
+    b"Content-Length: " + str(len(_UNAVAILABLE_BODY)).encode() + b"\r\n\r\n" + _UNAVAILABLE_BODY
+)
+
+
+class Backend:
+    """一個工作行程的位址與狀態"""
+
+    def __init__(self, index: int, host: str, port: int):
+        self.index = index
+        self.host = host
+        self.port = port
+        self.healthy = False
+        self.draining = False  # 重啟前不再接受新連線
+        self.active = 0  # 目前轉送中的連線數
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and not self.draining
+
+    def __repr__(self) -> str:
+        return f"worker-{self.index}({self.host}:{self.port})"
+
+
+async def check_health(backend: Backend, timeout: float = 2.0) -> bool:
+    """向工作行程的 Streamlit 健康檢查端點發出請求"""
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(backend.host, backend.port), timeout
+        )
+    except (OSError, asyncio.TimeoutError):
+        return False
+    try:
+        writer.write(f"GET {HEALTH_PATH} HTTP/1.0\r\nHost: {backend.host}\r\n\r\n".encode("ascii"))
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        return status_line.split(b" ")[1:2] == [b"200"]
+    except (OSError, asyncio.TimeoutError):
+        return False
+    finally:
+        writer.close()
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, OSError):
+        pass
+    finally:
+        if not writer.is_closing():
+            writer.close()
+
+
+class LoadBalancer:
+    """
+    Args:
+        backends: 工作行程列表
+        health_interval: 健康檢查間隔（秒）
+    """
+
+    def __init__(self, backends: List[Backend], health_interval: float = HEALTH_CHECK_INTERVAL):
+        self.backends = backends
+        self.health_interval = health_interval
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def pick(self, client: str) -> Optional[Backend]:
+        """以 rendezvous hashing 為用戶端選擇可用的工作行程"""
+        candidates = [b for b in self.backends if b.available]
+        if not candidates:
+            return None
+        return max(
+            candidates,
+            key=lambda b: hashlib.blake2b(f"{client}|{b.port}".encode(), digest_size=8).digest()
+        )
+
+    async def _handle(self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter) -> None:
+        peer = client_writer.get_extra_info("peername")
+        client = peer[0] if peer else ""
+        backend = self.pick(client)
+        if backend is None:
+            client_writer.write(UNAVAILABLE_RESPONSE)
+            await client_writer.drain()
+            client_writer.close()
+            return
+
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(backend.host, backend.port)
+        except OSError as e:
+            logger.warning("無法連線到 %s: %s", backend, e)
+            backend.healthy = False
+            client_writer.write(UNAVAILABLE_RESPONSE)
+            await client_writer.drain()
+            client_writer.close()
+            return
+
+        backend.active += 1
+        try:
+            await asyncio.gather(
+                _pipe(client_reader, upstream_writer),
+                _pipe(upstream_reader, client_writer)
+            )
+        finally:
+            backend.active -= 1
+
+    async def health_loop(self) -> None:
+        """定期檢查所有工作行程，狀態改變時記錄日誌"""
+        while True:
+            results = await asyncio.gather(*(check_health(b) for b in self.backends))
+            for backend, healthy in zip(self.backends, results):
+                if healthy != backend.healthy:
+                    logger.info("%s %s", backend, "恢復正常" if healthy else "健康檢查失敗")
+                backend.healthy = healthy
+            await asyncio.sleep(self.health_interval)
+
+    async def start(self, host: str, port: int) -> None:
+        self._server = await asyncio.start_server(self._handle, host, port)
+        logger.info("負載平衡器監聽 %s:%s，工作行程: %s", host, port, self.backends)
+
+    async def stop(self) -> None:
+        """停止接受新連線（不等待既有的 WebSocket 連線結束，它們會隨工作行程結束而關閉）"""
+        if self._server is not None:
+            self._server.close()
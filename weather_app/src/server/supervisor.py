@@ -0,0 +1,199 @@
+"""
+多行程服務：啟動 N 個 Streamlit 工作行程並在前方執行負載平衡器
+
+- 每個工作行程只監聽 127.0.0.1:WORKER_BASE_PORT + i，對外只開放負載平衡器的埠
+- 工作行程共用 data/cache 快取目錄與 API 速率限制狀態（兩者都以檔案鎖跨行程互斥）
+- 工作行程意外結束時自動重新啟動
+- 收到 SIGHUP 時逐一滾動重啟：先停止分配新連線、等待既有連線結束（最多 WORKER_DRAIN_TIMEOUT 秒），
+  再重啟並等到通過健康檢查後才處理下一個，服務不中斷
+- 收到 SIGINT / SIGTERM 時停止接受連線並結束所有工作行程
+"""
+import asyncio
+import os
+import signal
+import time
+from typing import Dict, Optional
+
+from src.config.config import (
+    WORKER_BASE_PORT, WORKER_START_TIMEOUT, WORKER_DRAIN_TIMEOUT, METRICS_PORT, METRICS_EXPORT_PATH
+)
+from src.server.balancer import Backend, LoadBalancer, check_health
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+WORKER_HOST = "127.0.0.1"
+
+
+class Supervisor:
+    """
+    Args:
+        app_path: Streamlit 應用程式路徑
+        workers: 工作行程數
+        project_dir: 專案根目錄（工作行程的 PYTHONPATH）
+        base_port: 第一個工作行程的埠
+    """
+
+    def __init__(self, app_path: str, workers: int, project_dir: str, base_port: int = WORKER_BASE_PORT):
+        self.app_path = app_path
+        self.project_dir = project_dir
+        self.backends = [Backend(i, WORKER_HOST, base_port + i) for i in range(workers)]
+        self.balancer = LoadBalancer(self.backends)
+        self._processes: Dict[int, asyncio.subprocess.Process] = {}
+        self._restarting = set()
+        self._stopping = asyncio.Event()
+        self._rolling: Optional[asyncio.Task] = None
+
+    def _worker_env(self, backend: Backend) -> Dict[str, str]:
+        env = os.environ.copy()
+        env["PYTHONPATH"] = self.project_dir
+        env["WORKER_ID"] = str(backend.index)
+        # 各工作行程的指標分開匯出，避免搶同一個埠或互相覆寫檔案
+        if METRICS_PORT:
+            env["METRICS_PORT"] = str(METRICS_PORT + backend.index)
+        if METRICS_EXPORT_PATH:
+            root, ext = os.path.splitext(METRICS_EXPORT_PATH)
+            env["METRICS_EXPORT_PATH"] = f"{root}-worker{backend.index}{ext}"
+        return env
+
+    async def _spawn(self, backend: Backend) -> None:
+        backend.healthy = False
+        self._processes[backend.index] = await asyncio.create_subprocess_exec(
+            "streamlit", "run", self.app_path,
+            "--server.port", str(backend.port),
+            "--server.address", backend.host,
+            "--server.headless", "true",
+            env=self._worker_env(backend)
+        )
+        logger.info("已啟動 %s（pid %s）", backend, self._processes[backend.index].pid)
+
+    async def _wait_healthy(self, backend: Backend, timeout: float = WORKER_START_TIMEOUT) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            process = self._processes.get(backend.index)
+            if process is None or process.returncode is not None:
+                return False
+            if await check_health(backend):
+                backend.healthy = True
+                return True
+            await asyncio.sleep(0.5)
+        return False
+
+    async def _terminate(self, backend: Backend, timeout: float = 10.0) -> None:
+        process = self._processes.get(backend.index)
+        if process is None or process.returncode is not None:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%s 未在 %s 秒內結束，強制終止", backend, timeout)
+            process.kill()
+            await process.wait()
+
+    async def restart(self, backend: Backend) -> bool:
+        """排空連線後重啟單一工作行程，返回是否通過健康檢查"""
+        self._restarting.add(backend.index)
+        backend.draining = True
+        try:
+            deadline = time.monotonic() + WORKER_DRAIN_TIMEOUT
+            while backend.active and time.monotonic() < deadline:
+                await asyncio.sleep(0.5)
+            if backend.active:
+                logger.info("%s 仍有 %d 個連線，逾時後直接重啟", backend, backend.active)
+            await self._terminate(backend)
+            await self._spawn(backend)
+            healthy = await self._wait_healthy(backend)
+            if not healthy:
+                logger.error("%s 重啟後未通過健康檢查", backend)
+            return healthy
+        finally:
+            backend.draining = False
+            self._restarting.discard(backend.index)
+
+    async def rolling_restart(self) -> None:
+        """逐一重啟所有工作行程（SIGHUP）"""
+        logger.info("開始滾動重啟 %d 個工作行程", len(self.backends))
+        for backend in self.backends:
+            if self._stopping.is_set():
+                return
+            if not await self.restart(backend):
+                logger.error("滾動重啟中止於 %s", backend)
+                return
+        logger.info("滾動重啟完成")
+
+    def _request_rolling_restart(self) -> None:
+        if self._rolling is not None and not self._rolling.done():
+            logger.info("滾動重啟進行中，忽略重複的重啟要求")
+            return
+        self._rolling = asyncio.get_running_loop().create_task(self.rolling_restart())
+
+    async def _watch(self) -> None:
+        """工作行程意外結束時重新啟動（指數退避，避免啟動即崩潰時反覆重啟）"""
+        backoff: Dict[int, float] = {}
+        while not self._stopping.is_set():
+            for backend in self.backends:
+                process = self._processes.get(backend.index)
+                if backend.index in self._restarting or process is None or process.returncode is None:
+                    continue
+                logger.error("%s 意外結束（exit %s），重新啟動", backend, process.returncode)
+                delay = backoff.get(backend.index, 1.0)
+                backoff[backend.index] = min(delay * 2, 60.0)
+                self._restarting.add(backend.index)
+                asyncio.get_running_loop().create_task(self._respawn_after(backend, delay, backoff))
+            await asyncio.sleep(1.0)
+
+    async def _respawn_after(self, backend: Backend, delay: float, backoff: Dict[int, float]) -> None:
+        try:
+            await asyncio.sleep(delay)
+            if self._stopping.is_set():
+                return
+            await self._spawn(backend)
+            if await self._wait_healthy(backend):
+                backoff.pop(backend.index, None)
+        finally:
+            self._restarting.discard(backend.index)
+
+    def _install_signal_handlers(self) -> None:
+        loop = asyncio.get_running_loop()
+        handlers = {signal.SIGINT: self._stopping.set, signal.SIGTERM: self._stopping.set}
+        if hasattr(signal, "SIGHUP"):
+            handlers[signal.SIGHUP] = self._request_rolling_restart
+        for sig, handler in handlers.items():
+            try:
+                loop.add_signal_handler(sig, handler)
+            except NotImplementedError:
+                # Windows 的事件迴圈不支援訊號處理，Ctrl+C 由 KeyboardInterrupt 處理
+                pass
+
+    async def serve(self, host: str, port: int) -> None:
+        """啟動工作行程與負載平衡器，直到收到結束訊號"""
+        self._install_signal_handlers()
+        await asyncio.gather(*(self._spawn(b) for b in self.backends))
+        await self.balancer.start(host, port)
+        tasks = [
+            asyncio.create_task(self.balancer.health_loop()),
+            asyncio.create_task(self._watch())
+        ]
+        ready = await asyncio.gather(*(self._wait_healthy(b) for b in self.backends))
+        logger.info("%d/%d 個工作行程已就緒，服務位址 http://%s:%s", sum(ready), len(ready), host, port)
+
+        try:
+            await self._stopping.wait()
+        finally:
+            logger.info("正在停止服務")
+            for task in tasks:
+                task.cancel()
+            if self._rolling is not None:
+                self._rolling.cancel()
+            await self.balancer.stop()
+            await asyncio.gather(*(self._terminate(b) for b in self.backends))
+
+
+def run_supervisor(app_path: str, workers: int, host: str, port: int, project_dir: str) -> None:
+    """同步入口（供 run.py 使用）"""
+    supervisor = Supervisor(app_path, workers, project_dir)
+    try:
+        asyncio.run(supervisor.serve(host, port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,7 @@
+"""
+HTTP 服務模組：無介面的 JSON / Arrow 天氣數據服務（ASGI）
+"""
+
+from .app import WeatherService, app
+
+__all__ = ['WeatherService', 'app']
@@ -0,0 +1,482 @@
+"""
+無介面的 HTTP 服務（ASGI）：以 JSON 或 Arrow 提供 WeatherAPI + DataProcessor 的結果
+
+端點（皆為 GET，batch 亦接受 POST）：
+
+    /v1/current?lat=25.03&lon=121.56
+    /v1/hourly?lat=25.03&lon=121.56&step=3600
+    /v1/daily?lat=25.03&lon=121.56&days=7
+    /v1/air-quality?lat=25.03&lon=121.56
+    /v1/geocode?q=Taipei&country=TW
+    /v1/batch?kind=hourly&locations=25.03,121.56;22.63,120.30
+    /healthz
+    /metrics
+
+- raw=1 返回上游原始數據（每小時預報只含處理時用到的欄位），否則返回 DataProcessor 處理後的結果
+- 每日預報的 days 介於 1 與 16 之間（預設 7），超出範圍或座標不是有限的數字時返回 400
+- 每小時預報可加上 step=秒數，把 3 小時預報內插為該間隔；batch 會一次內插所有地點
+- format=arrow 或 Accept: application/vnd.apache.arrow.stream 時以 Arrow IPC stream 返回（需要 pyarrow）
+- 依 Accept-Encoding 以 br（需要 brotli）或 gzip 壓縮
+- ETag 由數據版本計算，If-None-Match 相符時返回 304，不必處理或編碼數據
+
+與 Streamlit 介面共用同一個快取目錄、處理結果快取與 API 速率限制。
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import math
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import numpy as np
+import pandas as pd
+import requests
+
+from src.api.weather_api import DAILY_MAX_DAYS, WeatherAPI
+from src.config.config import SERVICE_BATCH_MAX, SERVICE_COMPRESS_MIN_BYTES, SERVICE_RESPONSE_CACHE_SIZE
+from src.utils import metrics
+from src.utils.capabilities import EndpointUnavailable
+from src.utils.circuit_breaker import CircuitOpen
+from src.utils.compact_forecast import HourlyForecast
+from src.utils.data_processor import DataProcessor, PROCESSOR_VERSION
+from src.utils.logger import setup_logger
+from src.utils.rate_limiter import RateLimitExceeded
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+logger = setup_logger(__name__)
+
+SERVICE_REQUESTS = metrics.counter("service_requests_total", "HTTP 服務請求數", ["route", "status"])
+SERVICE_SECONDS = metrics.histogram("service_request_seconds", "HTTP 服務請求耗時", ["route"])
+
+JSON_TYPE = "application/json"
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+
+# 路徑 -> (數據類別, WeatherAPI 方法, DataProcessor 方法)
+KINDS = {
+    "current": ("current", "get_current_weather_versioned", "process_current_weather"),
+    "hourly": ("hourly", "get_hourly_forecast_versioned", "process_hourly_forecast"),
+    "daily": ("daily", "get_daily_forecast_versioned", "process_daily_forecast"),
+    "air-quality": ("air_pollution", "get_air_pollution_versioned", "process_air_pollution")
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, pd.DataFrame):
+        return obj.to_dict("records")
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"無法序列化的類型: {type(obj)}")
+
+
+def encode_json(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, default=_json_default).encode("utf-8")
+
+
+def _to_table(result: Any, **columns) -> "pa.Table":
+    if isinstance(result, pd.DataFrame):
+        table = pa.Table.from_pandas(result, preserve_index=False)
+    else:
+        table = pa.Table.from_pylist(result if isinstance(result, list) else [result])
+    for name, value in columns.items():
+        table = table.append_column(name, pa.array([value] * table.num_rows, pa.float64()))
+    return table
+
+
+def encode_arrow(table: "pa.Table") -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _accepted_encodings(header: str) -> List[str]:
+    """解析 Accept-Encoding，返回可接受的編碼（忽略 q=0）"""
+    accepted = []
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.append(name.lower())
+    return accepted
+
+
+def _parse_float(query: Dict[str, List[str]], name: str) -> float:
+    try:
+        value = float(query[name][0])
+    except (KeyError, IndexError):
+        raise HTTPError(400, f"缺少參數 {name}")
+    except ValueError:
+        raise HTTPError(400, f"參數 {name} 不是數字")
+    if not math.isfinite(value):
+        raise HTTPError(400, f"參數 {name} 不是有限的數字")
+    return value
+
+
+def _parse_days(value: Any) -> int:
+    """解析每日預報的天數，未指定時為 7"""
+    if value in (None, ""):
+        return 7
+    try:
+        days = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise HTTPError(400, "參數 days 不是整數")
+    if not 1 <= days <= DAILY_MAX_DAYS:
+        raise HTTPError(400, f"參數 days 必須介於 1 與 {DAILY_MAX_DAYS} 之間")
+    return days
+
+
+def _parse_step(value: Any) -> Optional[int]:
+    """解析每小時預報的內插間隔（秒），未指定時為 None"""
+    if value in (None, ""):
+        return None
+    try:
+        step = int(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, "參數 step 不是整數")
+    if not 60 <= step <= 10800:
+        raise HTTPError(400, "參數 step 必須介於 60 與 10800 秒之間")
+    return step
+
+
+def _parse_locations(value: str) -> List[Tuple[float, float]]:
+    """解析 "lat,lon;lat,lon" 格式的地點列表"""
+    locations = []
+    for item in filter(None, value.split(";")):
+        try:
+            lat, lon = (float(v) for v in item.split(","))
+        except ValueError:
+            raise HTTPError(400, f"無效的地點: {item}")
+        locations.append((lat, lon))
+    return locations
+
+
+class WeatherService:
+    """
+    ASGI 應用程式
+
+    Args:
+        weather_api: 使用的 WeatherAPI，預設建立共用模組快取的實例
+        data_processor: 使用的 DataProcessor
+    """
+
+    def __init__(self, weather_api: Optional[WeatherAPI] = None, data_processor: Optional[DataProcessor] = None):
+        self.weather_api = weather_api or WeatherAPI()
+        self.data_processor = data_processor or DataProcessor()
+        # (ETag, 格式, 要求的編碼) -> (回應本體, 實際編碼)；同一版本的數據不重複序列化與壓縮
+        self._bodies: "OrderedDict[tuple, Tuple[bytes, Optional[str]]]" = OrderedDict()
+
+    # --- 數據 ---
+
+    def _load(self, kind: str, lat: float, lon: float, days: int) -> Tuple[Any, Any]:
+        """取得原始數據（優先使用快取），返回 (數據版本, 原始數據)"""
+        getter = getattr(self.weather_api, KINDS[kind][1])
+        # 數據與版本由同一次呼叫返回，版本（ETag）一定對應回應的數據
+        data, version = getter(lat, lon, days) if kind == "daily" else getter(lat, lon)
+        return version, data
+
+    def _process(self, kind: str, version: Any, data: Any, raw: bool, step: Optional[int] = None) -> Any:
+        if raw:
+            # 每小時預報在記憶體中是精簡的 HourlyForecast，輸出時還原為 list
+            return data.to_items() if isinstance(data, HourlyForecast) else data
+        if step is not None and kind == "hourly":
+            return self.data_processor.process_versioned("process_hourly_interpolated", version, data, step=step)
+        return self.data_processor.process_versioned(KINDS[kind][2], version, data)
+
+    async def _run(self, func: Callable, *args) -> Any:
+        """在執行緒池中執行阻塞的 WeatherAPI / DataProcessor 呼叫"""
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+        except RateLimitExceeded as e:
+            raise HTTPError(429, str(e))
+        except requests.exceptions.HTTPError as e:
+            upstream = e.response.status_code if e.response is not None else 502
+            raise HTTPError(404 if upstream == 404 else 502, f"上游服務錯誤: {upstream}")
+        except EndpointUnavailable as e:
+            raise HTTPError(404 if e.status == 404 else 502, str(e))
+        except CircuitOpen as e:
+            raise HTTPError(503, str(e))
+        except requests.exceptions.RequestException as e:
+            raise HTTPError(504, f"無法連線到上游服務: {e}")
+
+    # --- 回應 ---
+
+    def _etag(self, *parts: Any) -> str:
+        digest = hashlib.blake2b(repr((PROCESSOR_VERSION,) + parts).encode("utf-8"), digest_size=12).hexdigest()
+        # 同一份數據的不同壓縮編碼內容不同，因此使用弱 ETag
+        return f'W/"{digest}"'
+
+    def _negotiate_format(self, query: Dict[str, List[str]], headers: Dict[str, str]) -> str:
+        requested = query.get("format", [""])[0]
+        if requested == "arrow" or (not requested and ARROW_TYPE in headers.get("accept", "")):
+            if pa is None:
+                raise HTTPError(406, "伺服器未安裝 pyarrow，無法輸出 Arrow")
+            return "arrow"
+        if requested not in ("", "json"):
+            raise HTTPError(400, f"不支援的格式: {requested}")
+        return "json"
+
+    def _negotiate_encoding(self, headers: Dict[str, str]) -> Optional[str]:
+        accepted = _accepted_encodings(headers.get("accept-encoding", ""))
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def _body(self, cache_key: tuple, build: Callable[[], bytes], encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """編碼並壓縮回應本體，結果依 (ETag, 格式, 編碼) 保留"""
+        key = cache_key + (encoding,)
+        cached = self._bodies.get(key)
+        if cached is not None:
+            self._bodies.move_to_end(key)
+            return cached
+
+        body = build()
+        if encoding and len(body) >= SERVICE_COMPRESS_MIN_BYTES:
+            body = brotli.compress(body, quality=5) if encoding == "br" else gzip.compress(body, compresslevel=6)
+        else:
+            encoding = None
+        self._bodies[key] = (body, encoding)
+        while len(self._bodies) > SERVICE_RESPONSE_CACHE_SIZE:
+            self._bodies.popitem(last=False)
+        return body, encoding
+
+    async def _respond_data(self, send: Callable, headers: Dict[str, str], etag: str, fmt: str,
+                            build_json: Callable[[], bytes], build_arrow: Callable[[], bytes],
+                            extra_headers: Optional[List[Tuple[bytes, bytes]]] = None) -> int:
+        response_headers = [
+            (b"etag", etag.encode("ascii")),
+            (b"cache-control", b"no-cache"),
+            (b"vary", b"Accept, Accept-Encoding")
+        ] + (extra_headers or [])
+
+        if_none_match = headers.get("if-none-match", "")
+        if if_none_match.strip() == "*" or etag in (t.strip() for t in if_none_match.split(",")):
+            await self._send(send, 304, b"", response_headers)
+            return 304
+
+        encoding = self._negotiate_encoding(headers)
+        build = build_arrow if fmt == "arrow" else build_json
+        body, encoding = self._body((etag, fmt), build, encoding)
+        response_headers.append((b"content-type", (ARROW_TYPE if fmt == "arrow" else JSON_TYPE).encode("ascii")))
+        if encoding:
+            response_headers.append((b"content-encoding", encoding.encode("ascii")))
+        await self._send(send, 200, body, response_headers)
+        return 200
+
+    @staticmethod
+    async def _send(send: Callable, status: int, body: bytes, headers: List[Tuple[bytes, bytes]]) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": headers + [(b"content-length", str(len(body)).encode("ascii"))]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    # --- 路由 ---
+
+    async def _single(self, kind: str, query, headers, send) -> int:
+        lat, lon = _parse_float(query, "lat"), _parse_float(query, "lon")
+        days = _parse_days(query.get("days", [None])[0])
+        raw = query.get("raw", ["0"])[0] == "1"
+        step = _parse_step(query.get("step", [None])[0])
+        fmt = self._negotiate_format(query, headers)
+
+        version, data = await self._run(self._load, kind, lat, lon, days)
+        etag = self._etag(kind, version, raw, fmt, step)
+        result: Dict[str, Any] = {}
+
+        def processed():
+            if "value" not in result:
+                result["value"] = self._process(kind, version, data, raw, step)
+            return result["value"]
+
+        # 304 時不需要處理；需要回應本體時才在執行緒池中處理
+        if etag not in headers.get("if-none-match", ""):
+            await self._run(processed)
+        return await self._respond_data(
+            send, headers, etag, fmt,
+            lambda: encode_json(processed()),
+            lambda: encode_arrow(_to_table(processed()))
+        )
+
+    async def _batch(self, query, headers, body: bytes, send) -> int:
+        if body:
+            try:
+                payload = json.loads(body)
+                kind = payload.get("kind", "")
+                locations = [
+                    (float(loc["lat"]), float(loc["lon"])) if isinstance(loc, dict) else (float(loc[0]), float(loc[1]))
+                    for loc in payload.get("locations", [])
+                ]
+                days = payload.get("days")
+                raw = bool(payload.get("raw", False))
+                step = payload.get("step")
+            except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                raise HTTPError(400, "無效的 JSON 請求內容")
+        else:
+            kind = query.get("kind", [""])[0]
+            locations = _parse_locations(query.get("locations", [""])[0])
+            days = query.get("days", [None])[0]
+            raw = query.get("raw", ["0"])[0] == "1"
+            step = query.get("step", [None])[0]
+        days = _parse_days(days)
+        if not all(math.isfinite(lat) and math.isfinite(lon) for lat, lon in locations):
+            raise HTTPError(400, "地點座標必須是有限的數字")
+        step = _parse_step(step) if kind == "hourly" and not raw else None
+
+        if kind not in KINDS:
+            raise HTTPError(400, f"kind 必須是 {', '.join(KINDS)} 之一")
+        if not locations:
+            raise HTTPError(400, "缺少 locations")
+        if len(locations) > SERVICE_BATCH_MAX:
+            raise HTTPError(400, f"一次最多查詢 {SERVICE_BATCH_MAX} 個地點")
+        fmt = self._negotiate_format(query, headers)
+
+        async def load_one(lat: float, lon: float) -> Dict[str, Any]:
+            try:
+                version, data = await self._run(self._load, kind, lat, lon, days)
+                return {"lat": lat, "lon": lon, "version": version, "raw_data": data}
+            except HTTPError as e:
+                return {"lat": lat, "lon": lon, "error": e.message, "status": e.status}
+
+        items = await asyncio.gather(*(load_one(lat, lon) for lat, lon in locations))
+        etag = self._etag("batch", kind, raw, fmt, step,
+                          tuple((i["lat"], i["lon"], i.get("version"), i.get("status")) for i in items))
+
+        def process_all():
+            pending = [item for item in items if "raw_data" in item and "data" not in item]
+            if step is not None and pending:
+                # 所有地點一次向量化內插，再逐一轉為 DataFrame
+                upsampled = self.data_processor.interpolate_hourly(
+                    {i: item["raw_data"] for i, item in enumerate(pending)}, step=step)
+                for i, item in enumerate(pending):
+                    item["data"] = self.data_processor.process_hourly_forecast(upsampled[i])
+            for item in items:
+                if "raw_data" in item and "data" not in item:
+                    item["data"] = self._process(kind, item["version"], item["raw_data"], raw)
+            return items
+
+        def build_json():
+            return encode_json({"kind": kind, "results": [
+                {"lat": i["lat"], "lon": i["lon"], "data": i["data"]} if "data" in i
+                else {"lat": i["lat"], "lon": i["lon"], "error": i["error"]}
+                for i in process_all()
+            ]})
+
+        def build_arrow():
+            tables = [_to_table(i["data"], lat=i["lat"], lon=i["lon"]) for i in process_all() if "data" in i]
+            return encode_arrow(pa.concat_tables(tables, promote_options="default"))
+
+        if etag not in headers.get("if-none-match", ""):
+            await self._run(process_all)
+        failed = [f"{i['lat']},{i['lon']}" for i in items if "error" in i]
+        extra = [(b"x-failed-locations", ";".join(failed).encode("ascii"))] if failed else None
+        return await self._respond_data(send, headers, etag, fmt, build_json, build_arrow, extra)
+
+    async def _geocode(self, query, headers, send) -> int:
+        name = query.get("q", [""])[0]
+        if not name:
+            raise HTTPError(400, "缺少參數 q")
+        country = query.get("country", [None])[0]
+        fmt = self._negotiate_format(query, headers)
+        data, version = await self._run(self.weather_api.get_location_by_name_versioned, name, country)
+        etag = self._etag("geocode", version, fmt)
+        return await self._respond_data(send, headers, etag, fmt,
+                                        lambda: encode_json(data), lambda: encode_arrow(_to_table(data)))
+
+    async def _dispatch(self, method: str, path: str, query, headers, body: bytes, send) -> int:
+        if path == "/healthz":
+            await self._send(send, 200, b'{"status":"ok"}', [(b"content-type", JSON_TYPE.encode("ascii"))])
+            return 200
+        if path == "/metrics":
+            await self._send(send, 200, metrics.REGISTRY.render_prometheus().encode("utf-8"),
+                             [(b"content-type", b"text/plain; version=0.0.4; charset=utf-8")])
+            return 200
+        if path == "/v1/batch":
+            if method not in ("GET", "POST"):
+                raise HTTPError(405, "僅支援 GET 與 POST")
+            return await self._batch(query, headers, body if method == "POST" else b"", send)
+        if method != "GET":
+            raise HTTPError(405, "僅支援 GET")
+        if path == "/v1/geocode":
+            return await self._geocode(query, headers, send)
+        if path.startswith("/v1/") and path[4:] in KINDS:
+            return await self._single(path[4:], query, headers, send)
+        raise HTTPError(404, f"找不到路徑: {path}")
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    metrics.start_exporters()
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        if scope["method"] == "POST":
+            more_body = True
+            while more_body:
+                message = await receive()
+                body += message.get("body", b"")
+                more_body = message.get("more_body", False)
+
+        path = scope["path"]
+        known = path in ("/healthz", "/metrics", "/v1/batch", "/v1/geocode") or (path.startswith("/v1/") and path[4:] in KINDS)
+        route = path if known else "other"
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+
+        start = time.perf_counter()
+        try:
+            status = await self._dispatch(scope["method"], path, query, headers, body, send)
+        except HTTPError as e:
+            status = e.status
+            await self._send(send, status, encode_json({"error": e.message}),
+                             [(b"content-type", JSON_TYPE.encode("ascii"))])
+        except Exception as e:
+            status = 500
+            logger.error("處理請求 %s 失敗: %s", path, e, exc_info=True)
+            await self._send(send, status, encode_json({"error": "伺服器內部錯誤"}),
+                             [(b"content-type", JSON_TYPE.encode("ascii"))])
+        SERVICE_SECONDS.observe(time.perf_counter() - start, route=route)
+        SERVICE_REQUESTS.inc(route=route, status=status)
+        logger.info("%s %s %s", scope["method"], path, status,
+                    extra={"endpoint": route, "status": status,
+                           "latency_ms": round((time.perf_counter() - start) * 1000, 1)})
+
+
+app = WeatherService()
@@ -1,17 +1,27 @@
 """
 使用者介面模組
+
+各組件在第一次取用時才匯入（plotly、folium 等模組較重），
+匯入 src.ui.progressive 等單一組件時不會連帶載入整個套件。
 """
+import importlib
+
+# 匯出名稱 -> 所在的子模組
+_EXPORTS = {
+    'show_current_weather': 'current_weather',
+    'show_hourly_forecast': 'forecast',
+    'show_daily_forecast': 'forecast',
+    'show_monthly_forecast': 'forecast',
+    'show_air_quality': 'air_quality',
+    'show_weather_map': 'weather_map',
+    'show_metrics_panel': 'debug_panel',
+    'show_profile_summary': 'debug_panel'
+}
+
+__all__ = list(_EXPORTS)
 
-from .current_weather import show_current_weather
-from .forecast import show_hourly_forecast, show_daily_forecast, show_monthly_forecast
-from .air_quality import show_air_quality
-from .weather_map import show_weather_map
 
-__all__ = [
-    'show_current_weather',
-    'show_hourly_forecast',
-    'show_daily_forecast',
-    'show_monthly_forecast',
-    'show_air_quality',
-    'show_weather_map'
-] 
\ No newline at end of file
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
@@ -0,0 +1,71 @@
+"""
+自動更新：把 session 登記到共用的 RefreshScheduler，數據變動時由伺服器推送重新執行
+
+session 不需要自行輪詢：排程器更新地點的數據後，只對觀看該地點、且數據確實有變動的 session
+請求重新執行。Streamlit 沒有公開從其他執行緒觸發重新執行的 API，這裡經由 Runtime 取得 AppSession，
+並沿用瀏覽器最後一次送出的狀態（網址參數、輸入元件的值），效果與原始碼變更時的自動重新執行相同；
+取不到 Runtime（例如不是以 streamlit run 執行）時不啟用自動更新。
+"""
+from typing import Optional, Set
+
+import streamlit as st
+
+from src.utils.logger import setup_logger
+from src.utils.refresh import RefreshScheduler
+
+logger = setup_logger(__name__)
+
+SECTION_LABELS = {
+    "current": "當前天氣",
+    "hourly": "每小時預報",
+    "daily": "每日預報",
+    "monthly": "30天預報",
+    "air_quality": "空氣品質"
+}
+
+
+def _runtime():
+    try:
+        from streamlit.runtime import Runtime
+    except ImportError:
+        return None
+    return Runtime.instance() if Runtime.exists() else None
+
+
+def _app_session(session_id: str):
+    runtime = _runtime()
+    if runtime is None:
+        return None
+    info = runtime._session_mgr.get_active_session_info(session_id)
+    return info.session if info is not None else None
+
+
+def _request_rerun(session_id: str) -> None:
+    session = _app_session(session_id)
+    if session is not None:
+        session.request_rerun(getattr(session, "_client_state", None))
+
+
+def _session_alive(session_id: str) -> bool:
+    runtime = _runtime()
+    return runtime is not None and runtime.is_active_session(session_id)
+
+
+def enable_auto_refresh(scheduler: RefreshScheduler, session_id: Optional[str], lat: float, lon: float) -> Set[str]:
+    """
+    登記目前的 session 觀看這個地點
+
+    Returns:
+        Set[str]: 觸發本次執行的自動更新中有變動的區塊；一般的執行（使用者操作）為空集合
+    """
+    if not session_id or _runtime() is None:
+        return set()
+    changed = scheduler.take_changes(session_id)
+    scheduler.watch(
+        session_id, lat, lon,
+        notify=lambda _changed: _request_rerun(session_id),
+        alive=lambda: _session_alive(session_id)
+    )
+    if changed:
+        st.toast("🔄 已更新：" + "、".join(SECTION_LABELS.get(name, name) for name in sorted(changed)))
+    return changed
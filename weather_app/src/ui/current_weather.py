@@ -3,36 +3,71 @@
 """
 import streamlit as st
 from ..api.weather_api import WeatherAPI
+from ..config.config import HISTORY_SPARKLINE_HOURS, PROCESSOR_TIMEZONE
 from ..utils.data_processor import DataProcessor
 
+# 趨勢小圖：(欄位, 標題)
+SPARKLINES = [
+    ("temp", "溫度 (°C)"),
+    ("humidity", "濕度 (%)"),
+    ("pressure", "氣壓 (hPa)"),
+    ("wind_speed", "風速 (m/s)"),
+    ("aqi", "AQI")
+]
+
+def load_current_weather(lat: float, lon: float, weather_api: WeatherAPI, data_processor: DataProcessor):
+    """取得並處理當前天氣與最近的觀測歷史；不呼叫 Streamlit，可在背景執行緒執行"""
+    current_weather_data, version = weather_api.get_current_weather_versioned(lat, lon)
+    current_weather = data_processor.process_versioned("process_current_weather", version, current_weather_data)
+    history = weather_api.get_observation_history(lat, lon, hours=HISTORY_SPARKLINE_HOURS)
+    return current_weather, history
+
+def render_sparklines(history):
+    """以觀測歷史顯示近幾小時的趨勢小圖（至少兩筆紀錄才顯示）"""
+    if history is None or len(history) < 2:
+        return
+    history = history.tz_convert(PROCESSOR_TIMEZONE)
+    charts = [(column, title) for column, title in SPARKLINES if history[column].notna().sum() >= 2]
+    if not charts:
+        return
+    st.caption(f"近 {HISTORY_SPARKLINE_HOURS} 小時觀測（{len(history)} 筆）")
+    for col, (column, title) in zip(st.columns(len(charts)), charts):
+        with col:
+            st.caption(title)
+            st.line_chart(history[column], height=80)
+
+def render_current_weather(loaded, data_processor: DataProcessor):
+    """顯示 load_current_weather 的結果"""
+    current_weather, history = loaded
+    # 顯示當前天氣
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("溫度", f"{current_weather['temperature']}°C",
+                 f"體感 {current_weather['feels_like']}°C")
+    with col2:
+        st.metric("濕度", f"{current_weather['humidity']}%")
+    with col3:
+        st.metric("風速", f"{current_weather['wind_speed']} m/s")
+        
+    # 天氣警報
+    alert_level, alerts = data_processor.get_weather_alert_level(current_weather)
+    if alerts:
+        alert_color = {"正常": "green", "警告": "orange", "危險": "red"}[alert_level]
+        st.markdown(
+            f"<div style='padding: 10px; background-color: {alert_color}; "
+            f"color: white; border-radius: 5px;'><b>{alert_level}:</b> "
+            f"{', '.join(alerts)}</div>",
+            unsafe_allow_html=True
+        )
+
+    render_sparklines(history)
+    return current_weather
+
 def show_current_weather(lat: float, lon: float, weather_api: WeatherAPI, data_processor: DataProcessor):
     """顯示當前天氣信息"""
     try:
-        current_weather_data = weather_api.get_current_weather(lat, lon)
-        current_weather = data_processor.process_current_weather(current_weather_data)
-        
-        # 顯示當前天氣
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("溫度", f"{current_weather['temperature']}°C",
-                     f"體感 {current_weather['feels_like']}°C")
-        with col2:
-            st.metric("濕度", f"{current_weather['humidity']}%")
-        with col3:
-            st.metric("風速", f"{current_weather['wind_speed']} m/s")
-            
-        # 天氣警報
-        alert_level, alerts = data_processor.get_weather_alert_level(current_weather)
-        if alerts:
-            alert_color = {"正常": "green", "警告": "orange", "危險": "red"}[alert_level]
-            st.markdown(
-                f"<div style='padding: 10px; background-color: {alert_color}; "
-                f"color: white; border-radius: 5px;'><b>{alert_level}:</b> "
-                f"{', '.join(alerts)}</div>",
-                unsafe_allow_html=True
-            )
-            
-        return current_weather
+        current_weather = load_current_weather(lat, lon, weather_api, data_processor)
+        return render_current_weather(current_weather, data_processor)
     except Exception as e:
         st.error(f"獲取當前天氣失敗: {str(e)}")
         return None 
\ No newline at end of file
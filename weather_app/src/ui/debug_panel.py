@@ -0,0 +1,85 @@
+"""
+效能指標除錯面板：在側邊欄顯示 API、快取、數據處理與 UI 區塊的指標
+"""
+import streamlit as st
+import pandas as pd
+import plotly.graph_objects as go
+from ..utils.metrics import REGISTRY
+
+
+def show_metrics_panel():
+    """在側邊欄顯示目前行程累積的效能指標"""
+    rows = REGISTRY.snapshot()
+    with st.sidebar.expander("🛠️ 效能指標", expanded=False):
+        if not rows:
+            st.caption("尚無指標資料")
+            return
+
+        histograms = [r for r in rows if "count" in r]
+        counters = [r for r in rows if "value" in r]
+
+        if histograms:
+            st.markdown("**延遲（毫秒）**")
+            st.dataframe(pd.DataFrame([{
+                "指標": r["metric"],
+                "標籤": ", ".join(f"{k}={v}" for k, v in r["labels"].items()),
+                "次數": r["count"],
+                "平均": round(r["avg"] * 1000, 1) if r["avg"] is not None else None,
+                "p50≤": round(r["p50"] * 1000, 1) if r["p50"] not in (None, float("inf")) else None,
+                "p95≤": round(r["p95"] * 1000, 1) if r["p95"] not in (None, float("inf")) else None,
+            } for r in histograms]), hide_index=True)
+
+        if counters:
+            st.markdown("**計數**")
+            st.dataframe(pd.DataFrame([{
+                "指標": r["metric"],
+                "標籤": ", ".join(f"{k}={v}" for k, v in r["labels"].items()),
+                "數值": r["value"],
+            } for r in counters]), hide_index=True)
+
+        st.download_button("下載 Prometheus 格式", REGISTRY.render_prometheus(),
+                           file_name="metrics.prom", mime="text/plain")
+
+
+def show_profile_summary(profiler):
+    """在側邊欄以火焰圖形式顯示本次 rerun 的區塊耗時"""
+    if not profiler.sections:
+        return
+    with st.sidebar.expander(f"⏱️ 頁面剖析（{profiler.total * 1000:.0f} ms）", expanded=True):
+        # 每個區塊畫成一條從開始時間延伸到結束時間的橫條，巢狀區塊疊在上一層
+        fig = go.Figure(go.Bar(
+            x=[s["duration"] * 1000 for s in profiler.sections],
+            base=[s["start"] * 1000 for s in profiler.sections],
+            y=[s["depth"] for s in profiler.sections],
+            orientation="h",
+            text=[s["name"] for s in profiler.sections],
+            textposition="inside",
+            insidetextanchor="middle",
+            hovertemplate="%{text}: %{x:.1f} ms<extra></extra>"
+        ))
+        fig.update_layout(
+            height=120 + 30 * max(s["depth"] for s in profiler.sections),
+            margin=dict(t=10, b=30, l=10, r=10),
+            xaxis_title="毫秒",
+            yaxis=dict(visible=False, autorange="reversed"),
+            bargap=0.05
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+        st.dataframe(pd.DataFrame([{
+            "區塊": s["name"],
+            "耗時 (ms)": round(s["duration"] * 1000, 1),
+            "占比": f"{s['duration'] / profiler.total:.0%}" if profiler.total else ""
+        } for s in sorted(profiler.sections, key=lambda s: s["duration"], reverse=True)]), hide_index=True)
+
+        top = profiler.top_functions()
+        if top:
+            st.markdown("**累計耗時最高的函式**")
+            st.dataframe(pd.DataFrame([{
+                "函式": r["function"],
+                "呼叫次數": r["ncalls"],
+                "累計 (ms)": round(r["cumtime"] * 1000, 1)
+            } for r in top]), hide_index=True)
+
+        if profiler.saved_path:
+            st.caption(f"已儲存至 {profiler.saved_path}")
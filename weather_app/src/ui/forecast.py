@@ -6,57 +6,86 @@ import plotly.express as px
 import plotly.graph_objects as go
 from ..api.weather_api import WeatherAPI
 from ..utils.data_processor import DataProcessor
+from ..config.config import PROCESSOR_MEMO_SIZE, HOURLY_FORECAST_HOURS, HOURLY_INTERPOLATION_STEP
+
+# 圖表以數據版本為快取鍵（底線開頭的參數不參與雜湊），數據未變時重用同一個圖表物件
+@st.cache_resource(max_entries=PROCESSOR_MEMO_SIZE, show_spinner=False)
+def _hourly_figure(version: str, _hourly_df):
+    return px.line(_hourly_df, x='time', y='temperature',
+                   title=f"未來{HOURLY_FORECAST_HOURS}小時溫度預報",
+                   labels={"temperature": "溫度 (°C)", "time": "時間"})
+
+@st.cache_resource(max_entries=PROCESSOR_MEMO_SIZE, show_spinner=False)
+def _daily_figure(version: str, _daily_df):
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=_daily_df['date'],
+        y=_daily_df['temp_max'],
+        name="最高溫",
+        line=dict(color='red')
+    ))
+    fig.add_trace(go.Scatter(
+        x=_daily_df['date'],
+        y=_daily_df['temp_min'],
+        name="最低溫",
+        line=dict(color='blue'),
+        fill='tonexty'
+    ))
+    fig.update_layout(title="7天溫度預報",
+                     xaxis_title="日期",
+                     yaxis_title="溫度 (°C)")
+    return fig
+
+def load_hourly_forecast(lat: float, lon: float, weather_api: WeatherAPI, data_processor: DataProcessor):
+    """
+    取得每小時預報，內插為每 HOURLY_INTERPOLATION_STEP 秒一筆並只保留 HOURLY_FORECAST_HOURS 小時，
+    返回 (數據版本, DataFrame)；不呼叫 Streamlit，可在背景執行緒執行
+    """
+    hourly_data, version = weather_api.get_hourly_forecast_versioned(lat, lon)
+    return version, data_processor.process_versioned("process_hourly_interpolated", version, hourly_data,
+                                                     step=HOURLY_INTERPOLATION_STEP, hours=HOURLY_FORECAST_HOURS)
+
+def render_hourly_forecast(loaded):
+    """顯示 load_hourly_forecast 的結果"""
+    version, hourly_df = loaded
+    
+    # 繪製溫度折線圖
+    fig = _hourly_figure(version, hourly_df)
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # 顯示詳細預報數據
+    st.dataframe(hourly_df.set_index('time'))
+    return hourly_df
 
 def show_hourly_forecast(lat: float, lon: float, weather_api: WeatherAPI, data_processor: DataProcessor):
     """顯示每小時天氣預報"""
     try:
-        hourly_data = weather_api.get_hourly_forecast(lat, lon)
-        hourly_df = data_processor.process_hourly_forecast(hourly_data)
-        
-        # 繪製溫度折線圖
-        fig = px.line(hourly_df, x='time', y='temperature',
-                     title="未來48小時溫度預報",
-                     labels={"temperature": "溫度 (°C)", "time": "時間"})
-        st.plotly_chart(fig, use_container_width=True)
-        
-        # 顯示詳細預報數據
-        st.dataframe(hourly_df.set_index('time'))
-        
-        return hourly_df
+        return render_hourly_forecast(load_hourly_forecast(lat, lon, weather_api, data_processor))
     except Exception as e:
         st.error(f"獲取每小時預報失敗: {str(e)}")
         return None
 
+def load_daily_forecast(lat: float, lon: float, weather_api: WeatherAPI, data_processor: DataProcessor):
+    """取得並處理每日預報，返回 (數據版本, DataFrame)；不呼叫 Streamlit，可在背景執行緒執行"""
+    daily_data, version = weather_api.get_daily_forecast_versioned(lat, lon)
+    return version, data_processor.process_versioned("process_daily_forecast", version, daily_data)
+
+def render_daily_forecast(loaded):
+    """顯示 load_daily_forecast 的結果"""
+    version, daily_df = loaded
+    
+    # 繪製溫度範圍圖
+    fig = _daily_figure(version, daily_df)
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # 顯示詳細預報數據
+    st.dataframe(daily_df.set_index('date'))
+    return daily_df
+
 def show_daily_forecast(lat: float, lon: float, weather_api: WeatherAPI, data_processor: DataProcessor):
     """顯示每日天氣預報"""
     try:
-        daily_data = weather_api.get_daily_forecast(lat, lon)
-        daily_df = data_processor.process_daily_forecast(daily_data)
-        
-        # 繪製溫度範圍圖
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=daily_df['date'],
-            y=daily_df['temp_max'],
-            name="最高溫",
-            line=dict(color='red')
-        ))
-        fig.add_trace(go.Scatter(
-            x=daily_df['date'],
-            y=daily_df['temp_min'],
-            name="最低溫",
-            line=dict(color='blue'),
-            fill='tonexty'
-        ))
-        fig.update_layout(title="7天溫度預報",
-                         xaxis_title="日期",
-                         yaxis_title="溫度 (°C)")
-        st.plotly_chart(fig, use_container_width=True)
-        
-        # 顯示詳細預報數據
-        st.dataframe(daily_df.set_index('date'))
-        
-        return daily_df
+        return render_daily_forecast(load_daily_forecast(lat, lon, weather_api, data_processor))
     except Exception as e:
         st.error(f"獲取每日預報失敗: {str(e)}")
         return None
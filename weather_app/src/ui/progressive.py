@@ -0,0 +1,187 @@
+"""
+漸進式渲染：頁面各區塊先放置骨架佔位，數據在背景執行緒抓取，哪個區塊先完成就先填入
+
+背景工作只呼叫 WeatherAPI / DataProcessor，不碰 Streamlit；所有 st.* 呼叫（包含 st.cache_resource
+的圖表快取與各種輸入元件）都在腳本執行緒中進行。等待超過 SECTION_TIMEOUTS 的區塊改顯示提示，
+背景抓取仍會完成並寫入快取，使用者重新整理時即可直接顯示。
+
+每個區塊的數據都在頁面的延遲預算（PAGE_LATENCY_BUDGET）內取得：預算用完時 WeatherAPI 改用過期的快取，
+區塊上方會顯示「數據可能不是最新」的標記。各區塊最後採用的數據來源記錄在 ui_section_decisions_total。
+
+自動更新觸發的重新執行（見 src/ui/auto_refresh.py）只有變動的區塊顯示骨架，其餘區塊的數據已在快取中，直接填入。
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import AbstractSet, Any, Callable, Dict, List, Optional, Set, Tuple
+
+import streamlit as st
+
+from src.config.config import SECTION_TIMEOUTS, SECTION_TIMEOUT_DEFAULT, PAGE_LATENCY_BUDGET
+from src.utils.deadline import budget
+from src.utils.executor import get_thread_pool
+from src.utils.metrics import (
+    UI_FIRST_CONTENT_SECONDS, UI_SECTION_DECISIONS, UI_SECTION_READY_SECONDS, UI_SECTION_TIMEOUTS
+)
+from src.utils.profiler import SessionProfiler
+
+_SKELETON_STYLE = """
+<style>
+.skeleton-line {
+    height: 1rem;
+    margin: 0.6rem 0;
+    border-radius: 0.3rem;
+    background: linear-gradient(90deg, rgba(0,0,0,0.06) 25%, rgba(0,0,0,0.12) 50%, rgba(0,0,0,0.06) 75%);
+    background-size: 200% 100%;
+    animation: skeleton-shimmer 1.2s infinite;
+}
+@keyframes skeleton-shimmer { from { background-position: 200% 0; } to { background-position: -200% 0; } }
+</style>
+"""
+
+_STALE_BADGE = (
+    "<span style='display:inline-block; padding:0.15rem 0.7rem; border-radius:1rem; font-size:0.8rem; "
+    "background:#f39c12; color:white;' title='{title}'>⚠️ 數據可能不是最新</span>"
+)
+
+
+class Section:
+    """
+    頁面區塊
+
+    Args:
+        name: 區塊名稱（用於剖析、效能指標與 SECTION_TIMEOUTS）
+        load: 取得數據的函式（在背景執行緒執行，不可呼叫 Streamlit）
+        render: 以 load 的結果顯示區塊（在腳本執行緒、區塊的佔位元素中執行）
+        error_message: 取得數據失敗時的提示前綴
+        skeleton_lines: 骨架佔位的行數
+    """
+
+    def __init__(self, name: str, load: Callable[[], Any], render: Callable[[Any], Any], error_message: str,
+                 skeleton_lines: int = 4):
+        self.name = name
+        self.load = load
+        self.render = render
+        self.error_message = error_message
+        self.skeleton_lines = skeleton_lines
+
+    @property
+    def timeout(self) -> float:
+        return SECTION_TIMEOUTS.get(self.name, SECTION_TIMEOUT_DEFAULT)
+
+
+def show_stale_badge(namespaces) -> None:
+    """標示區塊顯示的是過期的快取數據"""
+    title = "本次載入超過時間預算，顯示快取中較早的數據：" + "、".join(sorted(namespaces))
+    st.markdown(_STALE_BADGE.format(title=title), unsafe_allow_html=True)
+
+
+def show_skeleton(placeholder, lines: int) -> None:
+    """在佔位元素中顯示載入中的骨架"""
+    widths = [100, 92, 96, 70, 85, 60]
+    bars = "".join(f"<div class='skeleton-line' style='width:{widths[i % len(widths)]}%'></div>"
+                   for i in range(lines))
+    placeholder.markdown(_SKELETON_STYLE + bars, unsafe_allow_html=True)
+
+
+class ProgressiveRenderer:
+    """
+    依序或漸進地顯示一組區塊
+
+    Args:
+        profiler: 記錄各區塊渲染耗時的剖析器
+        started: 頁面開始執行的時間（time.perf_counter()），用來計算數據就緒與第一個內容出現的時間
+        latency_budget: 頁面數據的延遲預算（秒），自 started 起算
+    """
+
+    def __init__(self, profiler: SessionProfiler, started: float, latency_budget: float = PAGE_LATENCY_BUDGET):
+        self.profiler = profiler
+        self.started = started
+        self.deadline = started + latency_budget
+        self._first_content = False
+
+    def _load(self, section: Section) -> Tuple[Any, Set[str]]:
+        """在頁面期限內取得區塊數據，返回 (數據, 改用過期快取的數據類別)；在背景執行緒執行"""
+        with budget(deadline=self.deadline) as section_budget:
+            return section.load(), section_budget.stale
+
+    def _show(self, section: Section, placeholder, fetch: Callable[[], Tuple[Any, Set[str]]], mode: str) -> None:
+        """在佔位元素中以 fetch() 的結果顯示區塊；取得或顯示失敗時只在這個區塊顯示錯誤，不影響其他區塊"""
+        with placeholder.container(), self.profiler.section(section.name):
+            try:
+                data, stale = fetch()
+                if stale:
+                    show_stale_badge(stale)
+                section.render(data)
+            except Exception as e:
+                UI_SECTION_DECISIONS.inc(section=section.name, decision="error")
+                st.error(f"{section.error_message}: {str(e)}")
+                return
+            UI_SECTION_DECISIONS.inc(section=section.name, decision="stale" if stale else "fresh")
+        if not self._first_content:
+            self._first_content = True
+            UI_FIRST_CONTENT_SECONDS.observe(time.perf_counter() - self.started, mode=mode)
+
+    def run_sequential(self, sections: List[Section], placeholders: Dict[str, Any]) -> None:
+        """由上而下逐一取得數據並顯示（停用漸進式渲染時）"""
+        for section in sections:
+            self._show(section, placeholders[section.name], lambda: self._load(section), "sequential")
+
+    def run(self, sections: List[Section], placeholders: Dict[str, Any],
+            skeletons: Optional[AbstractSet[str]] = None) -> None:
+        """
+        所有區塊的數據同時交給背景執行緒抓取，先顯示骨架，完成一個填入一個
+
+        Args:
+            sections: 要顯示的區塊
+            placeholders: 區塊名稱 -> st.empty() 佔位元素
+            skeletons: 只有這些區塊顯示骨架，None 表示全部
+        """
+        pool = get_thread_pool()
+        pending: Dict[Future, Section] = {}
+        for section in sections:
+            if skeletons is None or section.name in skeletons:
+                show_skeleton(placeholders[section.name], section.skeleton_lines)
+            pending[pool.submit(self._load, section)] = section
+        deadlines = {future: self.started + section.timeout for future, section in pending.items()}
+        order = {section.name: i for i, section in enumerate(sections)}
+
+        while pending:
+            remaining = min(deadlines[future] for future in pending) - time.perf_counter()
+            done, _ = wait(list(pending), timeout=max(0.0, remaining), return_when=FIRST_COMPLETED)
+            now = time.perf_counter()
+            # 同時完成的區塊依頁面上的順序填入
+            for future in sorted(done, key=lambda f: order[pending[f].name]):
+                section = pending.pop(future)
+                UI_SECTION_READY_SECONDS.observe(now - self.started, section=section.name)
+                self._show(section, placeholders[section.name], future.result, "progressive")
+            for future in [f for f in pending if deadlines[f] <= now]:
+                section = pending.pop(future)
+                UI_SECTION_TIMEOUTS.inc(section=section.name)
+                UI_SECTION_DECISIONS.inc(section=section.name, decision="timeout")
+                placeholders[section.name].warning(
+                    f"{section.error_message}: 等待超過 {section.timeout:g} 秒，數據仍在背景載入，請稍後重新整理"
+                )
+
+
+def render_sections(sections: List[Section], placeholders: Dict[str, Any], profiler: SessionProfiler,
+                    started: float, progressive: bool = True, refreshed: Optional[AbstractSet[str]] = None) -> None:
+    """
+    顯示區塊：progressive 為 True 時漸進式渲染，否則由上而下依序處理
+
+    Args:
+        refreshed: 本次執行由自動更新觸發時，數據有變動的區塊
+    """
+    renderer = ProgressiveRenderer(profiler, started)
+    if progressive:
+        renderer.run(sections, placeholders, skeletons=refreshed or None)
+    else:
+        renderer.run_sequential(sections, placeholders)
+
+
+def progressive_enabled(query_value: Optional[str], default: bool) -> bool:
+    """網址參數 ?progressive=0/1 可覆寫設定"""
+    if query_value in ("0", "false"):
+        return False
+    if query_value in ("1", "true"):
+        return True
+    return default
@@ -0,0 +1,186 @@
+"""
+天氣警報規則引擎
+
+config.ALERT_RULES 在建立 AlertEngine 時編譯成 NumPy 比較運算，評估時每條規則只對整個欄位做一次比較，
+因此單筆觀測、整份預報 DataFrame 或多個地點合併後的 DataFrame 都用同一套邏輯；
+等級依 ALERT_LEVELS 的順序比較，而不是比較等級名稱的字串。
+"""
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.config.config import ALERT_LEVELS, ALERT_RULES
+
+_OPS = {
+    ">=": np.greater_equal,
+    ">": np.greater,
+    "<=": np.less_equal,
+    "<": np.less
+}
+
+# 規則欄位 -> 實際欄位；(低, 高) 表示 <、<= 規則使用「低」欄位，>、>= 規則使用「高」欄位
+ColumnMap = Dict[str, Union[str, Tuple[str, str]]]
+
+
+class AlertRule:
+    """編譯後的單一警報規則"""
+
+    def __init__(self, name: str, group: str, field: str, op: str, value: float, level: str, rank: int):
+        if op not in _OPS:
+            raise ValueError(f"警報規則 {name} 的比較運算子無效: {op}")
+        self.name = name
+        self.group = group
+        self.field = field
+        self.op = op
+        self.value = float(value)
+        self.level = level
+        self.rank = rank
+        self.compare = _OPS[op]
+        self.upper = op in (">=", ">")  # 數值越大越嚴重
+
+    def column(self, columns: Optional[ColumnMap]) -> str:
+        spec = (columns or {}).get(self.field, self.field)
+        if isinstance(spec, tuple):
+            return spec[1] if self.upper else spec[0]
+        return spec
+
+    def __repr__(self) -> str:
+        return f"AlertRule({self.name}: {self.field} {self.op} {self.value:g} -> {self.level})"
+
+
+class AlertEngine:
+    """
+    Args:
+        rules: 規則定義，格式同 config.ALERT_RULES
+        levels: 由低到高的警報等級，第一個為沒有警報時的等級
+    """
+
+    def __init__(self, rules: Sequence[Dict] = ALERT_RULES, levels: Sequence[str] = ALERT_LEVELS):
+        self.levels = list(levels)
+        ranks = {level: i for i, level in enumerate(self.levels)}
+        self.rules: List[AlertRule] = []
+        for rule in rules:
+            if rule["level"] not in ranks:
+                raise ValueError(f"警報規則 {rule['name']} 的等級無效: {rule['level']}")
+            self.rules.append(AlertRule(
+                rule["name"], rule.get("group", rule["name"]), rule["field"], rule["op"], rule["value"],
+                rule["level"], ranks[rule["level"]]
+            ))
+
+    def masks(self, frame: Union[pd.DataFrame, Dict[str, np.ndarray]],
+              columns: Optional[ColumnMap] = None) -> np.ndarray:
+        """
+        每列、每條規則是否成立
+
+        同一 group 中前面的規則已成立的列，後面的規則視為不成立。缺少欄位的規則與 NaN 一律不成立。
+
+        Returns:
+            np.ndarray: (列數, 規則數) 的布林矩陣，欄位順序同 self.rules
+        """
+        rows = len(frame) if isinstance(frame, pd.DataFrame) else len(next(iter(frame.values()), ()))
+        result = np.zeros((rows, len(self.rules)), dtype=bool)
+        taken: Dict[str, np.ndarray] = {}
+        for j, rule in enumerate(self.rules):
+            name = rule.column(columns)
+            if name not in frame:
+                continue
+            values = np.asarray(frame[name], dtype=np.float64)
+            mask = rule.compare(values, rule.value)
+            if rule.group in taken:
+                mask &= ~taken[rule.group]
+                taken[rule.group] |= mask
+            else:
+                taken[rule.group] = mask.copy()
+            result[:, j] = mask
+        return result
+
+    def ranks(self, masks: np.ndarray) -> np.ndarray:
+        """每列最高的警報等級索引（0 表示正常）"""
+        rule_ranks = np.array([rule.rank for rule in self.rules], dtype=np.int8)
+        if not len(self.rules):
+            return np.zeros(len(masks), dtype=np.int8)
+        return np.where(masks, rule_ranks, 0).max(axis=1)
+
+    def evaluate(self, frame: pd.DataFrame, columns: Optional[ColumnMap] = None) -> pd.DataFrame:
+        """
+        評估每一列的警報等級
+
+        Returns:
+            pd.DataFrame: 與 frame 相同索引，alert_level 為等級名稱，其餘每條規則一個布林欄位
+        """
+        masks = self.masks(frame, columns)
+        result = pd.DataFrame(masks, index=frame.index, columns=[rule.name for rule in self.rules])
+        result.insert(0, "alert_level", pd.Categorical.from_codes(self.ranks(masks), categories=self.levels,
+                                                                  ordered=True))
+        return result
+
+    def check(self, observation: Dict, columns: Optional[ColumnMap] = None) -> Tuple[str, List[str]]:
+        """
+        評估單筆觀測
+
+        Returns:
+            tuple: (最高警報等級, 成立的警報名稱列表)
+        """
+        frame = {key: np.array([value], dtype=np.float64) for key, value in observation.items()
+                 if isinstance(value, (int, float, np.number))}
+        masks = self.masks(frame, columns)
+        alerts = [rule.name for rule, hit in zip(self.rules, masks[0]) if hit]
+        return self.levels[int(self.ranks(masks)[0])], alerts
+
+    def windows(self, frame: pd.DataFrame, time_col: str, location_col: Optional[str] = None,
+                columns: Optional[ColumnMap] = None) -> pd.DataFrame:
+        """
+        找出每個地點、每種警報連續成立的時段
+
+        frame 可以包含多個地點（以 location_col 區分），會先依地點與時間排序。
+
+        Returns:
+            pd.DataFrame: 欄位 location、alert、level、onset（第一個成立的時間）、end（最後一個成立的時間）、
+            rows（成立的筆數）、peak（時段內最極端的數值），依地點與 onset 排序
+        """
+        output_columns = ["location", "alert", "level", "onset", "end", "rows", "peak"]
+        if frame.empty:
+            return pd.DataFrame(columns=output_columns)
+
+        sort_by = [location_col, time_col] if location_col else [time_col]
+        frame = frame.sort_values(sort_by, kind="stable")
+        masks = self.masks(frame, columns)
+        times = frame[time_col].to_numpy()
+        if location_col:
+            locations = frame[location_col].to_numpy()
+            new_location = np.r_[True, locations[1:] != locations[:-1]]
+        else:
+            locations = np.full(len(frame), None, dtype=object)
+            new_location = np.r_[True, np.zeros(len(frame) - 1, dtype=bool)]
+        last_of_location = np.r_[new_location[1:], True]
+
+        pieces = []
+        for j, rule in enumerate(self.rules):
+            mask = masks[:, j]
+            if not mask.any():
+                continue
+            prev = np.r_[False, mask[:-1]] & ~new_location
+            nxt = np.r_[mask[1:], False] & ~last_of_location
+            starts = np.flatnonzero(mask & ~prev)
+            ends = np.flatnonzero(mask & ~nxt)
+            # 以 reduceat 一次取得每個時段的極值：區段為 [start, end + 1)
+            values = frame[rule.column(columns)].to_numpy(dtype=np.float64)
+            reduce = np.maximum if rule.upper else np.minimum
+            bounds = np.column_stack((starts, ends + 1)).ravel()
+            peaks = reduce.reduceat(np.r_[values, np.nan], bounds)[::2]
+            pieces.append(pd.DataFrame({
+                "location": locations[starts],
+                "alert": rule.name,
+                "level": rule.level,
+                "onset": times[starts],
+                "end": times[ends],
+                "rows": ends - starts + 1,
+                "peak": peaks
+            }))
+
+        if not pieces:
+            return pd.DataFrame(columns=output_columns)
+        result = pd.concat(pieces, ignore_index=True)
+        sort_by = ["location", "onset"] if location_col else ["onset"]
+        return result.sort_values(sort_by, kind="stable", ignore_index=True)
@@ -1,82 +1,378 @@
 """
 快取管理模組
+
+快取項目以鍵的雜湊值命名並分散在兩層分片目錄中（例如 ab/cd/abcd....cache），
+避免單一目錄累積大量檔案；原始鍵與到期時間記錄在檔頭，過期清理只需讀取檔頭。
 """
+import hashlib
 import os
 import json
-from datetime import datetime, timedelta
-from typing import Any, Dict, Optional
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config.config import CACHE_DIR, CACHE_DURATION, CACHE_LOCK_TIMEOUT, CACHE_SWEEP_BUDGET_MS
+from src.utils import metrics
+from src.utils.file_lock import StripedFileLock
+from src.utils.logger import setup_logger
+from src.utils.serializers import MAGIC, encode_entry, encode_header, decode_entry, decode_header
+
+logger = setup_logger(__name__)
+
+CACHE_REQUESTS = metrics.counter("cache_requests_total", "快取查詢結果", ["result"])
+CACHE_EVICTIONS = metrics.counter("cache_evictions_total", "快取刪除數", ["reason"])
+CACHE_READ_SECONDS = metrics.histogram("cache_read_seconds", "快取讀取耗時")
+CACHE_WRITE_SECONDS = metrics.histogram("cache_write_seconds", "快取寫入耗時")
+CACHE_BYTES_WRITTEN = metrics.counter("cache_bytes_written_total", "快取寫入位元組數")
+CACHE_LOCK_WAIT_SECONDS = metrics.histogram("cache_lock_wait_seconds", "等待快取鍵鎖的時間")
+CACHE_LOCK_TIMEOUTS = metrics.counter("cache_lock_timeouts_total", "等待快取鍵鎖逾時次數")
+CACHE_SWEEP_SECONDS = metrics.histogram("cache_sweep_seconds", "每次增量清理耗時")
 
-from src.config.config import CACHE_DIR, CACHE_DURATION
+# 快取檔案副檔名；.json 為舊版（縮排 JSON）格式，仍可讀取並會在讀取時遷移
+CACHE_EXTENSION = '.cache'
+LEGACY_EXTENSION = '.json'
+
+# 第一層分片目錄名稱（00 ~ ff）
+SHARD_NAMES = [f"{i:02x}" for i in range(256)]
 
 class CacheManager:
-    def __init__(self):
-        """初始化快取管理器"""
-        self.cache_dir = CACHE_DIR
+    def __init__(self, cache_dir: Optional[str] = None):
+        """初始化快取管理器
+        
+        Args:
+            cache_dir: 快取目錄，預設為設定中的 CACHE_DIR
+        """
+        self.cache_dir = cache_dir or CACHE_DIR
         self.cache_duration = CACHE_DURATION
         
         # 確保快取目錄存在
         os.makedirs(self.cache_dir, exist_ok=True)
         
+        # 跨行程的鍵鎖：多個 Streamlit 伺服器行程共用同一個快取目錄時仍能互斥
+        self._locks = StripedFileLock(os.path.join(self.cache_dir, '.locks'))
+        
+        # 增量清理的游標：下一個要處理的第一層分片，以及目前分片中尚未處理的第二層目錄
+        self._sweep_lock = threading.Lock()
+        self._sweep_shard = 0
+        self._sweep_pending: List[str] = []
+        
+    @staticmethod
+    def _hash_key(key: str) -> str:
+        return hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+        
     def _get_cache_path(self, key: str) -> str:
-        """獲取快取文件路徑"""
-        return os.path.join(self.cache_dir, f"{key}.json")
+        """獲取快取文件路徑（兩層分片：ab/cd/<hash>.cache）"""
+        digest = self._hash_key(key)
+        return os.path.join(self.cache_dir, digest[:2], digest[2:4], f"{digest}{CACHE_EXTENSION}")
+    
+    def _get_legacy_paths(self, key: str) -> List[str]:
+        """舊版平鋪在快取目錄中、以原始鍵命名的文件路徑"""
+        return [os.path.join(self.cache_dir, f"{key}{ext}") for ext in (CACHE_EXTENSION, LEGACY_EXTENSION)]
+    
+    def _read_sharded(self, key: str) -> Optional[Tuple[Dict[str, Any], Any]]:
+        """讀取分片目錄中的快取項目，不存在時返回 None"""
+        try:
+            with open(self._get_cache_path(key), 'rb') as f:
+                meta, data = decode_entry(f.read())
+        except FileNotFoundError:
+            return None
+        return (meta, data) if meta.get('key') == key else None
+    
+    def _read_entry(self, key: str) -> Optional[Tuple[Dict[str, Any], Any]]:
+        """讀取快取項目，返回 (檔頭, 數據)；舊版平鋪的項目會轉存到分片目錄"""
+        entry = self._read_sharded(key)
+        if entry is not None:
+            return entry
+        
+        migrated = False
+        for legacy_path in self._get_legacy_paths(key):
+            if not os.path.exists(legacy_path):
+                continue
+            with self.lock(key):
+                # 等鎖期間其他執行緒或行程可能已完成遷移
+                entry = self._read_sharded(key)
+                if entry is not None:
+                    return entry
+                try:
+                    if legacy_path.endswith(CACHE_EXTENSION):
+                        with open(legacy_path, 'rb') as f:
+                            meta, data = decode_entry(f.read())
+                    else:
+                        with open(legacy_path, 'r', encoding='utf-8') as f:
+                            cache_data = json.load(f)
+                        meta, data = {'timestamp': cache_data['timestamp']}, cache_data['data']
+                except FileNotFoundError:
+                    # 已被遷移（例如等鎖逾時的另一方）或刪除
+                    migrated = True
+                    continue
+                timestamp = datetime.fromisoformat(meta['timestamp'])
+                meta = self._write_entry(key, data, timestamp)
+                try:
+                    os.remove(legacy_path)
+                except FileNotFoundError:
+                    pass
+            return meta, data
+        
+        return self._read_sharded(key) if migrated else None
+    
+    def _write_entry(self, key: str, data: Any, timestamp: datetime, expires: Optional[float] = None,
+                     extra: Optional[Dict[str, Any]] = None, serializer: Optional[str] = None) -> Dict[str, Any]:
+        """編碼並寫入快取項目；extra 為額外寫入檔頭的中繼資料（例如 etag、digest）"""
+        meta = {
+            **(extra or {}),
+            'key': key,
+            'timestamp': timestamp.isoformat(),
+            'expires': expires if expires is not None else timestamp.timestamp() + self.cache_duration
+        }
+        raw = encode_entry(data, meta, serializer=serializer)
+        self._replace_file(self._get_cache_path(key), raw)
+        return meta
+    
+    def _replace_file(self, cache_path: str, raw: bytes) -> None:
+        """先寫入同目錄的暫存檔再以 os.replace 原子替換，讀取端只會看到完整的舊檔或新檔"""
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(raw)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        CACHE_BYTES_WRITTEN.inc(len(raw))
+    
+    @contextmanager
+    def lock(self, key: str, timeout: float = CACHE_LOCK_TIMEOUT):
+        """
+        取得快取鍵的獨佔鎖（跨執行緒與行程，同一執行緒可重入）
+        
+        逾時時不會拋出例外，而是在沒有鎖的情況下繼續執行；寫入本身是原子的，最壞情況只是重複回源。
+        """
+        start = time.perf_counter()
+        acquired = self._locks.acquire(key, timeout)
+        CACHE_LOCK_WAIT_SECONDS.observe(time.perf_counter() - start)
+        if not acquired:
+            CACHE_LOCK_TIMEOUTS.inc()
+        try:
+            yield
+        finally:
+            if acquired:
+                self._locks.release(key)
+        
+    def get_entry(self, key: str, allow_stale: bool = False) -> Optional[Tuple[Dict[str, Any], Any]]:
+        """從快取中獲取 (檔頭, 數據)
+        
+        Args:
+            key: 快取鍵
+            allow_stale: 是否返回已過期的項目（供條件式請求重新驗證時使用）
+        """
+        start = time.perf_counter()
+        
+        try:
+            entry = self._read_entry(key)
+            if entry is None:
+                CACHE_REQUESTS.inc(result="miss")
+                return None
+            CACHE_READ_SECONDS.observe(time.perf_counter() - start)
+            
+            # 檢查快取是否過期
+            if time.time() < entry[0]['expires']:
+                CACHE_REQUESTS.inc(result="hit")
+                return entry
+            CACHE_REQUESTS.inc(result="stale")
+            if allow_stale:
+                return entry
+        except Exception as e:
+            CACHE_REQUESTS.inc(result="error")
+            logger.warning("讀取快取失敗: %s", e)
+        
+        return None
         
     def get(self, key: str) -> Optional[Any]:
         """從快取中獲取數據"""
-        cache_path = self._get_cache_path(key)
+        entry = self.get_entry(key)
+        return entry[1] if entry is not None else None
         
+    def set(self, key: str, data: Any, expires: Optional[float] = None,
+            extra: Optional[Dict[str, Any]] = None, serializer: Optional[str] = None) -> None:
+        """將數據存入快取
+        
+        Args:
+            key: 快取鍵
+            data: 數據
+            expires: 到期時間（epoch 秒），預設為現在加上 CACHE_DURATION；通常由 cache_policy.compute_expiry 計算
+            extra: 額外寫入檔頭的中繼資料，例如 etag、last_modified、digest
+            serializer: 序列化格式，預設依設定 CACHE_SERIALIZER
+        """
         try:
-            if os.path.exists(cache_path):
-                with open(cache_path, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
-                
-                # 檢查快取是否過期
-                cache_time = datetime.fromisoformat(cache_data['timestamp'])
-                if datetime.now() - cache_time < timedelta(seconds=self.cache_duration):
-                    return cache_data['data']
+            with self.lock(key), CACHE_WRITE_SECONDS.time():
+                self._write_entry(key, data, datetime.now(), expires, extra, serializer)
         except Exception as e:
-            print(f"讀取快取失敗: {str(e)}")
+            logger.warning("寫入快取失敗: %s", e)
+    
+    def touch(self, key: str, expires: float) -> bool:
+        """
+        延長快取項目的到期時間（例如上游回應 304 Not Modified 時）
         
-        return None
+        只改寫檔頭，數據本體原樣複製，不重新序列化或壓縮；寫入時間（timestamp）保持不變。
         
-    def set(self, key: str, data: Any) -> None:
-        """將數據存入快取"""
+        Returns:
+            bool: 項目存在且已更新時為 True
+        """
         cache_path = self._get_cache_path(key)
-        
         try:
-            cache_data = {
-                'timestamp': datetime.now().isoformat(),
-                'data': data
-            }
-            
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
+            with self.lock(key), CACHE_WRITE_SECONDS.time():
+                with open(cache_path, 'rb') as f:
+                    raw = f.read()
+                meta, offset = decode_header(raw)
+                if meta.get('key') != key:
+                    return False
+                meta['expires'] = expires
+                self._replace_file(cache_path, encode_header(meta) + raw[offset:])
+            return True
+        except FileNotFoundError:
+            return False
         except Exception as e:
-            print(f"寫入快取失敗: {str(e)}")
+            logger.warning("更新快取到期時間失敗: %s", e)
+            return False
+    
+    def delete(self, key: str) -> None:
+        """刪除單一快取項目（包括舊版平鋪的文件）"""
+        for path in [self._get_cache_path(key)] + self._get_legacy_paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("刪除快取失敗: %s", e)
+    
+    def _read_expires(self, cache_path: str) -> float:
+        """只讀取檔頭中的到期時間，不解碼數據本體"""
+        with open(cache_path, 'rb') as f:
+            first_line = f.readline()
+        if not first_line.startswith(MAGIC):
+            raise ValueError("不是有效的快取檔案")
+        meta = json.loads(first_line[len(MAGIC):])
+        if 'expires' in meta:
+            return meta['expires']
+        return datetime.fromisoformat(meta['timestamp']).timestamp() + self.cache_duration
+    
+    def _sweep_dir(self, leaf_dir: str, now: float) -> None:
+        """刪除一個第二層分片目錄中已過期的項目"""
+        try:
+            entries = list(os.scandir(leaf_dir))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if not entry.name.endswith(CACHE_EXTENSION):
+                continue
+            try:
+                if self._read_expires(entry.path) <= now:
+                    os.remove(entry.path)
+                    CACHE_EVICTIONS.inc(reason="expired")
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                logger.warning("清理過期快取失敗: %s", e)
+    
+    def sweep(self, budget_ms: float = CACHE_SWEEP_BUDGET_MS) -> bool:
+        """
+        增量清理過期快取：從上次停下的位置繼續，依序處理分片目錄直到用完時間預算
+        
+        每次呼叫至少處理一個第二層分片目錄，因此反覆呼叫最終會掃過整個快取。
+        
+        Args:
+            budget_ms: 本次清理的時間預算（毫秒）
+            
+        Returns:
+            bool: 本次呼叫是否完成了一輪完整掃描
+        """
+        if not self._sweep_lock.acquire(blocking=False):
+            return False
+        start = time.perf_counter()
+        deadline = start + budget_ms / 1000
+        completed_cycle = False
+        try:
+            now = time.time()
+            while True:
+                if not self._sweep_pending:
+                    shard_dir = os.path.join(self.cache_dir, SHARD_NAMES[self._sweep_shard])
+                    try:
+                        self._sweep_pending = sorted(
+                            entry.path for entry in os.scandir(shard_dir) if entry.is_dir()
+                        )
+                    except FileNotFoundError:
+                        self._sweep_pending = []
+                    self._sweep_shard = (self._sweep_shard + 1) % len(SHARD_NAMES)
+                    if self._sweep_shard == 0:
+                        completed_cycle = True
+                
+                if self._sweep_pending:
+                    self._sweep_dir(self._sweep_pending.pop(), now)
+                
+                if completed_cycle and not self._sweep_pending:
+                    break
+                if time.perf_counter() >= deadline:
+                    break
+        finally:
+            CACHE_SWEEP_SECONDS.observe(time.perf_counter() - start)
+            self._sweep_lock.release()
+        return completed_cycle and not self._sweep_pending
     
     def clear(self) -> None:
-        """清理所有快取"""
+        """
+        清理所有快取
+        
+        各分片目錄先改名移入暫存的垃圾目錄（每個分片一次 rename），實際刪除在背景執行緒完成，
+        按鈕不會因快取項目數量而卡住。
+        """
         try:
-            for filename in os.listdir(self.cache_dir):
-                if filename.endswith('.json'):
-                    os.remove(os.path.join(self.cache_dir, filename))
+            trash_dir = os.path.join(self.cache_dir, f".trash-{os.getpid()}-{time.time_ns()}")
+            os.makedirs(trash_dir)
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_dir() and entry.name in SHARD_NAMES:
+                    os.replace(entry.path, os.path.join(trash_dir, entry.name))
+                elif entry.is_file() and entry.name.endswith((CACHE_EXTENSION, LEGACY_EXTENSION)):
+                    os.replace(entry.path, os.path.join(trash_dir, entry.name))
+            CACHE_EVICTIONS.inc(reason="clear")
+            with self._sweep_lock:
+                self._sweep_pending = []
+            threading.Thread(target=shutil.rmtree, args=(trash_dir, True), daemon=True).start()
         except Exception as e:
-            print(f"清理快取失敗: {str(e)}")
+            logger.warning("清理快取失敗: %s", e)
 
     def clear_expired(self):
-        """清除所有過期的快取"""
-        for file in os.listdir(self.cache_dir):
-            if not file.endswith('.json'):
+        """清除所有過期的快取（完整掃描所有分片，不受時間預算限制）"""
+        now = time.time()
+        for shard in SHARD_NAMES:
+            shard_dir = os.path.join(self.cache_dir, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for entry in os.scandir(shard_dir):
+                if entry.is_dir():
+                    self._sweep_dir(entry.path, now)
+        
+        # 舊版平鋪的項目
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_file():
                 continue
-                
-            cache_path = os.path.join(self.cache_dir, file)
             try:
-                with open(cache_path, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
-                    
-                cache_time = datetime.fromisoformat(cache_data['timestamp'])
-                if datetime.now() - cache_time > timedelta(seconds=self.cache_duration):
-                    os.remove(cache_path)
+                if entry.name.endswith(CACHE_EXTENSION):
+                    expired = self._read_expires(entry.path) <= now
+                elif entry.name.endswith(LEGACY_EXTENSION):
+                    with open(entry.path, 'r', encoding='utf-8') as f:
+                        timestamp = datetime.fromisoformat(json.load(f)['timestamp'])
+                    expired = timestamp.timestamp() + self.cache_duration <= now
+                else:
+                    continue
+                if expired:
+                    os.remove(entry.path)
+                    CACHE_EVICTIONS.inc(reason="expired")
             except Exception as e:
-                print(f"清理過期快取失敗: {str(e)}")
-                continue 
\ No newline at end of file
+                logger.warning("清理過期快取失敗: %s", e)
+                continue
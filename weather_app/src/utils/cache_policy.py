@@ -0,0 +1,104 @@
+"""
+快取到期策略：依數據類別（namespace）決定快取項目的到期時間
+
+每個類別在 config.CACHE_POLICIES 中設定：
+- ttl：最長保存秒數
+- align / offset：讓到期時間對齊上游模型的更新週期，例如 align=3600、offset=600
+  表示在每小時的 :10 到期（上游通常在整點後數分鐘發布新一輪預報）
+- min_ttl：對齊後至少保留的秒數，避免在更新點前幾秒寫入的項目立刻過期
+
+上游回應帶有 Cache-Control / Expires 標頭時以標頭為準（仍不超過 ttl）；
+no-store 表示不寫入快取；no-cache / max-age=0 / 已過去的 Expires 仍寫入快取但立即過期，
+下次請求時以條件式請求（ETag / Last-Modified）重新驗證。
+"""
+import time
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+from src.config.config import CACHE_POLICIES, CACHE_DURATION
+
+
+def _parse_cache_control(value: str) -> dict:
+    directives = {}
+    for part in value.split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip('"')
+    return directives
+
+
+def is_no_store(headers: Optional[Mapping[str, str]]) -> bool:
+    """回應標頭是否禁止寫入快取（Cache-Control: no-store）"""
+    cache_control = headers.get("Cache-Control") if headers else None
+    return bool(cache_control) and "no-store" in _parse_cache_control(cache_control)
+
+
+def header_expiry(headers: Optional[Mapping[str, str]], now: float) -> Optional[float]:
+    """
+    由回應標頭計算到期時間
+
+    Returns:
+        到期的 epoch 秒數；標頭要求每次重新驗證時返回 now（或已過去的 Expires）；沒有相關標頭時返回 None
+    """
+    if not headers:
+        return None
+
+    cache_control = headers.get("Cache-Control")
+    if cache_control:
+        directives = _parse_cache_control(cache_control)
+        if "no-store" in directives or "no-cache" in directives:
+            return now
+        # 本快取由多個使用者共用，s-maxage 優先於 max-age
+        for name in ("s-maxage", "max-age"):
+            if name in directives:
+                try:
+                    age = float(headers.get("Age", 0))
+                    return now + max(0.0, float(directives[name]) - age)
+                except ValueError:
+                    break
+
+    expires = headers.get("Expires")
+    if expires:
+        try:
+            return parsedate_to_datetime(expires).timestamp()
+        except (TypeError, ValueError):
+            # 無效的 Expires（例如 "0"）依規範視為已過期
+            return now
+    return None
+
+
+def aligned_expiry(now: float, align: int, offset: int = 0, min_ttl: int = 0) -> float:
+    """返回 now 之後（至少 min_ttl 秒）的第一個 k * align + offset 時間點"""
+    boundary = ((now - offset) // align + 1) * align + offset
+    while boundary - now < min_ttl:
+        boundary += align
+    return boundary
+
+
+def compute_expiry(namespace: Optional[str], headers: Optional[Mapping[str, str]] = None,
+                   now: Optional[float] = None) -> Optional[float]:
+    """
+    計算快取項目的到期時間
+
+    Args:
+        namespace: 數據類別（CACHE_POLICIES 的鍵）；未設定策略時使用 CACHE_DURATION
+        headers: 上游回應標頭
+        now: 目前時間（epoch 秒），預設為 time.time()
+
+    Returns:
+        到期的 epoch 秒數；標頭要求每次重新驗證時返回 now（寫入已過期的項目）；
+        不應寫入快取（no-store）時返回 None
+    """
+    now = time.time() if now is None else now
+    policy = CACHE_POLICIES.get(namespace, {}) if namespace else {}
+    ttl = policy.get("ttl", CACHE_DURATION)
+
+    if is_no_store(headers):
+        return None
+    upstream = header_expiry(headers, now)
+    if upstream is not None:
+        return min(max(upstream, now), now + ttl)
+
+    if policy.get("align"):
+        return min(now + ttl, aligned_expiry(now, policy["align"], policy.get("offset", 0), policy.get("min_ttl", 0)))
+    return now + ttl
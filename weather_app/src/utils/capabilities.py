@@ -0,0 +1,93 @@
+"""
+API 方案能力記錄：記住哪些端點對目前的 API 金鑰不可用（例如免費方案呼叫 Pro 端點回應 401/403/404）
+
+記錄存放在快取目錄（所有伺服器行程共用），在 CAPABILITY_TTL 秒內直接略過這些端點，
+不再每次都先發出一個注定失敗的請求。記錄以 API 金鑰的雜湊區分，更換金鑰或升級方案後
+可呼叫 clear() 立即重新嘗試。
+"""
+import hashlib
+import threading
+import time
+from typing import Dict, Optional
+
+from src.config.config import CAPABILITY_TTL, CAPABILITY_DENY_STATUSES
+from src.utils import metrics
+from src.utils.cache_manager import CacheManager
+
+# 行程內記憶的有效秒數：其他行程 clear() 之後，最多這麼久就會重新讀取共用記錄
+MEMO_SECONDS = 60
+
+API_CAPABILITY_SKIPS = metrics.counter("weather_api_capability_skips_total", "因方案不支援而略過的請求數",
+                                       ["endpoint"])
+
+
+class EndpointUnavailable(Exception):
+    """端點對目前的 API 金鑰不可用（近期回應過 401/403/404）"""
+
+    def __init__(self, endpoint: str, status: int):
+        super().__init__(f"端點 {endpoint} 不適用於目前的 API 方案（HTTP {status}）")
+        self.endpoint = endpoint
+        self.status = status
+
+
+class CapabilityRegistry:
+    """
+    Args:
+        cache_manager: 存放記錄的快取管理器（與 API 數據共用目錄即可跨行程共用）
+        api_key: 目前的 API 金鑰（只保存其雜湊）
+        ttl: 記錄保留秒數
+    """
+
+    def __init__(self, cache_manager: CacheManager, api_key: Optional[str], ttl: int = CAPABILITY_TTL):
+        self.cache = cache_manager
+        self.ttl = ttl
+        self._key_id = hashlib.blake2b((api_key or "").encode("utf-8"), digest_size=8).hexdigest()
+        # 端點 -> (HTTP 狀態或 None（可用）, 記憶到期時間)，省去每次請求都讀取快取檔
+        self._known: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _cache_key(self, endpoint: str) -> str:
+        return f"capability_{endpoint}_{self._key_id}"
+
+    def unavailable_status(self, endpoint: str) -> Optional[int]:
+        """端點近期不可用時返回當時的 HTTP 狀態，否則返回 None"""
+        now = time.time()
+        with self._lock:
+            known = self._known.get(endpoint)
+        if known is not None and known[1] > now:
+            return known[0]
+
+        entry = self.cache.get_entry(self._cache_key(endpoint))
+        if entry is None:
+            status, expires = None, now + MEMO_SECONDS
+        else:
+            status, expires = entry[1], min(entry[0].get("expires") or now, now + MEMO_SECONDS)
+        with self._lock:
+            self._known[endpoint] = (status, expires)
+        return status
+
+    def check(self, endpoint: str) -> None:
+        """端點近期不可用時直接拋出 EndpointUnavailable"""
+        status = self.unavailable_status(endpoint)
+        if status is not None:
+            API_CAPABILITY_SKIPS.inc(endpoint=endpoint)
+            raise EndpointUnavailable(endpoint, status)
+
+    def record_failure(self, endpoint: str, status: int) -> bool:
+        """記錄端點回應的錯誤狀態；屬於方案不支援的狀態時返回 True"""
+        if status not in CAPABILITY_DENY_STATUSES:
+            return False
+        expires = time.time() + self.ttl
+        self.cache.set(self._cache_key(endpoint), status, expires=expires)
+        with self._lock:
+            self._known[endpoint] = (status, min(expires, time.time() + MEMO_SECONDS))
+        return True
+
+    def clear(self, endpoint: Optional[str] = None) -> None:
+        """清除記錄（例如升級方案後），未指定端點時清除全部"""
+        with self._lock:
+            endpoints = [endpoint] if endpoint else list(self._known)
+            for name in endpoints:
+                self._known.pop(name, None)
+        for name in endpoints:
+            self.cache.delete(self._cache_key(name))
@@ -0,0 +1,224 @@
+"""
+跨行程的斷路器：每個 OpenWeather 端點各有一個 closed / open / half-open 狀態
+
+- closed：正常發出請求，統計最近 CIRCUIT_WINDOW 秒內的失敗率；請求數達到 CIRCUIT_MIN_REQUESTS
+  且失敗率達到 CIRCUIT_FAILURE_RATE 時轉為 open
+- open：CIRCUIT_COOLDOWN 秒內不發出請求，直接拋出 CircuitOpen（WeatherAPI 會改用快取，包含已過期的項目）
+- half-open：冷卻結束後只放行一個探測請求，成功則回到 closed，失敗則重新 open；
+  探測期間其他請求仍直接失敗
+
+狀態與速率限制器一樣存在共用目錄的小檔案中並以檔案鎖互斥，所有伺服器行程看到同一個狀態：
+上游故障時，只需要少數請求失敗就能讓所有行程停止送出請求，不會讓每個執行緒各自等到逾時。
+"""
+import os
+import re
+import struct
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from src.config.config import (
+    CACHE_DIR, CIRCUIT_WINDOW, CIRCUIT_MIN_REQUESTS, CIRCUIT_FAILURE_RATE, CIRCUIT_COOLDOWN, CIRCUIT_PROBE_TIMEOUT
+)
+from src.utils import metrics
+from src.utils.file_lock import StripedFileLock
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+STATE_NAMES = {CLOSED: "closed", OPEN: "open", HALF_OPEN: "half_open"}
+
+CIRCUIT_STATE = metrics.gauge("circuit_breaker_state", "斷路器狀態（0=closed、1=open、2=half-open）", ["endpoint"])
+CIRCUIT_TRANSITIONS = metrics.counter("circuit_breaker_transitions_total", "斷路器狀態轉換次數", ["endpoint", "state"])
+CIRCUIT_REJECTED = metrics.counter("circuit_breaker_rejected_total", "斷路器開啟時直接拒絕的請求數", ["endpoint"])
+
+# 狀態檔內容：狀態、開啟時間、探測租約到期時間、統計窗口開始時間、窗口內失敗數、窗口內請求數
+_STATE = struct.Struct("<Bdddii")
+
+# closed 狀態下的成功請求先在行程內累計，最多每隔這麼多秒（或下一次失敗時）才寫入狀態檔
+SUCCESS_FLUSH_INTERVAL = 1.0
+
+
+class CircuitOpen(Exception):
+    """端點的斷路器開啟中，請求未送出"""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"上游端點 {endpoint} 暫時無法使用，約 {max(1, round(retry_after))} 秒後重試")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Args:
+        window: 失敗率統計窗口（秒）
+        min_requests: 窗口內至少要有這麼多請求才判斷失敗率
+        failure_rate: 開啟斷路器的失敗率（0~1）
+        cooldown: 開啟後等待多久才放行探測請求（秒）
+        probe_timeout: 探測請求的租約秒數；探測的一方沒有回報結果（例如行程被終止）時，到期後可再探測
+        state_dir: 狀態檔與鎖檔目錄，所有共用狀態的行程必須相同
+    """
+
+    def __init__(self, window: float = CIRCUIT_WINDOW, min_requests: int = CIRCUIT_MIN_REQUESTS,
+                 failure_rate: float = CIRCUIT_FAILURE_RATE, cooldown: float = CIRCUIT_COOLDOWN,
+                 probe_timeout: float = CIRCUIT_PROBE_TIMEOUT, state_dir: Optional[str] = None):
+        self.window = window
+        self.min_requests = max(1, min_requests)
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+        self.probe_timeout = probe_timeout
+        self.state_dir = state_dir or os.path.join(CACHE_DIR, ".circuit")
+        self._lock = StripedFileLock(self.state_dir, stripes=16)
+        # 狀態檔保持開啟，每次請求不必重新開啟與關閉檔案
+        self._fds: Dict[str, int] = {}
+        self._fds_lock = threading.Lock()
+        # 端點 -> [尚未寫入的成功次數, 上次寫入時間]；只在行程最後看到的狀態為 closed 時使用
+        self._pending: Dict[str, list] = {}
+        self._pending_lock = threading.Lock()
+
+    def _fd(self, endpoint: str) -> int:
+        fd = self._fds.get(endpoint)
+        if fd is None:
+            with self._fds_lock:
+                fd = self._fds.get(endpoint)
+                if fd is None:
+                    path = os.path.join(self.state_dir, re.sub(r"[^\w.-]", "_", endpoint))
+                    fd = self._fds[endpoint] = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0),
+                                                       0o644)
+        return fd
+
+    def _update(self, endpoint: str, change, flush: bool = True) -> Tuple[int, int, float]:
+        """
+        在檔案鎖內讀取、修改並寫回端點的狀態
+
+        Args:
+            change: 函式 (狀態列表, 現在時間) -> 返回值；可直接修改狀態列表
+            flush: 是否一併寫入行程內累計的成功次數
+
+        Returns:
+            (變更前的狀態, 變更後的狀態, change 的返回值)
+        """
+        now = time.time()
+        successes = 0
+        if flush:
+            with self._pending_lock:
+                entry = self._pending.pop(endpoint, None)
+            successes = entry[0] if entry else 0
+        with self._lock.lock(endpoint):
+            fd = self._fd(endpoint)
+            os.lseek(fd, 0, os.SEEK_SET)
+            raw = os.read(fd, _STATE.size)
+            state = list(_STATE.unpack(raw)) if len(raw) == _STATE.size else [CLOSED, 0.0, 0.0, now, 0, 0]
+            original = list(state)
+            before = state[0]
+            if successes and before == CLOSED:
+                self._roll_window(state, now)
+                state[5] += successes
+            result = change(state, now)
+            # 狀態固定長度，直接覆寫；沒有變更時（例如 closed 狀態下的 before_request）不寫入
+            if state != original or len(raw) != _STATE.size:
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.write(fd, _STATE.pack(*state))
+        after = state[0]
+        if after == CLOSED:
+            with self._pending_lock:
+                self._pending.setdefault(endpoint, [0, now])
+        CIRCUIT_STATE.set(after, endpoint=endpoint)
+        if after != before:
+            CIRCUIT_TRANSITIONS.inc(endpoint=endpoint, state=STATE_NAMES[after])
+            log = logger.warning if after == OPEN else logger.info
+            log("端點 %s 的斷路器: %s -> %s", endpoint, STATE_NAMES[before], STATE_NAMES[after])
+        return before, after, result
+
+    def _roll_window(self, state: list, now: float) -> None:
+        if now - state[3] >= self.window:
+            state[3], state[4], state[5] = now, 0, 0
+
+    def _open(self, state: list, now: float) -> None:
+        state[0], state[1], state[2] = OPEN, now, 0.0
+        state[3], state[4], state[5] = now, 0, 0
+
+    def before_request(self, endpoint: str) -> None:
+        """
+        請求前呼叫；斷路器開啟（或半開且已有探測進行中）時拋出 CircuitOpen
+
+        通過時，呼叫端必須在請求結束後呼叫 record_success、record_failure 或 release。
+        """
+        def change(state, now):
+            if state[0] == CLOSED:
+                return 0.0
+            if state[0] == OPEN:
+                retry_after = state[1] + self.cooldown - now
+                if retry_after > 0:
+                    return retry_after
+                state[0] = HALF_OPEN
+            # 半開：只放行一個探測請求
+            if state[2] > now:
+                return state[2] - now
+            state[2] = now + self.probe_timeout
+            return 0.0
+
+        _, _, retry_after = self._update(endpoint, change, flush=False)
+        if retry_after > 0:
+            CIRCUIT_REJECTED.inc(endpoint=endpoint)
+            raise CircuitOpen(endpoint, retry_after)
+
+    def record_success(self, endpoint: str) -> None:
+        """請求成功（包括 4xx 等與上游健康無關的回應）"""
+        with self._pending_lock:
+            entry = self._pending.get(endpoint)
+            # 上次看到的狀態是 closed：只累計次數，不必每次請求都寫檔
+            if entry is not None and time.time() - entry[1] < SUCCESS_FLUSH_INTERVAL:
+                entry[0] += 1
+                return
+
+        def change(state, now):
+            if state[0] != CLOSED:
+                state[0], state[2] = CLOSED, 0.0
+                state[3], state[4], state[5] = now, 0, 0
+                return
+            self._roll_window(state, now)
+            state[5] += 1
+
+        self._update(endpoint, change)
+
+    def record_failure(self, endpoint: str) -> None:
+        """請求失敗（網路錯誤、逾時、5xx、429）"""
+        def change(state, now):
+            if state[0] != CLOSED:
+                # 探測失敗（或冷卻中仍在進行的舊請求失敗）：重新計算冷卻時間
+                self._open(state, now)
+                return
+            self._roll_window(state, now)
+            state[4] += 1
+            state[5] += 1
+            if state[5] >= self.min_requests and state[4] / state[5] >= self.failure_rate:
+                self._open(state, now)
+
+        self._update(endpoint, change)
+
+    def release(self, endpoint: str) -> None:
+        """請求結束但無法判斷上游是否健康（例如因延遲預算縮短 timeout 而逾時）：不計入統計，只釋放探測租約"""
+        def change(state, now):
+            if state[0] == HALF_OPEN:
+                state[2] = 0.0
+
+        self._update(endpoint, change, flush=False)
+
+    def state(self, endpoint: str) -> str:
+        """端點目前的狀態名稱（closed / open / half_open）"""
+        def change(state, now):
+            # open 且冷卻已結束時，下一個請求會成為探測請求，此時視為 half-open
+            if state[0] == OPEN and now >= state[1] + self.cooldown:
+                return HALF_OPEN
+            return state[0]
+
+        return STATE_NAMES[self._update(endpoint, change, flush=False)[2]]
+
+    def reset(self, endpoint: str) -> None:
+        """強制回到 closed（例如確認上游已恢復）"""
+        def change(state, now):
+            state[:] = [CLOSED, 0.0, 0.0, now, 0, 0]
+
+        self._update(endpoint, change)
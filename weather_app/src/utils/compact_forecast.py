@@ -0,0 +1,174 @@
+"""
+3 小時預報的精簡表示
+
+OpenWeather forecast 端點的每個項目是多層巢狀的 dict（main、wind、weather、sys、clouds...），
+DataProcessor 只用到其中約十個欄位。HourlyForecast 只保留這些欄位，整份預報存成一個 NumPy 結構化陣列：
+
+- 溫度、風速以 0.01 為單位的定點整數（int16 / uint16）保存，上游本來就只有兩位小數，解碼後與 JSON 數值相同
+- 濕度、降水機率（百分比）為 uint8，氣壓、風向為 uint16，時間為 uint32（epoch 秒）
+- 天氣描述與圖示以行程內共用的代碼表去重，每筆只存 uint16 代碼
+
+每筆 22 位元組，40 筆的預報約 1 KB（原本的 dict 列表約 80 KB）。pickle 時代碼會換成字串表，
+因此快取檔可以在不同行程間共用；陣列本體以 pickle protocol 5 的 out-of-band 緩衝區寫入，不另外複製。
+"""
+import threading
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+HOURLY_DTYPE = np.dtype([
+    ("dt", "<u4"),
+    ("temp", "<i2"),
+    ("feels_like", "<i2"),
+    ("temp_min", "<i2"),
+    ("temp_max", "<i2"),
+    ("humidity", "u1"),
+    ("pressure", "<u2"),
+    ("wind_speed", "<u2"),
+    ("wind_deg", "<u2"),
+    ("pop", "u1"),
+    ("code", "<u2")
+])
+
+# 以 0.01 為單位保存的欄位
+CENTI_FIELDS = ("temp", "feels_like", "temp_min", "temp_max", "wind_speed")
+
+# (描述, 圖示) <-> 代碼；只增不減，行程內所有預報共用
+_labels: List[Tuple[str, str]] = []
+_label_codes: Dict[Tuple[str, str], int] = {}
+_labels_lock = threading.Lock()
+
+
+def intern_label(description: str, icon: str) -> int:
+    """取得 (描述, 圖示) 的代碼，第一次出現時加入代碼表"""
+    label = (description, icon)
+    code = _label_codes.get(label)
+    if code is not None:
+        return code
+    with _labels_lock:
+        code = _label_codes.get(label)
+        if code is None:
+            if len(_labels) > np.iinfo(np.uint16).max:
+                raise ValueError("天氣描述代碼表已滿")
+            code = len(_labels)
+            _labels.append(label)
+            _label_codes[label] = code
+        return code
+
+
+def _centi(value: float) -> int:
+    return int(round(value * 100))
+
+
+class HourlyForecast:
+    """
+    精簡的 3 小時預報（唯讀）
+
+    Args:
+        records: HOURLY_DTYPE 的結構化陣列
+    """
+
+    __slots__ = ("records",)
+
+    def __init__(self, records: np.ndarray):
+        self.records = records
+
+    @classmethod
+    def from_items(cls, items: List[Dict]) -> "HourlyForecast":
+        """由 forecast 端點的 list 建立；缺少必要欄位時拋出 KeyError"""
+        rows = []
+        for item in items:
+            main = item["main"]
+            weather = item["weather"][0]
+            wind = item["wind"]
+            rows.append((
+                item["dt"],
+                _centi(main["temp"]),
+                _centi(main["feels_like"]),
+                _centi(main.get("temp_min", main["temp"])),
+                _centi(main.get("temp_max", main["temp"])),
+                main["humidity"],
+                main["pressure"],
+                _centi(wind["speed"]),
+                wind.get("deg", 0),
+                int(round(item.get("pop", 0) * 100)),
+                intern_label(weather["description"], weather["icon"])
+            ))
+        return cls(np.array(rows, dtype=HOURLY_DTYPE))
+
+    @classmethod
+    def concat(cls, forecasts: List["HourlyForecast"]) -> "HourlyForecast":
+        """依序串接多份預報（例如多個地點），代碼表為行程共用，可以直接串接"""
+        return cls(np.concatenate([forecast.records for forecast in forecasts]) if forecasts
+                   else np.empty(0, dtype=HOURLY_DTYPE))
+
+    @classmethod
+    def coerce(cls, data: Union["HourlyForecast", List[Dict]]) -> "HourlyForecast":
+        """接受 HourlyForecast 或原始的 list（例如舊格式的快取項目）"""
+        return data if isinstance(data, cls) else cls.from_items(data)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, index: slice) -> "HourlyForecast":
+        return HourlyForecast(self.records[index])
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, HourlyForecast) and np.array_equal(self.records, other.records)
+
+    def column(self, name: str) -> np.ndarray:
+        """取得欄位的實際數值（定點欄位換算為 float64，其餘為原始整數陣列）"""
+        values = self.records[name]
+        return values / 100.0 if name in CENTI_FIELDS else values
+
+    def labels(self) -> Tuple[np.ndarray, np.ndarray]:
+        """每筆的 (描述, 圖示) 字串陣列"""
+        table = np.array(_labels, dtype=object).reshape(-1, 2)
+        picked = table[self.records["code"]]
+        return picked[:, 0], picked[:, 1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.records.nbytes
+
+    def to_items(self) -> List[Dict]:
+        """還原為 forecast 端點 list 的格式（只含保留的欄位）"""
+        descriptions, icons = self.labels()
+        columns = {name: self.column(name).tolist() for name in HOURLY_DTYPE.names if name != "code"}
+        return [
+            {
+                "dt": columns["dt"][i],
+                "main": {
+                    "temp": columns["temp"][i],
+                    "feels_like": columns["feels_like"][i],
+                    "temp_min": columns["temp_min"][i],
+                    "temp_max": columns["temp_max"][i],
+                    "humidity": columns["humidity"][i],
+                    "pressure": columns["pressure"][i]
+                },
+                "wind": {"speed": columns["wind_speed"][i], "deg": columns["wind_deg"][i]},
+                "pop": columns["pop"][i] / 100,
+                "weather": [{"description": descriptions[i], "icon": icons[i]}]
+            }
+            for i in range(len(self))
+        ]
+
+    def __reduce__(self):
+        # 代碼只在目前行程有效：改存這份預報用到的字串與對應的本地代碼
+        codes, local = np.unique(self.records["code"], return_inverse=True)
+        records = self.records.copy()
+        records["code"] = local.reshape(-1)
+        return _restore, (records, [_labels[code] for code in codes.tolist()])
+
+    def __repr__(self) -> str:
+        return f"HourlyForecast({len(self)} 筆, {self.nbytes} 位元組)"
+
+
+def _restore(records: np.ndarray, labels: List[Tuple[str, str]]) -> HourlyForecast:
+    if not records.flags.writeable:
+        # 從快取檔的唯讀緩衝區還原
+        records = records.copy()
+    if len(records):
+        table = np.array([intern_label(*label) for label in labels], dtype=np.uint16)
+        records["code"] = table[records["code"]]
+    return HourlyForecast(records)
@@ -1,12 +1,89 @@
 """
 數據處理工具類：負責處理和轉換天氣數據
 """
-from typing import Dict, List, Union
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from pandas.api.types import union_categoricals
+
+from src.config.config import PROCESSOR_MEMO_SIZE, DERIVED_CACHE_ENABLED, PROCESSOR_TIMEZONE
+from .metrics import track_processing, PROCESSOR_MEMO
+from .derived_cache import DerivedCache
+from .alerts import AlertEngine
+from .compact_forecast import HourlyForecast
+from .forecast_resample import upsample
+from .executor import apply_to_array, chunk_bounds, run_chunks, shared_source, split_count, use_pool
+
+# 處理邏輯或輸出欄位變更時遞增，讓磁碟上的舊處理結果失效
+# 3：舊版可能把處理結果寫在不相符的數據版本下（數據與版本分兩步取得），全部作廢
+PROCESSOR_VERSION = 3
+
+# (方法名稱, 數據版本) -> 處理結果；行程內所有 session 共用，Streamlit 每次 rerun 重建 DataProcessor 也不會遺失
+_memo: "OrderedDict[tuple, Any]" = OrderedDict()
+_memo_lock = threading.Lock()
+
+# 記憶體中沒有時再查磁碟上的處理結果（跨行程、重啟後仍有效）；第一次使用時才建立快取目錄
+_derived_cache: Optional[DerivedCache] = None
+_derived_cache_lock = threading.Lock()
+
+
+def get_derived_cache() -> Optional[DerivedCache]:
+    """行程共用的處理結果快取，DERIVED_CACHE_ENABLED 關閉時為 None"""
+    global _derived_cache
+    if not DERIVED_CACHE_ENABLED:
+        return None
+    with _derived_cache_lock:
+        if _derived_cache is None:
+            _derived_cache = DerivedCache(PROCESSOR_VERSION)
+        return _derived_cache
+
+# 依 config.ALERT_RULES 編譯的警報規則
+alert_engine = AlertEngine()
+
+# 每日預報沒有 temperature 欄位：高溫規則看最高溫、低溫規則看最低溫
+DAILY_ALERT_COLUMNS = {"temperature": ("temp_min", "temp_max")}
+
+# 精簡輸出（compact=True）的欄位型別；溫度已四捨五入到 0.1，float32 足以表示
+COMPACT_DTYPES = {
+    'temperature': np.float32,
+    'feels_like': np.float32,
+    'temp_day': np.float32,
+    'temp_min': np.float32,
+    'temp_max': np.float32,
+    'pressure': np.float32,
+    'wind_speed': np.float32,
+    'humidity': np.uint8,
+    'pop': np.uint8,
+    'description': 'category',
+    'icon': 'category'
+}
+
+HISTORICAL_FIELDS = ('temperature', 'pressure', 'humidity', 'wind_speed', 'precipitation', 'clouds', 'sunshine_hours')
+
+# AQI 上限與對應的等級、顏色
+AQI_LEVELS = [
+    (50, '優', '#2ecc71'),
+    (100, '良', '#f1c40f'),
+    (150, '對敏感族群不健康', '#e67e22'),
+    (200, '不健康', '#e74c3c'),
+    (300, '非常不健康', '#8e44ad'),
+    (float('inf'), '危害', '#7f8c8d')
+]
+
+
+def aqi_level(aqi: float) -> Tuple[str, str]:
+    """AQI 對應的等級與顏色"""
+    for upper, label, color in AQI_LEVELS:
+        if aqi <= upper:
+            return label, color
+    return AQI_LEVELS[-1][1:]
 
 class DataProcessor:
     @staticmethod
+    @track_processing("process_current_weather")
     def process_current_weather(data: Dict) -> Dict:
         """處理當前天氣數據"""
         try:
@@ -26,35 +103,55 @@ class DataProcessor:
             raise Exception(f"處理當前天氣數據失敗: 缺少關鍵數據 {str(e)}")
 
     @staticmethod
-    def process_hourly_forecast(data: List[Dict]) -> pd.DataFrame:
-        """處理每小時預報數據"""
-        try:
-            processed = []
-            for hour in data:
-                processed.append({
-                    'time': datetime.fromtimestamp(hour['dt']),
-                    'temperature': round(hour['main']['temp'], 1),
-                    'feels_like': round(hour['main']['feels_like'], 1),
-                    'humidity': hour['main']['humidity'],
-                    'pressure': hour['main']['pressure'],
-                    'wind_speed': hour['wind']['speed'],
-                    'description': hour['weather'][0]['description'],
-                    'icon': hour['weather'][0]['icon'],
-                    'pop': hour.get('pop', 0) * 100
-                })
-            return pd.DataFrame(processed)
-        except KeyError as e:
-            raise Exception(f"處理每小時預報數據失敗: 缺少關鍵數據 {str(e)}")
+    @track_processing("process_hourly_forecast")
+    def process_hourly_forecast(data: Union[HourlyForecast, List[Dict]], compact: bool = False) -> pd.DataFrame:
+        """
+        處理每小時預報數據（WeatherAPI 返回的 HourlyForecast，或 forecast 端點原始的 list）
+
+        compact=True 時輸出精簡型別（見 COMPACT_DTYPES），time 為 PROCESSOR_TIMEZONE 的時區感知時間
+        """
+        return _hourly_frame(_coerce_hourly(data), compact)
+
+    @staticmethod
+    @track_processing("process_hourly_interpolated")
+    def process_hourly_interpolated(data: Union[HourlyForecast, List[Dict]], step: int = 3600,
+                                    hours: Optional[int] = None, compact: bool = False) -> pd.DataFrame:
+        """
+        把 3 小時預報內插為每 step 秒一筆後處理（欄位同 process_hourly_forecast）
+
+        溫度類欄位以 PCHIP、濕度 / 氣壓 / 風速 / 降水機率以線性、風向沿最短弧、天氣描述與圖示沿用前一筆內插；
+        hours 限制只輸出第一筆起幾小時內的數據。
+        """
+        forecast, _ = upsample(_coerce_hourly(data), step=step, horizon=hours * 3600 if hours else None)
+        return _hourly_frame(forecast, compact)
+
+    @staticmethod
+    @track_processing("interpolate_hourly")
+    def interpolate_hourly(forecasts: Dict[str, Union[HourlyForecast, List[Dict]]], step: int = 3600,
+                           hours: Optional[int] = None) -> Dict[str, HourlyForecast]:
+        """
+        一次內插多個地點的 3 小時預報（所有地點在同一組向量運算中完成）
+
+        Returns:
+            地點 -> 內插後的 HourlyForecast（同一個陣列的切片，可再交給 process_hourly_forecast）
+        """
+        keys = list(forecasts)
+        parts = [_coerce_hourly(forecasts[key]) for key in keys]
+        combined, counts = upsample(HourlyForecast.concat(parts), [len(part) for part in parts], step=step,
+                                    horizon=hours * 3600 if hours else None)
+        bounds = np.cumsum([0] + counts)
+        return {key: combined[bounds[i]:bounds[i + 1]] for i, key in enumerate(keys)}
 
     @staticmethod
-    def process_daily_forecast(data: List[Dict]) -> pd.DataFrame:
-        """處理每日預報數據"""
+    @track_processing("process_daily_forecast")
+    def process_daily_forecast(data: List[Dict], compact: bool = False) -> pd.DataFrame:
+        """處理每日預報數據；compact=True 時輸出精簡型別（同 process_hourly_forecast）"""
         try:
             processed = []
             for day in data:
                 temp = day['temp']
                 processed.append({
-                    'date': datetime.fromtimestamp(day['dt']),
+                    'date': day['dt'] if compact else datetime.fromtimestamp(day['dt']),
                     'temp_day': round(temp['day'], 1) if isinstance(temp, dict) else round(temp, 1),
                     'temp_min': round(day.get('temp_min', temp.get('min')), 1),
                     'temp_max': round(day.get('temp_max', temp.get('max')), 1),
@@ -65,6 +162,11 @@ class DataProcessor:
                     'icon': day['weather'][0]['icon'],
                     'pop': day.get('pop', 0) * 100
                 })
+            if compact and processed:
+                columns = {key: [row[key] for row in processed] for key in processed[0]}
+                epochs = columns.pop('date')
+                columns['pop'] = np.round(columns['pop'])
+                return _compact_frame(columns, 'date', epochs)
             return pd.DataFrame(processed)
         except KeyError as e:
             raise Exception(f"處理每日預報數據失敗: 缺少關鍵數據 {str(e)}")
@@ -86,6 +188,45 @@ class DataProcessor:
                     (251, 350, 151, 200), (351, 500, 201, 300), (501, 1004, 301, 500)]
         }
 
+    def process_versioned(self, method: str, version: Optional[Tuple[str, str]], data: Any, **options) -> Any:
+        """
+        以數據版本記憶處理結果：同一版本的原始數據只處理一次
+
+        先查行程內的記憶，再查磁碟上的處理結果快取，都沒有才實際處理並寫回兩者。
+        版本必須與數據來自同一次 WeatherAPI 的 *_versioned 呼叫；返回的結果會被多個 session 共用，呼叫端不應修改。
+
+        Args:
+            method: 處理方法名稱，例如 "process_hourly_forecast"
+            version: 數據版本 (原始快取鍵, 內容雜湊)，為 None 時不記憶
+            data: 原始數據
+            **options: 傳給處理方法的選項（例如 compact=True），不同選項的結果分開記憶
+        """
+        if version is None:
+            return getattr(self, method)(data, **options)
+
+        # 帶選項時以 "方法?選項" 區分記憶與磁碟快取中的結果
+        name = method + "".join(f"?{key}={value}" for key, value in sorted(options.items()))
+        memo_key = (name, version)
+        with _memo_lock:
+            if memo_key in _memo:
+                _memo.move_to_end(memo_key)
+                PROCESSOR_MEMO.inc(method=method, result="hit")
+                return _memo[memo_key]
+
+        derived_cache = get_derived_cache()
+        result = derived_cache.get(name, version) if derived_cache is not None else None
+        if result is None:
+            result = getattr(self, method)(data, **options)
+            # 寫入磁碟的結果跨行程、重啟後仍有效，版本必須與數據成對取得（見上方說明）
+            if derived_cache is not None:
+                derived_cache.set(name, version, result)
+        PROCESSOR_MEMO.inc(method=method, result="miss")
+        with _memo_lock:
+            _memo[memo_key] = result
+            while len(_memo) > PROCESSOR_MEMO_SIZE:
+                _memo.popitem(last=False)
+        return result
+
     def _calc_sub_index(self, C: float, bps: List[tuple]) -> Union[float, None]:
         """根據斷點列表計算子指標值"""
         for C_lo, C_hi, I_lo, I_hi in bps:
@@ -93,6 +234,7 @@ class DataProcessor:
                 return (I_hi - I_lo) / (C_hi - C_lo) * (C - C_lo) + I_lo
         return None
 
+    @track_processing("process_air_pollution")
     def process_air_pollution(self, data: Dict) -> Dict:
         """處理空氣污染數據並計算 EPA 標準 AQI"""
         try:
@@ -108,19 +250,7 @@ class DataProcessor:
                         sub_idx[key] = round(idx)
 
             aqi = max(sub_idx.values())
-            # 對應等級與顏色
-            if aqi <= 50:
-                label, color = '優', '#2ecc71'
-            elif aqi <= 100:
-                label, color = '良', '#f1c40f'
-            elif aqi <= 150:
-                label, color = '對敏感族群不健康', '#e67e22'
-            elif aqi <= 200:
-                label, color = '不健康', '#e74c3c'
-            elif aqi <= 300:
-                label, color = '非常不健康', '#8e44ad'
-            else:
-                label, color = '危害', '#7f8c8d'
+            label, color = aqi_level(aqi)
 
             return {
                 'aqi': aqi,
@@ -132,106 +262,273 @@ class DataProcessor:
             raise Exception(f"處理空氣污染數據失敗: 缺少關鍵數據 {str(e)}")
 
     @staticmethod
+    @track_processing("process_historical_weather")
     def process_historical_weather(data: List[Dict]) -> Dict:
         """處理歷史天氣數據並計算統計數據"""
         try:
-            processed = {
-                'temperature': [],
-                'pressure': [],
-                'humidity': [],
-                'wind_speed': [],
-                'precipitation': [],
-                'clouds': [],
-                'sunshine_hours': []
-            }
-
-            for record in data:
-                processed['temperature'].append(record.get('temperature', 0))
-                processed['pressure'].append(record.get('pressure', 0))
-                processed['humidity'].append(record.get('humidity', 0))
-                processed['wind_speed'].append(record.get('wind_speed', 0))
-                processed['precipitation'].append(record.get('precipitation', 0))
-                processed['clouds'].append(record.get('clouds', 0))
-                processed['sunshine_hours'].append(record.get('sunshine_hours', 0))
-
-            return {
-                'temperature': {
-                    'mean': round(sum(processed['temperature']) / len(processed['temperature']), 1),
-                    'max': max(processed['temperature']),
-                    'min': min(processed['temperature']),
-                    'std': round((sum((x - (sum(processed['temperature']) / len(processed['temperature']))) ** 2 for x in processed['temperature']) / len(processed['temperature'])) ** 0.5, 1)
-                },
-                'pressure': {
-                    'mean': round(sum(processed['pressure']) / len(processed['pressure']), 1),
-                    'max': max(processed['pressure']),
-                    'min': min(processed['pressure']),
-                    'std': round((sum((x - (sum(processed['pressure']) / len(processed['pressure']))) ** 2 for x in processed['pressure']) / len(processed['pressure'])) ** 0.5, 1)
-                },
-                'humidity': {
-                    'mean': round(sum(processed['humidity']) / len(processed['humidity']), 1),
-                    'max': max(processed['humidity']),
-                    'min': min(processed['humidity']),
-                    'std': round((sum((x - (sum(processed['humidity']) / len(processed['humidity']))) ** 2 for x in processed['humidity']) / len(processed['humidity'])) ** 0.5, 1)
-                },
-                'wind_speed': {
-                    'mean': round(sum(processed['wind_speed']) / len(processed['wind_speed']), 1),
-                    'max': max(processed['wind_speed']),
-                    'min': min(processed['wind_speed']),
-                    'std': round((sum((x - (sum(processed['wind_speed']) / len(processed['wind_speed']))) ** 2 for x in processed['wind_speed']) / len(processed['wind_speed'])) ** 0.5, 1)
-                },
-                'precipitation': {
-                    'mean': round(sum(processed['precipitation']) / len(processed['precipitation']), 1),
-                    'max': max(processed['precipitation']),
-                    'min': min(processed['precipitation']),
-                    'std': round((sum((x - (sum(processed['precipitation']) / len(processed['precipitation']))) ** 2 for x in processed['precipitation']) / len(processed['precipitation'])) ** 0.5, 1)
-                },
-                'clouds': {
-                    'mean': round(sum(processed['clouds']) / len(processed['clouds']), 1),
-                    'max': max(processed['clouds']),
-                    'min': min(processed['clouds']),
-                    'std': round((sum((x - (sum(processed['clouds']) / len(processed['clouds']))) ** 2 for x in processed['clouds']) / len(processed['clouds'])) ** 0.5, 1)
-                },
-                'sunshine_hours': {
-                    'mean': round(sum(processed['sunshine_hours']) / len(processed['sunshine_hours']), 1),
-                    'max': max(processed['sunshine_hours']),
-                    'min': min(processed['sunshine_hours']),
-                    'std': round((sum((x - (sum(processed['sunshine_hours']) / len(processed['sunshine_hours']))) ** 2 for x in processed['sunshine_hours']) / len(processed['sunshine_hours'])) ** 0.5, 1)
-                }
-            }
+            matrix = _historical_matrix(data)
+            return _historical_stats(matrix, np.array([0, len(data)]))[0]
         except KeyError as e:
             raise Exception(f"處理歷史天氣數據失敗: 缺少關鍵數據 {str(e)}")
 
+    @staticmethod
+    @track_processing("process_historical_batch")
+    def process_historical_batch(stations: Dict[str, List[Dict]]) -> Dict[str, Dict]:
+        """
+        批次計算多個地點的歷史統計數據（格式同 process_historical_weather）
+
+        資料量大時依地點切塊交給行程池，紀錄矩陣經共享記憶體傳給工作行程。
+        沒有任何紀錄的地點結果為 None。
+        """
+        keys = [key for key, records in stations.items() if records]
+        sizes = [len(stations[key]) for key in keys]
+        rows = sum(sizes)
+        result: Dict[str, Optional[Dict]] = {key: None for key in stations}
+        if not keys:
+            return result
+
+        matrix = _historical_matrix(record for key in keys for record in stations[key])
+        offsets = np.concatenate(([0], np.cumsum(sizes)))
+        bounds = chunk_bounds(sizes, split_count() if use_pool(rows) else 1)
+        with shared_source(matrix, rows) as source:
+            chunks = run_chunks(_historical_chunk, [(source, offsets[a:b + 1]) for a, b in bounds], rows)
+        for (a, b), stats in zip(bounds, chunks):
+            result.update(zip(keys[a:b], stats))
+        return result
+
+    @track_processing("process_air_pollution_batch")
+    def process_air_pollution_batch(self, items: List[Dict]) -> List[Dict]:
+        """
+        批次計算多個測站的 AQI（每筆格式同 process_air_pollution 的輸入與輸出）
+
+        所有污染物都不在斷點範圍內的測站，aqi、aqi_label、aqi_color 為 None。
+        """
+        try:
+            comps_list = [item['list'][0]['components'] for item in items]
+        except (KeyError, IndexError) as e:
+            raise Exception(f"處理空氣污染數據失敗: 缺少關鍵數據 {str(e)}")
+
+        pollutants = list(self.breakpoints)
+        matrix = np.array(
+            [[comps.get(key, np.nan) for key in pollutants] for comps in comps_list], dtype=np.float64
+        ).reshape(len(comps_list), len(pollutants))
+        rows = len(comps_list)
+        bounds = chunk_bounds([1] * rows, split_count() if use_pool(rows) else 1)
+        with shared_source(matrix, rows) as source:
+            chunks = run_chunks(_aqi_chunk, [(source, a, b, self.breakpoints) for a, b in bounds], rows)
+
+        results = []
+        for comps, aqi in zip(comps_list, np.concatenate(chunks) if chunks else []):
+            if aqi < 0:
+                aqi, label, color = None, None, None
+            else:
+                aqi = int(aqi)
+                label, color = aqi_level(aqi)
+            results.append({'aqi': aqi, 'aqi_label': label, 'aqi_color': color, **comps})
+        return results
+
+    @staticmethod
+    @track_processing("process_hourly_batch")
+    def process_hourly_batch(forecasts: Dict[str, Union[HourlyForecast, List[Dict]]],
+                             compact: bool = False) -> Dict[str, pd.DataFrame]:
+        """
+        批次處理多個地點的每小時預報；資料量大時依地點切塊交給行程池
+
+        需要單一的多地點 DataFrame 時，再交給 combine_forecasts 合併。
+        """
+        items = list(forecasts.items())
+        sizes = [len(data) for _, data in items]
+        rows = sum(sizes)
+        bounds = chunk_bounds(sizes, split_count() if use_pool(rows) else 1)
+        chunks = run_chunks(_hourly_chunk, [(items[a:b], compact) for a, b in bounds], rows)
+        return {key: df for chunk in chunks for key, df in chunk}
+
+    @staticmethod
+    @track_processing("process_hourly_frame")
+    def process_hourly_frame(forecasts: Dict[str, Union[HourlyForecast, List[Dict]]],
+                             step: Optional[int] = None) -> pd.DataFrame:
+        """
+        把多個地點的每小時預報處理成單一的精簡 DataFrame
+
+        欄位與型別同 process_hourly_forecast(compact=True)，索引為名稱 location 的 CategoricalIndex。
+        各地點的紀錄先串接成一個結構化陣列再一次轉換，不必逐個地點建立 DataFrame 再合併。
+        指定 step 時先一次內插所有地點（同 process_hourly_interpolated）。
+        """
+        keys = list(forecasts)
+        parts = [_coerce_hourly(forecasts[key]) for key in keys]
+        combined, sizes = HourlyForecast.concat(parts), [len(part) for part in parts]
+        if step is not None:
+            combined, sizes = upsample(combined, sizes, step=step)
+        frame = _hourly_frame(combined, compact=True)
+        frame.index = _location_index(keys, sizes)
+        return frame
+
+    @staticmethod
+    def combine_forecasts(forecasts: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+        """
+        把多個地點已處理的預報（例如 process_daily_forecast 的結果）合併成單一 DataFrame，
+        索引為名稱 location 的 CategoricalIndex
+
+        各地點 category 欄位的類別不同，直接 concat 會退回 object 字串，因此這些欄位改以 union_categoricals 合併。
+        """
+        keys = list(forecasts)
+        frames = [df for df in forecasts.values() if not df.empty]
+        if not frames:
+            return pd.DataFrame(index=_location_index(keys, [0] * len(keys)))
+
+        categorical = [column for column, dtype in frames[0].dtypes.items() if isinstance(dtype, pd.CategoricalDtype)]
+        combined = pd.concat([df.drop(columns=categorical) for df in frames], ignore_index=True)
+        for column in categorical:
+            combined[column] = union_categoricals([df[column] for df in frames])
+        combined = combined[frames[0].columns]
+        combined.index = _location_index(keys, [len(df) for df in forecasts.values()])
+        return combined
+
     @staticmethod
     def get_weather_alert_level(current_weather: Dict) -> tuple:
-        """根據天氣數據判斷警報等級"""
-        temp = current_weather['temperature']
-        humidity = current_weather['humidity']
-        wind_speed = current_weather['wind_speed']
-        alerts = []
-        level = "正常"
-
-        # 溫度警報
-        if temp >= 38:
-            alerts.append("極端高溫警報")
-            level = "危險"
-        elif temp >= 35:
-            alerts.append("高溫警報")
-            level = "警告"
-        elif temp <= 0:
-            alerts.append("低溫警報")
-            level = "警告"
-
-        # 濕度警報
-        if humidity >= 85:
-            alerts.append("高濕度警報")
-            level = max(level, "警告")
-
-        # 強風警報
-        if wind_speed >= 20:
-            alerts.append("強風警報")
-            level = "危險"
-        elif wind_speed >= 15:
-            alerts.append("大風警報")
-            level = max(level, "警告")
-
-        return level, alerts
+        """根據天氣數據判斷警報等級（規則見 config.ALERT_RULES）"""
+        return alert_engine.check(current_weather)
+
+    @staticmethod
+    def scan_forecast_alerts(forecasts: Dict[str, pd.DataFrame], kind: str = "hourly") -> pd.DataFrame:
+        """
+        一次掃描多個地點的預報，找出各警報的起訖時間
+
+        Args:
+            forecasts: 地點 -> process_hourly_forecast 或 process_daily_forecast 的結果
+            kind: "hourly" 或 "daily"
+
+        Returns:
+            pd.DataFrame: 格式見 AlertEngine.windows，location 為 forecasts 的鍵
+        """
+        time_col, columns = ("date", DAILY_ALERT_COLUMNS) if kind == "daily" else ("time", None)
+        frames = [df for df in forecasts.values() if not df.empty]
+        if not frames:
+            return alert_engine.windows(pd.DataFrame(), time_col)
+        locations = np.repeat(
+            np.array([key for key, df in forecasts.items() if not df.empty], dtype=object),
+            [len(df) for df in frames]
+        )
+        combined = pd.concat(frames, ignore_index=True)
+        combined["location"] = locations
+        return alert_engine.windows(combined, time_col, location_col="location", columns=columns)
+
+
+# 以下為批次工作的單塊處理函式，放在模組層級讓行程池的工作行程能以名稱匯入
+
+def _historical_matrix(records) -> np.ndarray:
+    """紀錄 -> (筆數, 欄位數) 的 float64 矩陣，缺少的欄位視為 0"""
+    values = [record.get(field, 0) for record in records for field in HISTORICAL_FIELDS]
+    return np.array(values, dtype=np.float64).reshape(-1, len(HISTORICAL_FIELDS))
+
+
+def _historical_stats(matrix: np.ndarray, offsets: np.ndarray) -> List[Dict]:
+    """計算 offsets 劃分的每一段紀錄（一個地點）的平均、最大、最小與母體標準差"""
+    block = matrix[offsets[0]:offsets[-1]]
+    starts = offsets[:-1] - offsets[0]
+    counts = np.diff(offsets)
+    means = np.add.reduceat(block, starts, axis=0) / counts[:, None]
+    maxs = np.maximum.reduceat(block, starts, axis=0)
+    mins = np.minimum.reduceat(block, starts, axis=0)
+    centered = block - np.repeat(means, counts, axis=0)
+    stds = np.sqrt(np.add.reduceat(centered * centered, starts, axis=0) / counts[:, None])
+
+    means, maxs, mins, stds = means.tolist(), maxs.tolist(), mins.tolist(), stds.tolist()
+    return [
+        {
+            field: {
+                'mean': round(means[i][j], 1),
+                'max': maxs[i][j],
+                'min': mins[i][j],
+                'std': round(stds[i][j], 1)
+            }
+            for j, field in enumerate(HISTORICAL_FIELDS)
+        }
+        for i in range(len(counts))
+    ]
+
+
+def _historical_chunk(source, offsets: np.ndarray) -> List[Dict]:
+    return apply_to_array(source, _historical_stats, offsets)
+
+
+def _aqi_values(matrix: np.ndarray, start: int, end: int, breakpoints: Dict[str, List[tuple]]) -> np.ndarray:
+    """
+    向量化計算 [start, end) 列的 AQI（欄位順序同 breakpoints），沒有可用子指標的列為 -1
+
+    與 _calc_sub_index 相同：取第一個 C_hi >= C 的區間，C 也必須 >= 該區間的 C_lo。
+    """
+    block = matrix[start:end]
+    aqi = np.full(len(block), -1.0)
+    for j, bps in enumerate(breakpoints.values()):
+        c_lo, c_hi, i_lo, i_hi = np.array(bps, dtype=np.float64).T
+        C = block[:, j]
+        seg = np.searchsorted(c_hi, C, side='left')  # NaN（缺少此污染物）會排在最後
+        inside = seg < len(c_hi)
+        seg = np.minimum(seg, len(c_hi) - 1)
+        inside &= C >= c_lo[seg]
+        sub = (i_hi[seg] - i_lo[seg]) / (c_hi[seg] - c_lo[seg]) * (C - c_lo[seg]) + i_lo[seg]
+        # np.rint 與內建 round 相同採用四捨六入五成雙
+        aqi = np.maximum(aqi, np.where(inside, np.rint(sub), -1.0))
+    return aqi.astype(np.int64)
+
+
+def _aqi_chunk(source, start: int, end: int, breakpoints: Dict[str, List[tuple]]) -> np.ndarray:
+    return apply_to_array(source, _aqi_values, start, end, breakpoints)
+
+
+def _hourly_chunk(items: List[Tuple[str, Union[HourlyForecast, List[Dict]]]],
+                  compact: bool = False) -> List[Tuple[str, pd.DataFrame]]:
+    return [(key, DataProcessor.process_hourly_forecast(data, compact=compact)) for key, data in items]
+
+
+def _coerce_hourly(data: Union[HourlyForecast, List[Dict]]) -> HourlyForecast:
+    try:
+        return HourlyForecast.coerce(data)
+    except KeyError as e:
+        raise Exception(f"處理每小時預報數據失敗: 缺少關鍵數據 {str(e)}")
+
+
+def _hourly_frame(forecast: HourlyForecast, compact: bool) -> pd.DataFrame:
+    epochs = forecast.column('dt')
+    descriptions, icons = forecast.labels()
+    if compact:
+        return _compact_frame({
+            'temperature': forecast.column('temp').round(1),
+            'feels_like': forecast.column('feels_like').round(1),
+            'humidity': forecast.column('humidity'),
+            'pressure': forecast.column('pressure'),
+            'wind_speed': forecast.column('wind_speed'),
+            'description': descriptions,
+            'icon': icons,
+            'pop': forecast.column('pop')
+        }, 'time', epochs)
+    return pd.DataFrame({
+        'time': [datetime.fromtimestamp(t) for t in epochs.tolist()],
+        'temperature': forecast.column('temp').round(1),
+        'feels_like': forecast.column('feels_like').round(1),
+        'humidity': forecast.column('humidity').astype(np.int64),
+        'pressure': forecast.column('pressure').astype(np.int64),
+        'wind_speed': forecast.column('wind_speed'),
+        'description': descriptions,
+        'icon': icons,
+        'pop': forecast.column('pop').astype(np.float64)
+    })
+
+
+def _location_index(keys: List[str], sizes: List[int]) -> pd.CategoricalIndex:
+    """每個地點重複其筆數次的 CategoricalIndex（類別依 keys 的順序）"""
+    codes = np.repeat(np.arange(len(keys)), sizes)
+    return pd.CategoricalIndex(pd.Categorical.from_codes(codes, categories=keys), name='location')
+
+
+def _compact_frame(columns: Dict[str, Any], time_col: str, epochs: np.ndarray) -> pd.DataFrame:
+    """以 COMPACT_DTYPES 建立 DataFrame，time_col 由 epoch 秒轉為 PROCESSOR_TIMEZONE 的時區感知時間"""
+    data = {time_col: pd.to_datetime(np.asarray(epochs, dtype=np.int64), unit='s', utc=True).tz_convert(PROCESSOR_TIMEZONE)}
+    for name, values in columns.items():
+        dtype = COMPACT_DTYPES.get(name)
+        if dtype == 'category':
+            data[name] = pd.Categorical(values)
+        else:
+            data[name] = values if dtype is None else np.asarray(values).astype(dtype, copy=False)
+    return pd.DataFrame(data, copy=False)
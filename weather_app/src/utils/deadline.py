@@ -0,0 +1,102 @@
+"""
+請求期限（延遲預算）
+
+呼叫端以 budget() 設定期限，期限經由 contextvars 傳遞到 WeatherAPI，不必逐層傳參數：
+- HTTP 請求的 timeout、等待速率限制配額與快取鍵鎖的時間都不超過剩餘預算
+- 剩餘預算不足時不再回源，改用快取中最後一份有效的數據（即使已過期），並記錄在 Budget.stale
+
+時間以 time.perf_counter() 計算，與頁面計時（src/app.py 的 _run_start）使用同一個時鐘。
+執行緒池的工作不會繼承呼叫端的 contextvars，需在工作內自行以 budget(deadline=...) 設定。
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional, Set
+
+from src.config.config import DEADLINE_MIN_REQUEST_SECONDS
+
+
+class DeadlineExceeded(Exception):
+    """剩餘預算不足以發出請求"""
+
+
+class Budget:
+    """
+    一段工作的期限
+
+    Args:
+        deadline: 期限（time.perf_counter() 的時間點）
+    """
+
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        # 因預算用完而改用過期快取的數據類別
+        self.stale: Set[str] = set()
+
+    def remaining(self) -> float:
+        return self.deadline - time.perf_counter()
+
+    @property
+    def exhausted(self) -> bool:
+        """剩餘時間是否已不足以發出請求"""
+        return self.remaining() < DEADLINE_MIN_REQUEST_SECONDS
+
+
+_current: ContextVar[Optional[Budget]] = ContextVar("request_budget", default=None)
+
+
+@contextmanager
+def budget(seconds: Optional[float] = None, deadline: Optional[float] = None) -> Iterator[Budget]:
+    """
+    在這個區塊內套用期限；外層已有期限時取較早的一個
+
+    Args:
+        seconds: 從現在起算的秒數
+        deadline: 絕對期限（time.perf_counter() 的時間點），與 seconds 擇一
+    """
+    target = deadline if deadline is not None else time.perf_counter() + (seconds or 0.0)
+    outer = _current.get()
+    if outer is not None:
+        target = min(target, outer.deadline)
+    current = Budget(target)
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+
+
+def current_budget() -> Optional[Budget]:
+    """目前生效的期限，沒有設定時為 None"""
+    return _current.get()
+
+
+def bounded(timeout: float) -> float:
+    """不超過剩餘預算的等待秒數（沒有設定期限時原樣返回）"""
+    current = _current.get()
+    if current is None:
+        return timeout
+    return max(0.0, min(timeout, current.remaining()))
+
+
+def request_timeout(timeout: float) -> float:
+    """
+    HTTP 請求的 timeout 秒數
+
+    Raises:
+        DeadlineExceeded: 剩餘預算少於 DEADLINE_MIN_REQUEST_SECONDS
+    """
+    current = _current.get()
+    if current is None:
+        return timeout
+    remaining = current.remaining()
+    if remaining < DEADLINE_MIN_REQUEST_SECONDS:
+        raise DeadlineExceeded(f"延遲預算已用完（剩餘 {max(0.0, remaining):.2f} 秒）")
+    return min(timeout, remaining)
+
+
+def mark_stale(namespace: str) -> None:
+    """記錄目前的工作以過期快取回應了某類數據"""
+    current = _current.get()
+    if current is not None:
+        current.stale.add(namespace)
@@ -0,0 +1,72 @@
+"""
+處理結果快取：將 DataProcessor 的輸出（DataFrame 或字典）存到磁碟，重啟後或其他伺服器行程也能沿用
+
+快取鍵為 (處理方法, 原始快取鍵)，檔頭記錄原始數據版本與處理器版本；兩者任一與請求不符即視為未命中，
+新的結果會覆寫同一個檔案，因此原始數據更新後舊的處理結果自動失效，不會累積。
+
+DataFrame 在安裝 pyarrow 時以 feather 儲存，否則與其他結果一樣以 pickle protocol 5 儲存。
+檔案只由本應用程式寫入本機的快取目錄，讀取時直接 unpickle。
+"""
+import time
+from typing import Any, Optional, Tuple
+
+import pandas as pd
+
+from src.config.config import DERIVED_CACHE_DIR, DERIVED_CACHE_TTL
+from src.utils import metrics
+from src.utils.cache_manager import CacheManager
+from src.utils.serializers import SERIALIZERS
+
+DERIVED_REQUESTS = metrics.counter("derived_cache_requests_total", "處理結果快取查詢結果", ["method", "result"])
+
+
+class DerivedCache:
+    """
+    以原始數據版本為失效條件的處理結果快取
+
+    Args:
+        processor_version: 處理邏輯的版本，變更後所有舊結果失效
+        cache_dir: 快取目錄，預設為設定中的 DERIVED_CACHE_DIR
+    """
+
+    def __init__(self, processor_version: int, cache_dir: Optional[str] = None):
+        self.processor_version = processor_version
+        self.store = CacheManager(cache_dir or DERIVED_CACHE_DIR)
+
+    def get(self, method: str, version: Tuple[str, str]) -> Optional[Any]:
+        """
+        讀取處理結果
+
+        Args:
+            method: 處理方法名稱
+            version: 原始數據版本 (原始快取鍵, 內容雜湊)
+        """
+        source, digest = version
+        entry = self.store.get_entry(f"{method}:{source}")
+        if entry is None:
+            DERIVED_REQUESTS.inc(method=method, result="miss")
+            return None
+        meta, data = entry
+        if meta.get("version") != digest or meta.get("processor_version") != self.processor_version:
+            DERIVED_REQUESTS.inc(method=method, result="outdated")
+            return None
+        DERIVED_REQUESTS.inc(method=method, result="hit")
+        return data
+
+    def set(self, method: str, version: Tuple[str, str], result: Any) -> None:
+        """寫入處理結果（覆寫同一原始快取鍵的舊結果）"""
+        source, digest = version
+        serializer = "feather" if isinstance(result, pd.DataFrame) and "feather" in SERIALIZERS else "pickle"
+        self.store.set(
+            f"{method}:{source}", result,
+            expires=time.time() + DERIVED_CACHE_TTL,
+            extra={"version": digest, "processor_version": self.processor_version},
+            serializer=serializer
+        )
+
+    def sweep(self) -> bool:
+        """增量清理過期的處理結果"""
+        return self.store.sweep()
+
+    def clear(self) -> None:
+        self.store.clear()
@@ -0,0 +1,193 @@
+"""
+CPU 密集批次工作與背景 I/O 工作的執行器
+
+- 資料量小於 PROCESS_POOL_MIN_ROWS 時直接在目前執行緒依序處理，避免行程間傳輸的成本
+- 資料量大時把工作切塊（依地點或時間範圍）交給行程池平行處理，再由呼叫端合併結果
+- 大型 NumPy 陣列以 SharedArray 放進共享記憶體，工作行程只收到名稱與形狀，不必 pickle 整個陣列
+
+行程池以 forkserver / spawn 啟動工作行程：Streamlit 伺服器本身是多執行緒的，直接 fork 可能複製到
+被其他執行緒持有的鎖。
+
+等待網路的工作（例如漸進式渲染的背景抓取）改用 get_thread_pool() 的執行緒池。
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from src.config.config import PROCESS_POOL_WORKERS, PROCESS_POOL_MIN_ROWS, BACKGROUND_FETCH_WORKERS
+from src.utils import metrics
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+EXECUTOR_TASKS = metrics.counter("executor_tasks_total", "批次工作切塊數", ["mode"])
+EXECUTOR_SECONDS = metrics.histogram("executor_duration_seconds", "批次工作總耗時", ["mode"])
+
+# 共享陣列的描述：(共享記憶體名稱, 形狀, dtype 字串)，可以低成本地 pickle 給工作行程
+ArrayHandle = Tuple[str, Tuple[int, ...], str]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_thread_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _start_method() -> str:
+    methods = multiprocessing.get_all_start_methods()
+    return "forkserver" if "forkserver" in methods else "spawn"
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """取得行程內共用的行程池（第一次使用時才啟動）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PROCESS_POOL_WORKERS,
+                mp_context=multiprocessing.get_context(_start_method())
+            )
+            logger.info("已啟動行程池（%d 個工作行程）", PROCESS_POOL_WORKERS)
+        return _pool
+
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    """取得行程內共用的執行緒池，供等待網路的背景工作使用"""
+    global _thread_pool
+    with _pool_lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(max_workers=BACKGROUND_FETCH_WORKERS, thread_name_prefix="fetch")
+        return _thread_pool
+
+
+def shutdown_pool() -> None:
+    """關閉行程池；之後再使用時會重新啟動"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class SharedArray:
+    """
+    放在共享記憶體中的 NumPy 陣列副本
+
+    由建立者負責釋放（建議以 with 使用）；工作行程以 apply_to_array(handle, ...) 取得零複製的檢視。
+
+    Args:
+        array: 要共享的陣列
+    """
+
+    def __init__(self, array: np.ndarray):
+        array = np.ascontiguousarray(array)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        self.array = np.ndarray(array.shape, dtype=array.dtype, buffer=self._shm.buf)
+        self.array[...] = array
+        self.handle: ArrayHandle = (self._shm.name, array.shape, array.dtype.str)
+
+    def close(self) -> None:
+        # 先釋放 NumPy 檢視，否則共享記憶體的緩衝區仍被引用而無法關閉
+        self.array = None
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self) -> "SharedArray":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def apply_to_array(source: Union[ArrayHandle, np.ndarray], func: Callable, *args) -> Any:
+    """
+    以 func(array, *args) 處理共享陣列；傳入一般陣列時直接處理（在目前行程處理的情況）
+
+    陣列是共享記憶體的零複製檢視，只在 func 執行期間有效，返回值不可引用它（需要時先複製）。
+    """
+    if isinstance(source, np.ndarray):
+        return func(source, *args)
+    name, shape, dtype = source
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return func(np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf), *args)
+    finally:
+        shm.close()
+
+
+@contextmanager
+def shared_source(array: np.ndarray, rows: int) -> Iterator[Union[ArrayHandle, np.ndarray]]:
+    """會交給行程池時把陣列放進共享記憶體並提供 handle，否則直接提供陣列本身"""
+    if not use_pool(rows):
+        yield array
+        return
+    with SharedArray(array) as shared:
+        yield shared.handle
+
+
+def chunk_bounds(sizes: Sequence[int], chunks: int) -> List[Tuple[int, int]]:
+    """
+    把依序排列的項目（例如各地點的紀錄數）切成約略等量的連續區段
+
+    Returns:
+        List[Tuple[int, int]]: 每塊的 [起, 迄) 項目索引
+    """
+    total = sum(sizes)
+    if not sizes:
+        return []
+    target = max(1, -(-total // max(1, chunks)))
+    bounds, start, acc = [], 0, 0
+    for i, size in enumerate(sizes):
+        acc += size
+        if acc >= target:
+            bounds.append((start, i + 1))
+            start, acc = i + 1, 0
+    if start < len(sizes):
+        bounds.append((start, len(sizes)))
+    return bounds
+
+
+def use_pool(rows: int) -> bool:
+    """資料量是否值得交給行程池"""
+    return PROCESS_POOL_WORKERS > 1 and rows >= PROCESS_POOL_MIN_ROWS
+
+
+def run_chunks(func: Callable, tasks: Sequence[tuple], rows: int) -> List[Any]:
+    """
+    以 func(*task) 處理每一塊工作，結果依 tasks 的順序返回
+
+    func 必須是模組層級的函式（工作行程以名稱匯入）。行程池損壞（例如工作行程被系統終止）時
+    會重建行程池，並改在目前行程處理這一批。
+
+    Args:
+        func: 處理單一塊的函式
+        tasks: 每一塊的參數
+        rows: 這批工作的總資料筆數，用來決定是否交給行程池
+    """
+    start = time.perf_counter()
+    mode = "pool" if use_pool(rows) and len(tasks) > 1 else "inline"
+    results = None
+    if mode == "pool":
+        try:
+            pool = get_pool()
+            futures = [pool.submit(func, *task) for task in tasks]
+            results = [future.result() for future in futures]
+        except BrokenProcessPool as e:
+            logger.error("行程池已損壞，改在目前行程處理: %s", e)
+            shutdown_pool()
+            mode = "inline"
+    if results is None:
+        results = [func(*task) for task in tasks]
+    EXECUTOR_TASKS.inc(len(tasks), mode=mode)
+    EXECUTOR_SECONDS.observe(time.perf_counter() - start, mode=mode)
+    return results
+
+
+def split_count() -> int:
+    """行程池處理時的切塊數：比工作行程多幾倍，讓先做完的行程能接手剩下的塊"""
+    return max(1, PROCESS_POOL_WORKERS * 4)
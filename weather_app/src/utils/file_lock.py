@@ -0,0 +1,117 @@
+"""
+跨行程檔案鎖：以作業系統的 advisory lock（POSIX flock / Windows msvcrt.locking）
+讓多個 Streamlit 伺服器行程與同一行程內的多個執行緒互斥
+"""
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class LockTimeout(Exception):
+    """等待檔案鎖逾時"""
+
+
+def _try_lock(fd: int) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class StripedFileLock:
+    """
+    依鍵名雜湊到固定數量的鎖檔，避免每個快取鍵各建立一個鎖檔
+
+    同一執行緒可重入（重複取得同一分段的鎖不會自我死結）；不同鍵落在同一分段時會互相等待，
+    分段數足夠大時影響可忽略。
+
+    Args:
+        lock_dir: 鎖檔目錄
+        stripes: 鎖檔數量
+    """
+
+    def __init__(self, lock_dir: str, stripes: int = 256):
+        self.lock_dir = lock_dir
+        self.stripes = stripes
+        self._local = threading.local()
+        os.makedirs(lock_dir, exist_ok=True)
+
+    def _stripe(self, key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=4).digest(), "big") % self.stripes
+
+    def _held(self) -> Dict[int, list]:
+        if not hasattr(self._local, "held"):
+            self._local.held = {}
+        return self._local.held
+
+    def acquire(self, key: str, timeout: float = 30.0) -> bool:
+        """取得鍵的獨佔鎖，超過 timeout 秒仍無法取得時返回 False"""
+        stripe = self._stripe(key)
+        held = self._held()
+        if stripe in held:
+            held[stripe][1] += 1
+            return True
+
+        path = os.path.join(self.lock_dir, f"{stripe:03d}.lock")
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + timeout
+        delay = 0.001
+        while not _try_lock(fd):
+            if time.monotonic() >= deadline:
+                os.close(fd)
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        held[stripe] = [fd, 1]
+        return True
+
+    def release(self, key: str) -> None:
+        stripe = self._stripe(key)
+        held = self._held()
+        entry = held.get(stripe)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] == 0:
+            del held[stripe]
+            try:
+                _unlock(entry[0])
+            finally:
+                os.close(entry[0])
+
+    @contextmanager
+    def lock(self, key: str, timeout: float = 30.0):
+        """
+        取得鍵的獨佔鎖
+
+        Raises:
+            LockTimeout: 超過 timeout 秒仍無法取得鎖
+        """
+        if not self.acquire(key, timeout):
+            raise LockTimeout(f"等待鎖逾時: {key}")
+        try:
+            yield
+        finally:
+            self.release(key)
@@ -0,0 +1,223 @@
+"""
+3 小時預報（HourlyForecast 或 forecast 端點的 list）的重新取樣
+
+- daily_from_hourly：聚合出每日預報。目前 API 方案不支援 forecast/daily 時使用；輸出格式與 forecast/daily 的
+  list 項目相同，可直接交給 DataProcessor.process_daily_forecast。日期以伺服器本地時間劃分，
+  與 process_daily_forecast 使用的 datetime.fromtimestamp 一致。
+- upsample：內插為較密的時間間隔（例如每小時）。多個地點串接成一個 HourlyForecast 後一次以 NumPy 向量運算處理，
+  不逐地點、逐筆迴圈；各欄位依性質採用不同的內插方式（見 INTERPOLATION）。
+"""
+import time
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.utils.compact_forecast import HourlyForecast
+
+DAY_SECONDS = 86400
+NOON_SECONDS = 43200
+
+# 各欄位的內插方式：
+# - pchip：保形三次 Hermite（Fritsch–Carlson），曲線平滑且不會在兩個預報點之間超出它們的範圍
+# - linear：線性
+# - circular：角度沿最短弧線性內插（350° 到 10° 經過 0°，而不是 180°）
+# - step：沿用前一個預報點的值（天氣描述與圖示）
+INTERPOLATION = {
+    "temp": "pchip",
+    "feels_like": "pchip",
+    "temp_min": "pchip",
+    "temp_max": "pchip",
+    "humidity": "linear",
+    "pressure": "linear",
+    "wind_speed": "linear",
+    "pop": "linear",
+    "wind_deg": "circular",
+    "code": "step"
+}
+
+
+def daily_from_hourly(data: Union[HourlyForecast, List[Dict]]) -> List[Dict]:
+    """
+    把 3 小時預報聚合為每日預報
+
+    溫度取當日平均 / 最低 / 最高，濕度與氣壓取平均，風速與降水機率取最大值，
+    天氣描述與圖示取最接近當地正午的一筆。第一天與最後一天可能只涵蓋部分時段。
+    """
+    forecast = HourlyForecast.coerce(data)
+    if not len(forecast):
+        return []
+
+    dt = forecast.column("dt").astype(np.int64)
+    offsets = np.array([time.localtime(t).tm_gmtoff for t in dt.tolist()], dtype=np.int64)
+    local = dt + offsets
+    descriptions, icons = forecast.labels()
+    frame = pd.DataFrame({
+        "day": local // DAY_SECONDS,
+        "noon_distance": np.abs(local % DAY_SECONDS - NOON_SECONDS),
+        "offset": offsets,
+        "temp": forecast.column("temp"),
+        "temp_min": forecast.column("temp_min"),
+        "temp_max": forecast.column("temp_max"),
+        "humidity": forecast.column("humidity"),
+        "pressure": forecast.column("pressure"),
+        "speed": forecast.column("wind_speed"),
+        "pop": forecast.column("pop") / 100,
+        "description": descriptions,
+        "icon": icons
+    })
+
+    grouped = frame.groupby("day", sort=True)
+    daily = grouped.agg(
+        temp_day=("temp", "mean"),
+        temp_min=("temp_min", "min"),
+        temp_max=("temp_max", "max"),
+        humidity=("humidity", "mean"),
+        pressure=("pressure", "mean"),
+        speed=("speed", "max"),
+        pop=("pop", "max")
+    )
+    noon = frame.loc[grouped["noon_distance"].idxmin(), ["day", "offset", "description", "icon"]].set_index("day")
+    daily = daily.join(noon)
+    # 與 forecast/daily 相同，以當地正午的時間戳代表當天
+    daily["dt"] = daily.index.to_numpy() * DAY_SECONDS + NOON_SECONDS - daily["offset"].to_numpy()
+
+    return [
+        {
+            "dt": int(row.dt),
+            "temp": {"day": round(float(row.temp_day), 2), "min": float(row.temp_min), "max": float(row.temp_max)},
+            "humidity": int(round(row.humidity)),
+            "pressure": int(round(row.pressure)),
+            "speed": float(row.speed),
+            "pop": float(row.pop),
+            "weather": [{"description": row.description, "icon": row.icon}]
+        }
+        for row in daily.itertuples()
+    ]
+
+
+def _pchip_slopes(x: np.ndarray, y: np.ndarray, first: np.ndarray, last: np.ndarray) -> np.ndarray:
+    """
+    各點的 PCHIP 斜率（與 scipy.interpolate.PchipInterpolator 相同的規則）
+
+    x、y 為多個地點串接的數據；first / last 標記每個地點的第一點與最後一點，區間不跨越地點。
+    """
+    n = len(x)
+    h = np.diff(x)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta = np.diff(y) / h
+    # 每點左右兩側的區間（地點邊界外為 NaN）
+    h_left = np.full(n, np.nan)
+    h_right = np.full(n, np.nan)
+    d_left = np.full(n, np.nan)
+    d_right = np.full(n, np.nan)
+    h_left[1:], d_left[1:] = h, delta
+    h_right[:-1], d_right[:-1] = h, delta
+    h_left[first], d_left[first] = np.nan, np.nan
+    h_right[last], d_right[last] = np.nan, np.nan
+
+    slopes = np.zeros(n)
+    # 內部點：兩側斜率同號時取加權調和平均，否則為 0（局部極值處保持平坦）
+    interior = ~(first | last)
+    w1 = 2 * h_right + h_left
+    w2 = h_right + 2 * h_left
+    with np.errstate(divide="ignore", invalid="ignore"):
+        harmonic = (w1 + w2) / (w1 / d_left + w2 / d_right)
+    same_sign = np.sign(d_left) * np.sign(d_right) > 0
+    slopes[interior & same_sign] = harmonic[interior & same_sign]
+
+    # 端點：以相鄰兩個區間的三點公式估計，並限制形狀（不反向、不超過 3 倍區間斜率）
+    def endpoint(index: np.ndarray, h0: np.ndarray, h1: np.ndarray, d0: np.ndarray, d1: np.ndarray) -> None:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            m = ((2 * h0 + h1) * d0 - h0 * d1) / (h0 + h1)
+        # 只有一個區間的地點：端點斜率就是區間斜率
+        m = np.where(np.isnan(h1), d0, m)
+        m = np.where(np.sign(m) != np.sign(d0), 0.0, m)
+        clamp = (np.sign(d0) != np.sign(d1)) & (np.abs(m) > np.abs(3 * d0)) & ~np.isnan(h1)
+        m = np.where(clamp, 3 * d0, m)
+        slopes[index] = np.nan_to_num(m)
+
+    starts = np.flatnonzero(first & ~last)
+    next_right = np.minimum(starts + 1, n - 1)
+    endpoint(starts, h_right[starts], h_right[next_right], d_right[starts], d_right[next_right])
+    ends = np.flatnonzero(last & ~first)
+    prev_left = np.maximum(ends - 1, 0)
+    endpoint(ends, h_left[ends], h_left[prev_left], d_left[ends], d_left[prev_left])
+    return slopes
+
+
+def upsample(forecast: HourlyForecast, sizes: Optional[Sequence[int]] = None, step: int = 3600,
+             horizon: Optional[int] = None) -> Tuple[HourlyForecast, List[int]]:
+    """
+    把 3 小時預報內插為每 step 秒一筆
+
+    每個地點從第一個預報時間開始，到最後一個預報時間為止（或 horizon 秒內）；落在原本預報時間上的點
+    與原始數據相同。所有地點在同一組向量運算中完成。
+
+    Args:
+        forecast: 一個或多個地點依序串接的預報（見 HourlyForecast.concat），各地點內的時間需遞增
+        sizes: 各地點的筆數，None 表示只有一個地點
+        step: 輸出的時間間隔（秒）
+        horizon: 每個地點最多輸出自第一筆起多少秒內的數據
+
+    Returns:
+        (內插後串接的預報, 各地點的輸出筆數)
+    """
+    if step <= 0:
+        raise ValueError("step 必須大於 0")
+    records = forecast.records
+    sizes = np.asarray([len(records)] if sizes is None else sizes, dtype=np.int64)
+    if sizes.sum() != len(records):
+        raise ValueError("sizes 的總和與預報筆數不符")
+    nonempty = sizes > 0
+    ends = np.cumsum(sizes)
+    starts = ends - sizes
+    x = records["dt"].astype(np.int64)
+
+    # 每個地點的輸出筆數與目標時間
+    spans = np.zeros(len(sizes), dtype=np.int64)
+    spans[nonempty] = x[ends[nonempty] - 1] - x[starts[nonempty]]
+    counts = np.where(nonempty, spans // step + 1, 0)
+    if horizon is not None:
+        counts = np.minimum(counts, max(0, -(-horizon // step)))
+    location = np.repeat(np.arange(len(sizes)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    target = x[starts[location]] + offsets * step
+
+    # 以 (地點, 時間) 的組合鍵一次找出所有目標時間所在的區間 [seg, nxt]
+    source_location = np.repeat(np.arange(len(sizes)), sizes)
+    source_key = (source_location << 32) | x
+    seg = np.searchsorted(source_key, (location << 32) | target, side="right") - 1
+    seg = np.clip(seg, starts[location], np.maximum(starts[location], ends[location] - 2))
+    nxt = np.minimum(seg + 1, ends[location] - 1)
+    width = (x[nxt] - x[seg]).astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = np.where(width > 0, (target - x[seg]) / width, 0.0)
+
+    first = np.zeros(len(records), dtype=bool)
+    last = np.zeros(len(records), dtype=bool)
+    first[starts[nonempty]] = True
+    last[ends[nonempty] - 1] = True
+
+    out = np.empty(len(target), dtype=records.dtype)
+    out["dt"] = target
+    for name, method in INTERPOLATION.items():
+        values = records[name]
+        if method == "step":
+            out[name] = np.where(s >= 1, values[nxt], values[seg])
+            continue
+        y = values.astype(np.float64)
+        y0, y1 = y[seg], y[nxt]
+        if method == "linear":
+            result = y0 + s * (y1 - y0)
+        elif method == "circular":
+            turn = (y1 - y0 + 180) % 360 - 180
+            result = np.round(y0 + s * turn) % 360
+        else:
+            slopes = _pchip_slopes(x.astype(np.float64), y, first, last)
+            s2, s3 = s * s, s * s * s
+            result = ((2 * s3 - 3 * s2 + 1) * y0 + (s3 - 2 * s2 + s) * width * slopes[seg]
+                      + (-2 * s3 + 3 * s2) * y1 + (s3 - s2) * width * slopes[nxt])
+        info = np.iinfo(records.dtype[name])
+        out[name] = np.clip(np.round(result), info.min, info.max)
+    return HourlyForecast(out), counts.tolist()
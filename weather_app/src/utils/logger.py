@@ -1,57 +1,194 @@
 """
 日誌處理模組：提供應用程式的日誌記錄功能
+
+所有日誌記錄器共用一個背景 QueueListener：呼叫端只負責把記錄放進佇列，
+格式化與寫檔都在背景執行緒完成，不會阻塞 API 熱路徑。
 """
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+from collections import defaultdict
 from datetime import datetime
+from typing import Any, Optional
+
+from src.config.config import (
+    LOG_LEVEL, LOG_FORMAT, LOG_PAYLOAD_MAX_CHARS, LOG_SAMPLE_EVERY
+)
+
+# 會被輸出為結構化欄位的額外屬性（透過 logger 的 extra 參數傳入）
+STRUCTURED_FIELDS = ('endpoint', 'latency_ms', 'status', 'cache_hit', 'bytes')
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_listener_lock = threading.Lock()
+
+
+class LazyPayload:
+    """延遲序列化的日誌參數，只有在日誌真正輸出時才轉為（截斷後的）字串"""
+
+    __slots__ = ('payload', 'limit')
+
+    def __init__(self, payload: Any, limit: int = LOG_PAYLOAD_MAX_CHARS):
+        self.payload = payload
+        self.limit = limit
+
+    def __str__(self) -> str:
+        if isinstance(self.payload, (bytes, str)):
+            text = self.payload if isinstance(self.payload, str) else self.payload.decode('utf-8', 'replace')
+        else:
+            try:
+                text = json.dumps(self.payload, ensure_ascii=False, default=str)
+            except (TypeError, ValueError):
+                text = repr(self.payload)
+        if self.limit and len(text) > self.limit:
+            return f"{text[:self.limit]}...（已截斷，共 {len(text)} 字元）"
+        return text
+
+
+def truncate_payload(payload: Any, limit: int = LOG_PAYLOAD_MAX_CHARS) -> LazyPayload:
+    """包裝大型回應內容，供 logger 的 %s 參數延遲格式化"""
+    return LazyPayload(payload, limit)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    依訊息樣板取樣：同一個樣板每 N 則只保留 1 則
+
+    WARNING 以上的記錄一律保留。可透過 extra={'sample_every': N} 針對單一訊息覆寫取樣率。
+    """
+
+    def __init__(self, default_every: int = 1):
+        super().__init__()
+        self.default_every = max(1, default_every)
+        self._counters = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        every = getattr(record, 'sample_every', None) or self.default_every
+        if every <= 1:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            count = self._counters[key]
+            self._counters[key] = count + 1
+        return count % every == 0
+
+
+class StructuredTextFormatter(logging.Formatter):
+    """文字格式，並在訊息後附加結構化欄位"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = _structured_fields(record)
+        if fields:
+            text += ' | ' + ' '.join(f"{k}={v}" for k, v in fields.items())
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """每行輸出一個 JSON 物件，方便日誌系統解析"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            **_structured_fields(record)
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    不在呼叫端格式化訊息的 QueueHandler
+
+    預設的 QueueHandler.prepare 會在呼叫端執行緒呼叫 format()；佇列僅在行程內使用，
+    因此直接傳遞記錄，把字串化（包括 LazyPayload）留給背景執行緒。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return copy.copy(record)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # 第一次真正輸出日誌時才建立日誌檔與背景執行緒，匯入模組（建立 logger）不觸及檔案系統
+        if _listener is None:
+            _start_listener()
+        super().emit(record)
+
+
+def _structured_fields(record: logging.LogRecord) -> dict:
+    return {k: getattr(record, k) for k in STRUCTURED_FIELDS if hasattr(record, k)}
+
+
+def _start_listener() -> None:
+    """建立共用的檔案/控制台處理器並啟動背景監聽執行緒（每個行程一次）"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            return
+
+        # 創建日誌目錄
+        log_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "logs")
+        os.makedirs(log_dir, exist_ok=True)
+
+        # 設置日誌文件名（按日期）
+        log_file = os.path.join(log_dir, f"{datetime.now().strftime('%Y-%m-%d')}.log")
+
+        # 設置日誌格式
+        if LOG_FORMAT == "json":
+            formatter = JsonFormatter(datefmt='%Y-%m-%d %H:%M:%S')
+        else:
+            formatter = StructuredTextFormatter(
+                '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                datefmt='%Y-%m-%d %H:%M:%S'
+            )
+
+        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        console_handler = logging.StreamHandler()
+        for handler in (file_handler, console_handler):
+            handler.setFormatter(formatter)
+
+        _listener = logging.handlers.QueueListener(
+            _log_queue, file_handler, console_handler, respect_handler_level=True
+        )
+        _listener.start()
+        atexit.register(_listener.stop)
+
 
 def setup_logger(name: str) -> logging.Logger:
     """
     設置並返回一個日誌記錄器實例
-    
+
     Args:
         name: 日誌記錄器名稱（通常是 __name__）
-        
+
     Returns:
         logging.Logger: 配置好的日誌記錄器實例
     """
     # 創建日誌記錄器
     logger = logging.getLogger(name)
-    
+
     # 如果日誌記錄器已經有處理器，直接返回
     if logger.handlers:
         return logger
-        
+
     # 設置日誌級別
-    logger.setLevel(logging.INFO)
-    
-    # 創建日誌目錄
-    log_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "logs")
-    os.makedirs(log_dir, exist_ok=True)
-    
-    # 設置日誌文件名（按日期）
-    log_file = os.path.join(log_dir, f"{datetime.now().strftime('%Y-%m-%d')}.log")
-    
-    # 創建文件處理器
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
-    file_handler.setLevel(logging.INFO)
-    
-    # 創建控制台處理器
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    
-    # 設置日誌格式
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    
-    # 將格式器添加到處理器
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
-    
-    # 將處理器添加到日誌記錄器
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
-    return logger 
\ No newline at end of file
+    logger.setLevel(getattr(logging, LOG_LEVEL.upper(), logging.INFO))
+    logger.propagate = False
+
+    # 記錄器只把記錄放入佇列；取樣在入列前完成，被丟棄的記錄不會進入佇列
+    queue_handler = _DeferredQueueHandler(_log_queue)
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_EVERY))
+    logger.addHandler(queue_handler)
+
+    return logger
@@ -0,0 +1,344 @@
+"""
+效能指標模組：記錄計數器與延遲直方圖，並以 Prometheus 文字格式匯出
+
+用法與 prometheus_client 類似，但不需要額外相依套件：
+
+    REQUESTS = counter("weather_api_requests_total", "API 請求數", ["endpoint", "status"])
+    REQUESTS.inc(endpoint="forecast", status=200)
+
+    with histogram("ui_section_render_seconds", "區塊渲染時間", ["section"]).time(section="map"):
+        ...
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.config.config import METRICS_ENABLED, METRICS_PORT, METRICS_EXPORT_PATH, METRICS_EXPORT_INTERVAL
+
+# 預設延遲分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labelnames: Sequence[str], labels: Dict[str, object]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [
+        '{}="{}"'.format(name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(labelnames, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """所有指標類型的共同基底：名稱、說明、標籤與執行緒鎖"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+    def snapshot(self) -> List[Dict]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增不減的計數器"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value:g}" for key, value in items]
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            items = list(self._values.items())
+        return [{"metric": self.name, "labels": dict(zip(self.labelnames, key)), "value": value}
+                for key, value in items]
+
+
+class Gauge(Counter):
+    """可任意設定的量測值（例如目前狀態、佇列長度）"""
+
+    type_name = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    """累積分桶直方圖，用於延遲與大小分佈"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每組標籤：[各分桶計數..., +Inf 計數], 總和
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """計時區塊並記錄耗時（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _quantile(self, counts: List[int], q: float) -> Optional[float]:
+        """由分桶估計分位數（取所在分桶上界）"""
+        total = sum(counts)
+        if not total:
+            return None
+        target = q * total
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            if running >= target:
+                return bound
+        return None
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._series.items()]
+        for key, counts, total in items:
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                running += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {running}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {running}")
+        return lines
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._series.items()]
+        rows = []
+        for key, counts, total in items:
+            count = sum(counts)
+            rows.append({
+                "metric": self.name,
+                "labels": dict(zip(self.labelnames, key)),
+                "count": count,
+                "sum": total,
+                "avg": total / count if count else None,
+                "p50": self._quantile(counts, 0.5),
+                "p95": self._quantile(counts, 0.95)
+            })
+        return rows
+
+
+class MetricsRegistry:
+    """指標登錄表；同名指標只會建立一次，重複註冊會返回既有實例"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, cls, name: str, documentation: str, labelnames: Iterable[str] = (), **kwargs) -> _Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指標 {name} 已註冊為 {metric.type_name}")
+            return metric
+
+    def metrics(self) -> List[_Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render_prometheus(self) -> str:
+        """輸出 Prometheus 文字格式（text/plain; version=0.0.4）"""
+        lines = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> List[Dict]:
+        """所有指標目前數值的列表，供除錯面板顯示"""
+        rows = []
+        for metric in self.metrics():
+            rows.extend(metric.snapshot())
+        return rows
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    return REGISTRY.register(Counter, name, documentation, labelnames)
+
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge, name, documentation, labelnames)
+
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+# 數據處理指標
+PROCESSOR_SECONDS = histogram("processor_duration_seconds", "DataProcessor 方法耗時", ["method"])
+PROCESSOR_ROWS = counter("processor_rows_total", "DataProcessor 處理的資料筆數", ["method"])
+PROCESSOR_MEMO = counter("processor_memo_total", "依數據版本記憶的處理結果查詢", ["method", "result"])
+
+# UI 指標
+UI_SECTION_SECONDS = histogram("ui_section_render_seconds", "頁面各區塊渲染耗時", ["section"])
+UI_SECTION_READY_SECONDS = histogram("ui_section_ready_seconds", "漸進式渲染：頁面開始到各區塊數據可顯示的時間", ["section"])
+UI_SECTION_TIMEOUTS = counter("ui_section_timeouts_total", "漸進式渲染：等待數據逾時的區塊數", ["section"])
+UI_SECTION_DECISIONS = counter("ui_section_decisions_total",
+                               "各區塊最後採用的數據：fresh（快取或即時取得）、stale（預算用完改用過期快取）、timeout、error",
+                               ["section", "decision"])
+UI_FIRST_CONTENT_SECONDS = histogram("ui_first_content_seconds", "頁面開始到第一個區塊顯示數據的時間", ["mode"])
+APP_RUN_SECONDS = histogram("app_script_run_seconds",
+                            "整頁腳本執行耗時（cold 為行程啟動後第一次執行，包含模組匯入與共用物件建立）", ["phase"])
+
+_app_cold = True
+_app_cold_lock = threading.Lock()
+
+
+def record_app_run(seconds: float) -> str:
+    """記錄一次整頁腳本執行耗時，返回 cold 或 warm"""
+    global _app_cold
+    with _app_cold_lock:
+        phase = "cold" if _app_cold else "warm"
+        _app_cold = False
+    APP_RUN_SECONDS.observe(seconds, phase=phase)
+    return phase
+
+
+def track_processing(method: str) -> Callable:
+    """裝飾器：記錄 DataProcessor 方法的耗時與處理筆數"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            PROCESSOR_SECONDS.observe(time.perf_counter() - start, method=method)
+            if hasattr(result, "shape"):
+                rows = len(result)
+            else:
+                rows = next((len(arg) for arg in args if isinstance(arg, list)), 1)
+            PROCESSOR_ROWS.inc(rows, method=method)
+            return result
+        return wrapper
+    return decorator
+
+
+def write_metrics_file(path: str = METRICS_EXPORT_PATH) -> None:
+    """將目前指標寫入文字檔（先寫暫存檔再改名，避免讀到一半的內容）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.render_prometheus())
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def start_exporters(port: int = METRICS_PORT, path: str = METRICS_EXPORT_PATH,
+                    interval: float = METRICS_EXPORT_INTERVAL) -> None:
+    """
+    啟動指標匯出（每個行程只會啟動一次）
+
+    Args:
+        port: 大於 0 時在該埠提供 /metrics HTTP 端點
+        path: 非空時每隔 interval 秒將指標寫入該檔案
+        interval: 檔案匯出間隔（秒）
+    """
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started or not METRICS_ENABLED:
+            return
+        _exporters_started = True
+
+    if port:
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+        except OSError:
+            # 同一台機器上的其他行程已佔用該埠
+            server = None
+        if server is not None:
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+
+    if path:
+        def _export_loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    write_metrics_file(path)
+                except OSError:
+                    pass
+        threading.Thread(target=_export_loop, name="metrics-file", daemon=True).start()
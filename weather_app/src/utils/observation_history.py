@@ -0,0 +1,255 @@
+"""
+觀測歷史：每個地點一個固定大小的環形緩衝區，記錄每次從上游取得的當前天氣
+
+當前天氣的快取過期後數據就被丟棄，免費方案也沒有歷史觀測 API；這裡把每筆新的觀測
+（溫度、濕度、氣壓、風速、風向、AQI）附加到該地點的環形緩衝區，供「近 24 小時」的趨勢圖使用。
+
+- 每個地點一個檔案，以 np.memmap 對應：32 位元組的檔頭 + 2 × HISTORY_CAPACITY 筆紀錄，
+  檔案大小固定，與執行時間無關；行程內最多同時開啟 HISTORY_OPEN_FILES 個地點（LRU）
+- 鏡像環形緩衝區：每筆紀錄同時寫在位置 i 與 i + capacity，任何時候最近 n 筆都是連續的一段，
+  view() 直接返回 memmap 的切片（零複製），不必像一般環形緩衝區那樣把頭尾兩段接起來
+- 附加是 O(1)：寫兩筆紀錄、更新檔頭；同一觀測時間（dt）的重複回應（或較舊的觀測）不再附加
+- 檔案以 MAP_SHARED 對應，多個伺服器行程共用同一份歷史；寫入以檔案鎖互斥
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.config.config import HISTORY_DIR, HISTORY_CAPACITY, HISTORY_OPEN_FILES
+from src.utils import metrics
+from src.utils.file_lock import StripedFileLock
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+HISTORY_APPENDS = metrics.counter("observation_history_appends_total", "觀測歷史的附加次數", ["result"])
+
+OBSERVATION_DTYPE = np.dtype([
+    ("dt", "<u4"),
+    ("temp", "<f4"),
+    ("humidity", "<f4"),
+    ("pressure", "<f4"),
+    ("wind_speed", "<f4"),
+    ("wind_deg", "<f4"),
+    ("aqi", "<f4")
+])
+
+# 檔頭：容量、下一筆的位置、目前筆數、最近一次的 AQI（之後的觀測沿用，直到空氣品質再次更新）
+_HEADER_DTYPE = np.dtype([
+    ("magic", "S4"),
+    ("version", "<u4"),
+    ("capacity", "<u4"),
+    ("next", "<u4"),
+    ("count", "<u4"),
+    ("aqi", "<f4"),
+    ("reserved", "<u4", (2,))
+])
+_MAGIC = b"OBSH"
+_VERSION = 1
+
+
+def _file_size(capacity: int) -> int:
+    return _HEADER_DTYPE.itemsize + 2 * capacity * OBSERVATION_DTYPE.itemsize
+
+
+class _Ring:
+    """一個地點的鏡像環形緩衝區（檔頭與紀錄都是同一個檔案的 memmap）"""
+
+    def __init__(self, path: str, capacity: int):
+        self.path = path
+        if not os.path.exists(path) or os.path.getsize(path) != _file_size(capacity):
+            self._create(capacity)
+        self.header = np.memmap(path, dtype=_HEADER_DTYPE, mode="r+", shape=(1,))[0]
+        self.records = np.memmap(path, dtype=OBSERVATION_DTYPE, mode="r+", offset=_HEADER_DTYPE.itemsize,
+                                 shape=(2 * capacity,))
+        self.capacity = capacity
+
+    def _create(self, capacity: int) -> None:
+        """建立新檔；容量設定改變時保留舊檔最近的紀錄"""
+        previous = None
+        if os.path.exists(self.path):
+            try:
+                old = _Ring._open_existing(self.path)
+                if old is not None:
+                    previous = (np.array(old.view()), float(old.header["aqi"]))
+                # 先釋放舊檔的 memmap 再取代檔案
+                old = None
+            except (OSError, ValueError):
+                previous = None
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        header = np.zeros(1, dtype=_HEADER_DTYPE)
+        header[0]["magic"], header[0]["version"], header[0]["capacity"] = _MAGIC, _VERSION, capacity
+        header[0]["aqi"] = np.nan
+        records = np.zeros(2 * capacity, dtype=OBSERVATION_DTYPE)
+        if previous is not None:
+            kept, aqi = previous[0][-capacity:], previous[1]
+            records[:len(kept)] = kept
+            records[capacity:capacity + len(kept)] = kept
+            header[0]["next"], header[0]["count"], header[0]["aqi"] = len(kept) % capacity, len(kept), aqi
+        with open(tmp, "wb") as f:
+            f.write(header.tobytes())
+            f.write(records.tobytes())
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def _open_existing(path: str) -> Optional["_Ring"]:
+        header = np.fromfile(path, dtype=_HEADER_DTYPE, count=1)
+        if len(header) != 1 or header[0]["magic"] != _MAGIC:
+            return None
+        capacity = int(header[0]["capacity"])
+        if os.path.getsize(path) != _file_size(capacity):
+            return None
+        return _Ring(path, capacity)
+
+    def append(self, row: tuple) -> bool:
+        """附加一筆紀錄；觀測時間不晚於最近一筆時不附加（維持時間順序），返回是否已附加"""
+        header = self.header
+        count, position = int(header["count"]), int(header["next"])
+        if count and self.records[(position - 1) % self.capacity]["dt"] >= row[0]:
+            return False
+        # 先寫紀錄（兩個鏡像位置）再更新檔頭，同時讀取的一方最多看到舊的一段
+        self.records[position] = row
+        self.records[position + self.capacity] = row
+        header["next"] = (position + 1) % self.capacity
+        header["count"] = min(count + 1, self.capacity)
+        return True
+
+    def view(self) -> np.ndarray:
+        """依時間先後排列的所有紀錄（memmap 的連續切片，零複製）"""
+        count, position = int(self.header["count"]), int(self.header["next"])
+        # 最近 count 筆結束於 position（不含）；position 不足 count 時改用鏡像的後半段
+        end = position if position >= count else position + self.capacity
+        return self.records[end - count:end]
+
+    def set_aqi(self, aqi: float) -> None:
+        """記錄最新的 AQI，並補到最近一筆觀測上"""
+        self.header["aqi"] = aqi
+        count, position = int(self.header["count"]), int(self.header["next"])
+        if count:
+            last = (position - 1) % self.capacity
+            self.records["aqi"][last] = aqi
+            self.records["aqi"][last + self.capacity] = aqi
+
+
+class ObservationHistory:
+    """
+    Args:
+        directory: 歷史檔目錄
+        capacity: 每個地點保留的筆數
+        max_open: 行程內同時開啟（memmap）的地點數上限
+    """
+
+    def __init__(self, directory: str = HISTORY_DIR, capacity: int = HISTORY_CAPACITY,
+                 max_open: int = HISTORY_OPEN_FILES):
+        self.directory = directory
+        self.capacity = max(1, capacity)
+        self.max_open = max(1, max_open)
+        os.makedirs(directory, exist_ok=True)
+        self._lock = StripedFileLock(os.path.join(directory, ".locks"), stripes=16)
+        self._rings: "OrderedDict[str, _Ring]" = OrderedDict()
+        self._rings_lock = threading.Lock()
+
+    @staticmethod
+    def _key(lat: float, lon: float) -> str:
+        return re.sub(r"[^\w.-]", "_", f"{lat}_{lon}")
+
+    def _ring(self, key: str, create: bool) -> Optional[_Ring]:
+        with self._rings_lock:
+            ring = self._rings.get(key)
+            if ring is not None:
+                self._rings.move_to_end(key)
+                return ring
+        path = os.path.join(self.directory, f"{key}.obs")
+        if not create and not os.path.exists(path):
+            return None
+        with self._lock.lock(key):
+            ring = _Ring(path, self.capacity)
+        with self._rings_lock:
+            ring = self._rings.setdefault(key, ring)
+            self._rings.move_to_end(key)
+            while len(self._rings) > self.max_open:
+                # 仍被 view() 的結果引用的 memmap 會在引用釋放後才關閉
+                self._rings.popitem(last=False)
+        return ring
+
+    def record(self, lat: float, lon: float, dt: int, temp: float, humidity: float, pressure: float,
+               wind_speed: float, wind_deg: float = np.nan, aqi: Optional[float] = None) -> bool:
+        """
+        附加一筆觀測；aqi 為 None 時沿用最近一次記錄的 AQI
+
+        Returns:
+            bool: 是否已附加（同一觀測時間的重複數據或較舊的觀測不附加）
+        """
+        key = self._key(lat, lon)
+        ring = self._ring(key, create=True)
+        with self._lock.lock(key):
+            if aqi is None:
+                aqi = float(ring.header["aqi"])
+            appended = ring.append((dt, temp, humidity, pressure, wind_speed, wind_deg, aqi))
+        HISTORY_APPENDS.inc(result="appended" if appended else "duplicate")
+        return appended
+
+    def record_current(self, lat: float, lon: float, data: Dict[str, Any]) -> None:
+        """記錄 current 端點的原始回應；格式不符時只記錄日誌，不影響呼叫端"""
+        try:
+            main, wind = data["main"], data.get("wind", {})
+            self.record(lat, lon, int(data["dt"]), main["temp"], main["humidity"], main["pressure"],
+                        wind.get("speed", np.nan), wind.get("deg", np.nan))
+        except Exception as e:
+            logger.warning("記錄 %s,%s 的觀測歷史失敗: %s", lat, lon, e)
+
+    def record_air_quality(self, lat: float, lon: float, data: Dict[str, Any]) -> None:
+        """記錄 air_pollution 端點回應中的 AQI"""
+        try:
+            aqi = float(data["list"][0]["main"]["aqi"])
+            key = self._key(lat, lon)
+            ring = self._ring(key, create=True)
+            with self._lock.lock(key):
+                ring.set_aqi(aqi)
+        except Exception as e:
+            logger.warning("記錄 %s,%s 的 AQI 歷史失敗: %s", lat, lon, e)
+
+    def view(self, lat: float, lon: float, since: Optional[float] = None) -> np.ndarray:
+        """
+        地點的觀測紀錄（OBSERVATION_DTYPE 結構化陣列，依時間先後排列）
+
+        返回值是 memmap 的唯讀零複製切片，之後的附加可能覆寫其中最舊的紀錄；需要長期保存時請先複製。
+
+        Args:
+            since: 只取這個時間（epoch 秒）之後的紀錄
+        """
+        ring = self._ring(self._key(lat, lon), create=False)
+        if ring is None:
+            return np.empty(0, dtype=OBSERVATION_DTYPE)
+        records = ring.view()
+        if since is not None:
+            records = records[np.searchsorted(records["dt"], since, side="left"):]
+        records = records.view(np.ndarray)
+        records.flags.writeable = False
+        return records
+
+    def frame(self, lat: float, lon: float, since: Optional[float] = None) -> pd.DataFrame:
+        """以時間（UTC）為索引的 DataFrame；最多 capacity 筆，欄位由 view() 複製"""
+        records = self.view(lat, lon, since)
+        frame = pd.DataFrame({name: records[name] for name in OBSERVATION_DTYPE.names if name != "dt"},
+                             index=pd.to_datetime(records["dt"].astype(np.int64), unit="s", utc=True))
+        frame.index.name = "time"
+        return frame
+
+
+_default_history: Optional[ObservationHistory] = None
+_default_lock = threading.Lock()
+
+
+def default_observation_history() -> ObservationHistory:
+    """模組共用（跨行程共用檔案）的觀測歷史"""
+    global _default_history
+    with _default_lock:
+        if _default_history is None:
+            _default_history = ObservationHistory()
+        return _default_history
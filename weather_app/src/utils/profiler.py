@@ -0,0 +1,159 @@
+"""
+頁面效能剖析模組：記錄一次 rerun 中各區塊的耗時，必要時以 cProfile 剖析整個 rerun
+
+兩種模式：
+- sections：只記錄各區塊（geocode、各分頁、地圖）的起訖時間，開銷可忽略，適合在正式環境抽樣啟用
+- cprofile：另外以 cProfile 剖析整個 rerun，並輸出 .prof 檔供 snakeviz / pstats 分析
+
+剖析結果存放在 logs/profiles/，檔名包含時間、session 與地點。
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.config.config import PROFILE_ENABLED, PROFILE_SAMPLE_RATE, PROFILE_MODE, PROFILE_DIR, PROFILE_TOP_FUNCTIONS
+from src.utils.metrics import UI_SECTION_SECONDS
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def resolve_profile_mode(query_value: Optional[str] = None) -> Optional[str]:
+    """
+    決定本次 rerun 是否剖析以及使用的模式
+
+    Args:
+        query_value: 網址參數 ?profile= 的值（"1"/"sections" 或 "full"/"cprofile"）
+
+    Returns:
+        "sections"、"cprofile" 或 None（不剖析）
+    """
+    if query_value:
+        if query_value in ("full", "cprofile"):
+            return "cprofile"
+        if query_value in ("1", "true", "sections"):
+            return "sections"
+        return None
+    if PROFILE_ENABLED:
+        return PROFILE_MODE
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return PROFILE_MODE
+    return None
+
+
+class SessionProfiler:
+    """
+    記錄一次頁面 rerun 的區塊耗時
+
+    未啟用時 section() 仍會記錄 UI 區塊的效能指標，但不保留逐次明細也不寫檔。
+    """
+
+    def __init__(self, mode: Optional[str] = None, session_id: str = "", location: str = ""):
+        self.mode = mode
+        self.session_id = session_id
+        self.location = location
+        self.sections: List[Dict] = []
+        self._depth = 0
+        self._started = time.perf_counter()
+        self._profile: Optional[cProfile.Profile] = None
+        self.total: Optional[float] = None
+        self.saved_path: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode is not None
+
+    def start(self) -> None:
+        """開始剖析（cprofile 模式才會啟用 cProfile）"""
+        self._started = time.perf_counter()
+        if self.mode == "cprofile":
+            self._profile = cProfile.Profile()
+            try:
+                self._profile.enable()
+            except ValueError:
+                # 其他 session 的剖析器仍在執行（Python 3.12 起 cProfile 為全域）
+                logger.warning("cProfile 已被其他剖析器佔用，改為僅記錄區塊耗時")
+                self._profile = None
+                self.mode = "sections"
+
+    @contextmanager
+    def section(self, name: str):
+        """計時一個頁面區塊；巢狀呼叫會記錄層級，供火焰圖顯示"""
+        start = time.perf_counter()
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            duration = time.perf_counter() - start
+            UI_SECTION_SECONDS.observe(duration, section=name)
+            if self.enabled:
+                self.sections.append({
+                    "name": name,
+                    "start": start - self._started,
+                    "duration": duration,
+                    "depth": self._depth
+                })
+
+    def stop(self) -> None:
+        """結束剖析並記錄總耗時"""
+        self.total = time.perf_counter() - self._started
+        if self._profile is not None:
+            self._profile.disable()
+
+    def top_functions(self, limit: int = PROFILE_TOP_FUNCTIONS) -> List[Dict]:
+        """cProfile 中累計耗時最高的函式"""
+        if self._profile is None:
+            return []
+        stats = pstats.Stats(self._profile, stream=io.StringIO())
+        rows = []
+        for (filename, lineno, funcname), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            rows.append({
+                "function": f"{os.path.basename(filename)}:{lineno}({funcname})",
+                "ncalls": ncalls,
+                "tottime": tottime,
+                "cumtime": cumtime
+            })
+        rows.sort(key=lambda r: r["cumtime"], reverse=True)
+        return rows[:limit]
+
+    def summary(self) -> Dict:
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "session_id": self.session_id,
+            "location": self.location,
+            "mode": self.mode,
+            "total": self.total,
+            "sections": self.sections,
+            "top_functions": self.top_functions()
+        }
+
+    def save(self, profile_dir: str = PROFILE_DIR) -> Optional[str]:
+        """將區塊耗時（.json）與 cProfile 結果（.prof）寫入 logs/profiles/，返回 JSON 路徑"""
+        if not self.enabled:
+            return None
+        if self.total is None:
+            self.stop()
+        try:
+            os.makedirs(profile_dir, exist_ok=True)
+            safe_location = re.sub(r'[^\w.-]+', '_', self.location)[:40]
+            basename = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{self.session_id[:8]}_{safe_location}"
+            json_path = os.path.join(profile_dir, f"{basename}.json")
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+            if self._profile is not None:
+                self._profile.dump_stats(os.path.join(profile_dir, f"{basename}.prof"))
+            self.saved_path = json_path
+            logger.info("已儲存頁面剖析結果: %s（總耗時 %.3f 秒）", json_path, self.total)
+            return json_path
+        except OSError as e:
+            logger.error("儲存剖析結果失敗: %s", e)
+            return None
@@ -0,0 +1,91 @@
+"""
+跨行程的 API 速率限制：令牌桶狀態存在共用目錄的小檔案中，以檔案鎖互斥
+
+多個 Streamlit 伺服器行程（run.py --workers N）共用同一個令牌桶，合計的請求速率不會超過
+OpenWeather 方案的限制。
+"""
+import os
+import struct
+import time
+from typing import Optional
+
+from src.config.config import CACHE_DIR, API_RATE_LIMIT_PER_MINUTE, API_RATE_LIMIT_BURST, API_RATE_LIMIT_TIMEOUT
+from src.utils import metrics
+from src.utils.file_lock import StripedFileLock
+
+RATE_LIMIT_WAIT_SECONDS = metrics.histogram("rate_limit_wait_seconds", "等待 API 速率限制的時間")
+RATE_LIMIT_REJECTED = metrics.counter("rate_limit_rejected_total", "超過等待時間而放棄的請求數")
+
+# 狀態檔內容：剩餘令牌數、上次更新時間（epoch 秒）
+_STATE = struct.Struct("<dd")
+
+
+class RateLimitExceeded(Exception):
+    """在等待時間內無法取得請求配額"""
+
+
+class RateLimiter:
+    """
+    令牌桶：每分鐘補充 per_minute 個令牌，最多累積 burst 個
+
+    Args:
+        per_minute: 每分鐘允許的請求數，0 表示不限制
+        burst: 令牌桶容量（可連續發出的請求數）
+        state_dir: 狀態檔與鎖檔目錄，所有共用配額的行程必須相同
+    """
+
+    def __init__(self, per_minute: int = API_RATE_LIMIT_PER_MINUTE, burst: int = API_RATE_LIMIT_BURST,
+                 state_dir: Optional[str] = None):
+        self.rate = per_minute / 60.0
+        self.burst = max(1, burst)
+        self.state_dir = state_dir or os.path.join(CACHE_DIR, ".ratelimit")
+        self.state_path = os.path.join(self.state_dir, "bucket")
+        self._lock = StripedFileLock(self.state_dir, stripes=1) if self.rate > 0 else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _take(self) -> float:
+        """嘗試取得一個令牌；成功返回 0，否則返回需要等待的秒數"""
+        now = time.time()
+        with self._lock.lock("bucket"):
+            with open(self.state_path, "a+b") as f:
+                f.seek(0)
+                raw = f.read(_STATE.size)
+                if len(raw) == _STATE.size:
+                    tokens, updated = _STATE.unpack(raw)
+                    tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+                else:
+                    tokens = float(self.burst)
+
+                wait = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    wait = (1 - tokens) / self.rate
+
+                f.seek(0)
+                f.truncate()
+                f.write(_STATE.pack(tokens, now))
+        return wait
+
+    def acquire(self, timeout: float = API_RATE_LIMIT_TIMEOUT) -> bool:
+        """
+        取得一次請求配額，必要時等待
+
+        Returns:
+            bool: 在 timeout 秒內取得配額時為 True
+        """
+        if not self.enabled:
+            return True
+        start = time.monotonic()
+        while True:
+            wait = self._take()
+            if wait == 0:
+                RATE_LIMIT_WAIT_SECONDS.observe(time.monotonic() - start)
+                return True
+            if time.monotonic() + wait - start > timeout:
+                RATE_LIMIT_REJECTED.inc()
+                return False
+            time.sleep(wait)
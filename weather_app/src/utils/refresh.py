@@ -0,0 +1,276 @@
+"""
+共用的自動更新排程器
+
+每個行程只有一個排程器執行緒：每個有人觀看的地點每隔 REFRESH_RATE 秒在背景更新一次數據
+（經由 WeatherAPI，快取未過期時不會回源；過期時以條件式請求重新驗證），比較各區塊的數據版本，
+有變動時把該地點的修訂號加一，並通知觀看這個地點的 session 重新執行。
+
+更新的成本只與地點數有關：同一地點有多少 session 都只更新一次，session 重新執行時數據已在快取中，
+處理結果與圖表也依數據版本重用，只有變動的區塊需要重新計算。數據沒有變動時不通知任何 session。
+
+更新在排程器自己的小執行緒池（REFRESH_WORKERS）中執行，並套用一個更新間隔的延遲預算：
+上游緩慢時更新工作不會佔滿頁面載入用的共用執行緒池，單次更新也不會超過一個間隔。
+
+排程器不依賴 Streamlit：通知與「session 是否仍存在」都由 watch() 的呼叫端以函式提供
+（見 src/ui/auto_refresh.py）；其他呼叫端也可以用 wait_for_update() 等待修訂號改變。
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from src.config.config import REFRESH_RATE, REFRESH_WORKERS
+from src.utils import metrics
+from src.utils.deadline import budget
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+REFRESH_RUNS = metrics.counter("refresh_runs_total", "自動更新各地點的次數", ["result"])
+REFRESH_SECONDS = metrics.histogram("refresh_duration_seconds", "自動更新一個地點的耗時")
+REFRESH_LOCATIONS = metrics.gauge("refresh_locations", "自動更新中的地點數")
+REFRESH_SESSIONS = metrics.gauge("refresh_sessions", "等待自動更新的 session 數")
+REFRESH_NOTIFICATIONS = metrics.counter("refresh_notifications_total", "數據變動後通知 session 重新執行的次數")
+
+# 區塊名稱 -> 取得 (數據, 數據版本) 的函式；與 src/app.py 各區塊的 load_* 對應
+REFRESH_SOURCES: Dict[str, Callable[[Any, float, float], Tuple[Any, Any]]] = {
+    "current": lambda api, lat, lon: api.get_current_weather_versioned(lat, lon),
+    "hourly": lambda api, lat, lon: api.get_hourly_forecast_versioned(lat, lon),
+    "daily": lambda api, lat, lon: api.get_daily_forecast_versioned(lat, lon),
+    "monthly": lambda api, lat, lon: api.get_monthly_forecast_versioned(lat, lon),
+    "air_quality": lambda api, lat, lon: api.get_air_pollution_versioned(lat, lon)
+}
+
+LocationKey = Tuple[float, float]
+
+
+class _Watcher:
+    def __init__(self, location: LocationKey, notify: Callable[[Set[str]], None], alive: Callable[[], bool]):
+        self.location = location
+        self.notify = notify
+        self.alive = alive
+        # 尚未被 session 取走的變動區塊（見 take_changes）
+        self.changed: Set[str] = set()
+
+
+class _Location:
+    def __init__(self, lat: float, lon: float, next_due: float):
+        self.lat = lat
+        self.lon = lon
+        self.next_due = next_due
+        self.in_flight = False
+        # 第一次更新只記錄比較基準的數據版本，不通知
+        self.primed = False
+        self.revision = 0
+        self.versions: Dict[str, Any] = {}
+        self.sessions: Set[str] = set()
+
+
+class RefreshScheduler:
+    """
+    Args:
+        api: WeatherAPI
+        interval: 每個地點的更新間隔（秒）
+        workers: 同時更新的地點數上限
+    """
+
+    def __init__(self, api, interval: float = REFRESH_RATE, workers: int = REFRESH_WORKERS):
+        self.api = api
+        self.interval = interval
+        self.workers = max(1, workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._locations: Dict[LocationKey, _Location] = {}
+        self._watchers: Dict[str, _Watcher] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def watch(self, session_id: str, lat: float, lon: float, notify: Callable[[Set[str]], None],
+              alive: Callable[[], bool]) -> int:
+        """
+        登記 session 正在觀看這個地點（每次頁面執行時呼叫；換地點時取代先前的登記）
+
+        Args:
+            session_id: session 識別碼
+            notify: 數據變動時呼叫，參數為變動的區塊名稱；在排程器的背景執行緒中呼叫
+            alive: session 是否仍存在；返回 False 時取消登記
+
+        Returns:
+            int: 地點目前的修訂號
+        """
+        key = (lat, lon)
+        with self._cond:
+            watcher = self._watchers.get(session_id)
+            if watcher is not None and watcher.location != key:
+                self._detach(session_id, watcher)
+                watcher = None
+            if watcher is None:
+                self._watchers[session_id] = _Watcher(key, notify, alive)
+            else:
+                watcher.notify, watcher.alive = notify, alive
+            location = self._locations.get(key)
+            if location is None:
+                # 觀看者正在載入同一份數據：立即在背景取得目前的數據版本作為比較基準（快取命中，不回源）
+                location = self._locations[key] = _Location(lat, lon, time.monotonic())
+            location.sessions.add(session_id)
+            self._update_gauges()
+            self._ensure_thread()
+            self._cond.notify_all()
+            return location.revision
+
+    def unwatch(self, session_id: str) -> None:
+        """取消 session 的登記"""
+        with self._cond:
+            watcher = self._watchers.get(session_id)
+            if watcher is not None:
+                self._detach(session_id, watcher)
+                self._update_gauges()
+
+    def take_changes(self, session_id: str) -> Set[str]:
+        """取出上次通知後 session 尚未處理的變動區塊（沒有時為空集合）"""
+        with self._cond:
+            watcher = self._watchers.get(session_id)
+            if watcher is None:
+                return set()
+            changed, watcher.changed = watcher.changed, set()
+            return changed
+
+    def revision(self, lat: float, lon: float) -> int:
+        """地點目前的修訂號（沒有人觀看的地點為 0）"""
+        with self._cond:
+            location = self._locations.get((lat, lon))
+            return location.revision if location is not None else 0
+
+    def wait_for_update(self, lat: float, lon: float, revision: int, timeout: float) -> int:
+        """等待地點的修訂號大於 revision，最多 timeout 秒；返回目前的修訂號"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                location = self._locations.get((lat, lon))
+                current = location.revision if location is not None else 0
+                remaining = deadline - time.monotonic()
+                if current > revision or remaining <= 0:
+                    return current
+                self._cond.wait(remaining)
+
+    def stop(self) -> None:
+        """停止排程器執行緒"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _detach(self, session_id: str, watcher: _Watcher) -> None:
+        del self._watchers[session_id]
+        location = self._locations.get(watcher.location)
+        if location is not None:
+            location.sessions.discard(session_id)
+            if not location.sessions:
+                del self._locations[watcher.location]
+
+    def _update_gauges(self) -> None:
+        REFRESH_LOCATIONS.set(len(self._locations))
+        REFRESH_SESSIONS.set(len(self._watchers))
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="refresh")
+            self._thread = threading.Thread(target=self._run, name="refresh-scheduler", daemon=True)
+            self._thread.start()
+
+    def _prune(self) -> None:
+        """移除已關閉的 session（在鎖內呼叫）"""
+        for session_id, watcher in list(self._watchers.items()):
+            try:
+                alive = watcher.alive()
+            except Exception:
+                alive = False
+            if not alive:
+                self._detach(session_id, watcher)
+        self._update_gauges()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                self._prune()
+                now = time.monotonic()
+                due = [location for location in self._locations.values()
+                       if location.next_due <= now and not location.in_flight]
+                for location in due:
+                    location.in_flight = True
+                pending = [location.next_due for location in self._locations.values() if not location.in_flight]
+                # 也定期醒來清理已關閉的 session
+                wait = min([self.interval] + [max(0.0, t - now) for t in pending])
+                executor = self._executor
+            for location in due:
+                try:
+                    executor.submit(self._refresh, location)
+                except RuntimeError:
+                    # stop() 已關閉執行緒池
+                    with self._cond:
+                        location.in_flight = False
+            with self._cond:
+                if not self._stopped:
+                    self._cond.wait(max(0.5, wait))
+
+    def _refresh(self, location: _Location) -> None:
+        """更新一個地點的所有數據，有變動時通知觀看的 session（在排程器的執行緒池中執行）"""
+        start = time.perf_counter()
+        # 整次更新最多一個間隔；預算用完後其餘區塊沿用過期快取（版本不變，不算變動）
+        deadline = start + self.interval
+        versions: Dict[str, Any] = {}
+        failed = 0
+        for section, fetch in REFRESH_SOURCES.items():
+            try:
+                with budget(deadline=deadline):
+                    versions[section] = fetch(self.api, location.lat, location.lon)[1]
+            except Exception as e:
+                failed += 1
+                logger.warning("自動更新 %s,%s 的 %s 失敗: %s", location.lat, location.lon, section, e)
+
+        with self._cond:
+            location.in_flight = False
+            location.next_due = time.monotonic() + self.interval
+            changed = {section for section, version in versions.items()
+                       if location.primed and version != location.versions.get(section)}
+            location.versions.update(versions)
+            location.primed = True
+            notify = []
+            if changed:
+                location.revision += 1
+                for session_id in location.sessions:
+                    watcher = self._watchers[session_id]
+                    watcher.changed |= changed
+                    notify.append(watcher.notify)
+                self._cond.notify_all()
+
+        REFRESH_SECONDS.observe(time.perf_counter() - start)
+        REFRESH_RUNS.inc(result="changed" if changed else ("error" if failed else "unchanged"))
+        if changed:
+            logger.info("地點 %s,%s 的數據已更新（%s），通知 %d 個 session", location.lat, location.lon,
+                        "、".join(sorted(changed)), len(notify))
+        for callback in notify:
+            try:
+                callback(changed)
+                REFRESH_NOTIFICATIONS.inc()
+            except Exception as e:
+                logger.warning("通知 session 重新執行失敗: %s", e)
+
+
+_scheduler: Optional[RefreshScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_refresh_scheduler(api) -> RefreshScheduler:
+    """取得行程內共用的排程器（第一次使用時以 api 建立）"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RefreshScheduler(api)
+        return _scheduler
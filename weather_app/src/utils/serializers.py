@@ -0,0 +1,181 @@
+"""
+快取序列化模組：可插拔的序列化格式與壓縮
+
+快取檔案格式：
+
+    WXC1{"key": "...", "timestamp": "...", "expires": 1717200000.0, "fmt": "orjson", "comp": "zstd"}\\n<payload>
+
+檔頭是以 MAGIC 開頭、換行結尾的一行 JSON，記錄序列化格式、壓縮方式與時間戳等中繼資料，
+之後才是（可能經過壓縮的）資料本體。讀取時依檔頭選擇解碼方式，因此不同格式的檔案可以並存；
+只需要中繼資料時（例如清理過期快取）可以只讀檔頭而不解碼資料。
+
+msgpack、orjson、zstandard、lz4 都是選用套件，未安裝時自動退回標準函式庫的 json / 不壓縮。
+
+處理後的 DataFrame（見 derived_cache）使用 feather（需要 pyarrow）或 pickle：pickle 使用 protocol 5，
+numpy 陣列以 out-of-band 緩衝區直接寫入，讀取時不需再複製一次。
+"""
+import importlib.util
+import json
+import pickle
+import struct
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.config.config import CACHE_SERIALIZER, CACHE_COMPRESSION, CACHE_COMPRESS_THRESHOLD
+
+MAGIC = b"WXC1"
+
+# 名稱 -> (dumps, loads)，dumps 返回 bytes
+SERIALIZERS: Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    "json": (
+        lambda obj: json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        lambda raw: json.loads(raw.decode("utf-8"))
+    )
+}
+
+
+
+def _pickle_dumps(obj: Any) -> bytes:
+    """protocol 5 pickle；out-of-band 緩衝區附加在後，前置緩衝區數量與各段長度"""
+    buffers = []
+    main = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    raws = [buf.raw() for buf in buffers]
+    lengths = [len(main)] + [raw.nbytes for raw in raws]
+    return b"".join([struct.pack(f"<I{len(lengths)}Q", len(lengths), *lengths), main, *raws])
+
+
+def _pickle_loads(raw: bytes) -> Any:
+    view = memoryview(raw)
+    (count,) = struct.unpack_from("<I", view)
+    lengths = struct.unpack_from(f"<{count}Q", view, 4)
+    offset = 4 + 8 * count
+    parts = []
+    for length in lengths:
+        parts.append(view[offset:offset + length])
+        offset += length
+    return pickle.loads(parts[0], buffers=parts[1:])
+
+
+SERIALIZERS["pickle"] = (_pickle_dumps, _pickle_loads)
+
+# 名稱 -> (compress, decompress)
+COMPRESSORS: Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "zlib": (lambda raw: zlib.compress(raw, 6), zlib.decompress)
+}
+
+try:
+    import orjson
+    SERIALIZERS["orjson"] = (orjson.dumps, orjson.loads)
+except ImportError:
+    pass
+
+# pyarrow 匯入較慢且只有處理結果快取會用到，只檢查是否安裝，第一次讀寫時才匯入
+if importlib.util.find_spec("pyarrow") is not None:
+    def _feather_dumps(df) -> bytes:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        sink = pa.BufferOutputStream()
+        feather.write_feather(df, sink)
+        return sink.getvalue().to_pybytes()
+
+    def _feather_loads(raw: bytes):
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        return feather.read_table(pa.BufferReader(raw)).to_pandas()
+
+    SERIALIZERS["feather"] = (_feather_dumps, _feather_loads)
+
+try:
+    import msgpack
+    SERIALIZERS["msgpack"] = (
+        lambda obj: msgpack.packb(obj, use_bin_type=True),
+        lambda raw: msgpack.unpackb(raw, raw=False, strict_map_key=False)
+    )
+except ImportError:
+    pass
+
+try:
+    import zstandard
+    _zstd_compressor = zstandard.ZstdCompressor(level=3)
+    _zstd_decompressor = zstandard.ZstdDecompressor()
+    COMPRESSORS["zstd"] = (_zstd_compressor.compress, _zstd_decompressor.decompress)
+except ImportError:
+    pass
+
+try:
+    import lz4.frame
+    COMPRESSORS["lz4"] = (lz4.frame.compress, lz4.frame.decompress)
+except ImportError:
+    pass
+
+
+def _resolve_serializer(name: str) -> str:
+    if name == "auto":
+        return next(n for n in ("orjson", "msgpack", "json") if n in SERIALIZERS)
+    if name not in SERIALIZERS:
+        raise ValueError(f"未安裝或不支援的序列化格式: {name}")
+    return name
+
+
+def _resolve_compression(name: str) -> Optional[str]:
+    if name in ("none", ""):
+        return None
+    if name == "auto":
+        return next((n for n in ("zstd", "lz4") if n in COMPRESSORS), None)
+    if name not in COMPRESSORS:
+        raise ValueError(f"未安裝或不支援的壓縮方式: {name}")
+    return name
+
+
+DEFAULT_SERIALIZER = _resolve_serializer(CACHE_SERIALIZER)
+DEFAULT_COMPRESSION = _resolve_compression(CACHE_COMPRESSION)
+
+
+def encode_header(meta: Dict[str, Any]) -> bytes:
+    """編碼檔頭（MAGIC + 一行 JSON + 換行）"""
+    return MAGIC + json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def encode_entry(data: Any, header: Dict[str, Any], serializer: Optional[str] = None,
+                 compression: Optional[str] = None, threshold: int = CACHE_COMPRESS_THRESHOLD) -> bytes:
+    """
+    將數據與檔頭編碼為快取檔案內容
+
+    Args:
+        data: 要快取的數據
+        header: 額外的中繼資料（會與 fmt/comp 一起寫入檔頭）
+        serializer: 序列化格式，預設依設定 CACHE_SERIALIZER
+        compression: 壓縮方式，預設依設定 CACHE_COMPRESSION；資料小於 threshold 時不壓縮
+        threshold: 啟用壓縮的最小位元組數
+    """
+    fmt = serializer or DEFAULT_SERIALIZER
+    payload = SERIALIZERS[fmt][0](data)
+
+    comp = _resolve_compression(compression) if compression is not None else DEFAULT_COMPRESSION
+    if comp and len(payload) >= threshold:
+        payload = COMPRESSORS[comp][0](payload)
+    else:
+        comp = None
+
+    return encode_header({**header, "fmt": fmt, "comp": comp}) + payload
+
+
+def decode_header(raw: bytes) -> Tuple[Dict[str, Any], int]:
+    """解析檔頭，返回 (中繼資料, 資料本體的起始位置)"""
+    if not raw.startswith(MAGIC):
+        raise ValueError("不是有效的快取檔案")
+    end = raw.index(b"\n")
+    return json.loads(raw[len(MAGIC):end].decode("utf-8")), end + 1
+
+
+def decode_entry(raw: bytes) -> Tuple[Dict[str, Any], Any]:
+    """解碼快取檔案內容，返回 (中繼資料, 數據)"""
+    meta, offset = decode_header(raw)
+    payload = raw[offset:]
+    if meta.get("comp"):
+        if meta["comp"] not in COMPRESSORS:
+            raise ValueError(f"無法解壓縮，未安裝: {meta['comp']}")
+        payload = COMPRESSORS[meta["comp"]][1](payload)
+    if meta["fmt"] not in SERIALIZERS:
+        raise ValueError(f"無法解碼，未安裝: {meta['fmt']}")
+    return meta, SERIALIZERS[meta["fmt"]][1](payload)